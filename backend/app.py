@@ -1,35 +1,39 @@
 
 import asyncio
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+import json
+from typing import List, Optional
+from fastapi import FastAPI, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.concurrency import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from models import api as models_api
 from stores import api as stores_api
 from jobs import api as jobs_api
-from jobs.core import QUEUE, clients, JOBS, restore_incomplete_jobs
-from jobs import worker
+from metrics import api as metrics_api
+from metrics.trace import PROFILER, start_trace
+from jobs.core import clients, JOBS, restore_incomplete_jobs
+from jobs.scheduler import SCHEDULER
+from jobs import run_job
+from warmup import READINESS, warm_up
 
-_worker_task: asyncio.Task | None = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global _worker_task
+    # 🔑 Requeue interrupted jobs before workers start
+    await restore_incomplete_jobs(SCHEDULER)
 
-    # 🔑 Requeue interrupted jobs before worker starts
-    await restore_incomplete_jobs(QUEUE)
+    # Start job workers
+    SCHEDULER.start(run_job)
+    READINESS.app_ready()
 
-    # Start worker
-    _worker_task = asyncio.create_task(worker())
+    # Preload hot stores / models without blocking startup
+    warm_task = asyncio.create_task(warm_up()) if READINESS.warmup_enabled else None
     yield
 
-    # Shutdown worker
-    if _worker_task:
-        _worker_task.cancel()
-        try:
-            await _worker_task
-        except asyncio.CancelledError:
-            pass
-
+    # Shutdown workers
+    if warm_task is not None:
+        warm_task.cancel()
+    await SCHEDULER.stop()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -40,22 +44,67 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    # Spans (encode / ann / hydrate / graph / ...) recorded while handling the
+    # request are reported back in a Server-Timing header
+    with start_trace(f"{request.method} {request.url.path}") as trace:
+        response = await call_next(request)
+    response.headers["Server-Timing"] = trace.server_timing()
+    PROFILER.request_done()
+    READINESS.request_served()
+    return response
+
 app.include_router(models_api.router)
 app.include_router(stores_api.router)
 app.include_router(jobs_api.router)
+app.include_router(metrics_api.router)
+
+
+@app.get("/health")
+def health():
+    """Readiness: 200 once startup and warm-up are done, 503 before."""
+    body = READINESS.dict()
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
 
 
 @app.websocket("/ws/jobs")
-async def jobs_ws(ws: WebSocket):
+async def jobs_ws(ws: WebSocket, job: Optional[List[str]] = Query(None)):
+    """
+    Job progress stream. Connect with ?job=<id> (repeatable) to follow specific jobs,
+    or without it to follow all of them. Subscriptions can be changed with
+    {"subscribe": [...]} / {"unsubscribe": [...]} messages.
+    Sends a full "job_update" snapshot per job, then "job_delta" messages.
+    """
     await ws.accept()
-    clients.add(ws)
+    clients[ws] = set(job) if job else None
+
+    async def send_snapshot(job_ids=None):
+        for j in list(JOBS.values()):
+            if job_ids is None or j.id in job_ids:
+                await ws.send_json({"type": "job_update", "job": j.dict()})
+
     # send initial snapshot
-    for job in JOBS.values():
-        await ws.send_json({"type": "job_update", "job": job.dict()})
+    await send_snapshot(clients[ws])
     try:
         while True:
-            await ws.receive_text()  # keep alive
+            raw = await ws.receive_text()  # subscription changes / keep alive
+            try:
+                msg = json.loads(raw)
+            except ValueError:
+                continue
+            if not isinstance(msg, dict):
+                continue
+            subscribed = clients.get(ws)
+            if msg.get("subscribe"):
+                added = set(msg["subscribe"])
+                clients[ws] = added if subscribed is None else subscribed | added
+                await send_snapshot(added)
+            if msg.get("unsubscribe") and subscribed is not None:
+                clients[ws] = clients[ws] - set(msg["unsubscribe"])
     except WebSocketDisconnect:
-        clients.discard(ws)
\ No newline at end of file
+        clients.pop(ws, None)
@@ -0,0 +1,332 @@
+"""
+Benchmark suite: ingest throughput, search latency, graph build and peak RSS
+on synthetic corpora, using the offline stub encoder.
+
+    cd backend
+    python -m bench run --sizes 10k,100k --out bench-results.json
+    python -m bench compare old.json new.json --threshold 0.1
+    python -m bench ann my-store --target-recall 0.95 --write
+    python -m bench startup --runs 5
+
+Each size runs in its own process, in a scratch directory (stores + job DB),
+so the real .cache is never touched and peak RSS is per size.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+def parse_size(s: str) -> int:
+    s = s.strip().lower()
+    mult = {"k": 1_000, "m": 1_000_000}.get(s[-1:], 1)
+    return int(float(s[:-1] if mult > 1 else s) * mult)
+
+
+def int_list(s: str) -> List[int]:
+    return [int(x) for x in s.split(",") if x.strip()]
+
+
+def _git(*args) -> Optional[str]:
+    try:
+        out = subprocess.run(["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() if out.returncode == 0 else None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment() -> Dict:
+    import faiss
+    import numpy as np
+
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--", ".")),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "faiss": getattr(faiss, "__version__", None),
+    }
+
+
+# -----------------------------
+# run
+# -----------------------------
+def cmd_run(args):
+    sizes = [parse_size(s) for s in args.sizes.split(",")]
+    params = {
+        "seed": args.seed,
+        "ingest_sample": args.ingest_sample,
+        "batch_size": args.batch_size,
+        "queries": args.queries,
+        "ks": int_list(args.k),
+        "concurrency": int_list(args.concurrency),
+        "graph_k": args.graph_k,
+        "graph_queries": args.graph_queries,
+        "graph_max_size": args.graph_max_size,
+    }
+    report = {"env": environment(), "params": params, "results": []}
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(BACKEND_DIR), os.environ.get("PYTHONPATH")])))
+    for size in sizes:
+        workdir = Path(tempfile.mkdtemp(prefix=f"bench-{size}-", dir=args.workdir))
+        result_file = workdir / "result.json"
+        print(f"[bench] size={size:,} (workdir {workdir})")
+        proc = subprocess.run(
+            [sys.executable, "-m", "bench", "_size", str(size), str(result_file), json.dumps(params)],
+            cwd=workdir,
+            env=env,
+            stdout=None if args.verbose else subprocess.DEVNULL,
+        )
+        if proc.returncode != 0 or not result_file.exists():
+            report["results"].append({"size": size, "error": f"exit code {proc.returncode}"})
+            print(f"[bench] size={size:,} failed (exit code {proc.returncode})")
+        else:
+            result = json.loads(result_file.read_text())
+            report["results"].append(result)
+            print_result(result)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    out = Path(args.out)
+    out.write_text(json.dumps(report, indent=2))
+    print(f"[bench] wrote {out}")
+
+
+def cmd_size(args):
+    # Child process: cwd is the scratch dir, so config's relative .cache lands there
+    from .workloads import run_size
+
+    params = json.loads(args.params)
+    result = run_size(args.size, **params)
+    Path(args.result_file).write_text(json.dumps(result))
+
+
+def print_result(r: Dict):
+    ing = r["ingest"]
+    print(f"  ingest    {ing['texts_per_s']:>10,.1f} texts/s  ({ing['texts']:,} texts, batch {ing['batch_size']})")
+    for s in r["search"]:
+        print(f"  search    k={s['k']:<4} c={s['concurrency']:<3} p50 {s['p50_ms']:>9.2f} ms  p99 {s['p99_ms']:>9.2f} ms  {s['qps']:>8.1f} qps")
+    m = r.get("search_mmr")
+    if m:
+        print(f"  mmr       k={m['k']:<4} pool={m['pool']:<4} p50 {m['p50_ms']:>9.2f} ms  p99 {m['p99_ms']:>9.2f} ms  (+{m['overhead_p50_ms']:.2f} ms)")
+    g = r["graph"]
+    if "skipped" in g:
+        print(f"  graph     skipped: {g['skipped']}")
+    else:
+        print(f"  graph     build {g['build_seconds']:.2f}s", end="")
+        if g["graph_search"]:
+            print(f"  search p50 {g['graph_search']['p50_ms']:.1f} ms  p99 {g['graph_search']['p99_ms']:.1f} ms", end="")
+        print()
+    print(f"  peak RSS  {r['peak_rss_bytes'] / 2**20:,.0f} MiB")
+
+
+# -----------------------------
+# compare
+# -----------------------------
+def flatten(result: Dict) -> Dict[str, Tuple[float, bool]]:
+    """metric name -> (value, higher_is_better)"""
+    out = {"ingest.texts_per_s": (result["ingest"]["texts_per_s"], True)}
+    for s in result["search"]:
+        key = f"search.k{s['k']}.c{s['concurrency']}"
+        out[f"{key}.p50_ms"] = (s["p50_ms"], False)
+        out[f"{key}.p99_ms"] = (s["p99_ms"], False)
+        out[f"{key}.qps"] = (s["qps"], True)
+    if result.get("search_mmr"):
+        out["search_mmr.p50_ms"] = (result["search_mmr"]["p50_ms"], False)
+        out["search_mmr.p99_ms"] = (result["search_mmr"]["p99_ms"], False)
+    g = result.get("graph", {})
+    if "build_seconds" in g:
+        out["graph.build_seconds"] = (g["build_seconds"], False)
+        if g.get("graph_search"):
+            out["graph.search.p50_ms"] = (g["graph_search"]["p50_ms"], False)
+            out["graph.search.p99_ms"] = (g["graph_search"]["p99_ms"], False)
+    out["peak_rss_bytes"] = (result["peak_rss_bytes"], False)
+    return out
+
+
+def cmd_compare(args):
+    old = {r["size"]: r for r in json.loads(Path(args.old).read_text())["results"] if "error" not in r}
+    new = {r["size"]: r for r in json.loads(Path(args.new).read_text())["results"] if "error" not in r}
+
+    regressions = 0
+    for size in sorted(old.keys() & new.keys()):
+        print(f"size={size:,}")
+        a, b = flatten(old[size]), flatten(new[size])
+        for name in [n for n in a if n in b]:
+            (va, higher), (vb, _) = a[name], b[name]
+            if not va:
+                continue
+            change = (vb - va) / va
+            worse = -change if higher else change
+            flag = ""
+            if worse > args.threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            elif -worse > args.threshold:
+                flag = "  improved"
+            print(f"  {name:<32} {va:>14,.2f} -> {vb:>14,.2f}  {change:+7.1%}{flag}")
+
+    print(f"{regressions} regression(s) beyond {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
+
+
+# -----------------------------
+# ann (runs against a real store, from the backend directory)
+# -----------------------------
+def cmd_ann(args):
+    import jobs  # noqa: F401 -- must load before stores.core (circular import)
+    from stores.core import get_store
+
+    query_texts = None
+    if args.query_file:
+        with open(args.query_file, "r", encoding="utf-8") as f:
+            query_texts = [line.strip() for line in f if line.strip()]
+
+    def progress(done, total, row):
+        print(f"  [{done}/{total}] {json.dumps(row['config'])}  recall {row['recall']:.3f}  "
+              f"p50 {row['p50_ms']:.3f} ms  p99 {row['p99_ms']:.3f} ms  {row['index_bytes'] / 2**20:,.1f} MiB")
+
+    s = get_store(args.store)
+    report = s.eval_ann(
+        k=args.k,
+        n_queries=args.queries,
+        query_texts=query_texts,
+        target_recall=args.target_recall,
+        write=args.write,
+        progress=progress,
+    )
+    best = report["best"]
+    if best is None:
+        print(f"[bench] no config reached recall {args.target_recall}")
+    else:
+        print(f"[bench] best: {json.dumps(best['config'])} recall {best['recall']:.3f} p50 {best['p50_ms']:.3f} ms"
+              + (" (written to meta.json)" if args.write else ""))
+
+
+# -----------------------------
+# startup (cold start of the real server)
+# -----------------------------
+def _probe(url: str) -> Optional[int]:
+    import urllib.error
+    import urllib.request
+
+    try:
+        with urllib.request.urlopen(url, timeout=1) as resp:
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+
+def cmd_startup(args):
+    """
+    Spawn uvicorn (no --reload) and poll /health: the first answer is the cold
+    start to first served request, the first 200 is readiness (warm-up done).
+    """
+    import time
+
+    url = f"http://127.0.0.1:{args.port}/health"
+    runs = []
+    for i in range(args.runs):
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(args.port)],
+            cwd=BACKEND_DIR,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        first = ready = None
+        try:
+            while time.perf_counter() - t0 < args.timeout:
+                status = _probe(url)
+                now = time.perf_counter() - t0
+                if status is not None and first is None:
+                    first = now
+                if status == 200:
+                    ready = now
+                    break
+                if proc.poll() is not None:
+                    break
+                time.sleep(0.02)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+        runs.append({"first_response_seconds": first, "ready_seconds": ready})
+        fmt = lambda v: "n/a" if v is None else f"{v:.3f}s"
+        print(f"  run {i + 1}: first response {fmt(first)}, ready {fmt(ready)}")
+
+    report = {"env": environment(), "startup": runs}
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+        print(f"[bench] wrote {args.out}")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    run = sub.add_parser("run", help="run the suite and write a JSON report")
+    run.add_argument("--sizes", default="10k,100k", help="comma separated corpus sizes, e.g. 10k,100k,1m,10m")
+    run.add_argument("--out", default="bench-results.json")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--ingest-sample", type=int, default=20_000,
+                     help="texts ingested through Store.add_texts; the rest of the corpus is bulk loaded")
+    run.add_argument("--batch-size", type=int, default=64)
+    run.add_argument("--queries", type=int, default=200)
+    run.add_argument("--k", default="1,10,100", help="comma separated k values for search")
+    run.add_argument("--concurrency", default="1,4,16", help="comma separated search thread counts")
+    run.add_argument("--graph-k", type=int, default=10)
+    run.add_argument("--graph-queries", type=int, default=10, help="/graph_search calls per size")
+    run.add_argument("--graph-max-size", type=int, default=1_000_000, help="skip graph workloads above this size")
+    run.add_argument("--workdir", default=None, help="parent directory for scratch stores (default: system temp)")
+    run.add_argument("--keep", action="store_true", help="keep scratch stores after the run")
+    run.add_argument("-v", "--verbose", action="store_true", help="show output of the size runs")
+    run.set_defaults(fn=cmd_run)
+
+    size = sub.add_parser("_size", help=argparse.SUPPRESS)
+    size.add_argument("size", type=int)
+    size.add_argument("result_file")
+    size.add_argument("params")
+    size.set_defaults(fn=cmd_size)
+
+    cmp = sub.add_parser("compare", help="compare two reports; exits 1 on regressions")
+    cmp.add_argument("old")
+    cmp.add_argument("new")
+    cmp.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    cmp.set_defaults(fn=cmd_compare)
+
+    ann = sub.add_parser("ann", help="recall/latency sweep of ANN configs on an existing store")
+    ann.add_argument("store")
+    ann.add_argument("--k", type=int, default=10)
+    ann.add_argument("--queries", type=int, default=200, help="queries sampled from the store's entries")
+    ann.add_argument("--query-file", default=None, help="one query per line (encoded with the store model)")
+    ann.add_argument("--target-recall", type=float, default=0.95)
+    ann.add_argument("--write", action="store_true", help="store the best config in meta.json")
+    ann.set_defaults(fn=cmd_ann)
+
+    st = sub.add_parser("startup", help="cold start to first served request / readiness")
+    st.add_argument("--runs", type=int, default=3)
+    st.add_argument("--port", type=int, default=8765)
+    st.add_argument("--timeout", type=float, default=120)
+    st.add_argument("--out", default=None)
+    st.set_defaults(fn=cmd_startup)
+
+    args = parser.parse_args()
+    args.fn(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+from typing import Iterator, List
+
+import numpy as np
+
+SYLLABLES = [
+    "ka", "lo", "mi", "ne", "ru", "ta", "so", "vi", "de", "po", "ga", "zu",
+    "fe", "hi", "jo", "be", "ni", "ra", "shi", "tho", "qua", "el", "or", "un",
+]
+
+
+def vocabulary(size: int, seed: int) -> List[str]:
+    """`size` distinct pseudo-words: i written in base len(SYLLABLES), then shuffled."""
+    base = len(SYLLABLES)
+    words = []
+    for i in range(size):
+        parts, n = [], i
+        while True:
+            parts.append(SYLLABLES[n % base])
+            n //= base
+            if n == 0:
+                break
+        words.append("".join(reversed(parts)))
+    np.random.default_rng(seed).shuffle(words)
+    return words
+
+
+# Generation granularity; part of the corpus definition (changing it changes the texts)
+CHUNK = 10_000
+
+
+class SyntheticCorpus:
+    """
+    Deterministic tweet-like texts: zipf-distributed words from a fixed vocabulary,
+    4-32 words per text. The same (seed, vocab_size) always yields the same stream,
+    so results are comparable across commits.
+    """
+
+    def __init__(self, seed: int = 0, vocab_size: int = 20_000, min_words: int = 4, max_words: int = 32):
+        self.seed = seed
+        self.vocab = np.array(vocabulary(vocab_size, seed))
+        self.min_words = min_words
+        self.max_words = max_words
+
+    def _texts(self, rng: np.random.Generator, n: int) -> List[str]:
+        lengths = rng.integers(self.min_words, self.max_words + 1, n)
+        ranks = np.minimum(rng.zipf(1.3, int(lengths.sum())) - 1, len(self.vocab) - 1)
+        words = self.vocab[ranks]
+        out, pos = [], 0
+        for length in lengths:
+            out.append(" ".join(words[pos : pos + length]))
+            pos += length
+        return out
+
+    def batches(self, n: int) -> Iterator[List[str]]:
+        """The first `n` texts of the corpus, in batches of CHUNK."""
+        rng = np.random.default_rng(self.seed + 1)
+        for lo in range(0, n, CHUNK):
+            yield self._texts(rng, min(CHUNK, n - lo))
+
+    def texts(self, n: int) -> List[str]:
+        return [t for batch in self.batches(n) for t in batch]
+
+    def queries(self, n: int) -> List[str]:
+        """Queries drawn from the same distribution but a separate stream."""
+        return self._texts(np.random.default_rng(self.seed + 2), n)
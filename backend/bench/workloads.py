@@ -0,0 +1,168 @@
+"""
+Workloads for one corpus size. Runs inside a fresh process (see __main__) so
+peak RSS is per size; expects the working directory to be a scratch dir.
+"""
+import asyncio
+import itertools
+import resource
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import STORES_DIR
+import jobs  # noqa: F401 -- must load before stores.core (circular import)
+from metrics.core import embed
+from stores.core import Store, l2norm
+from stores import api as stores_api
+
+from .corpus import SyntheticCorpus
+
+STUB_MODEL = "stub/hash-embedding-384"
+
+
+def peak_rss_bytes() -> int:
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+def percentiles(latencies: List[float]) -> Dict:
+    arr = np.asarray(latencies) * 1000
+    return {
+        "n": len(arr),
+        "p50_ms": round(float(np.percentile(arr, 50)), 3),
+        "p99_ms": round(float(np.percentile(arr, 99)), 3),
+        "mean_ms": round(float(arr.mean()), 3),
+    }
+
+
+def _bulk_load(s: Store, batches, batch_size: int):
+    """Fill the store past the measured ingest sample: one index write at the end."""
+    model = asyncio.run(s.load_encoder())
+    index = None
+    for batch in batches:
+        for lo in range(0, len(batch), batch_size):
+            chunk = batch[lo : lo + batch_size]
+            embs = l2norm(embed(model, chunk).astype(np.float32))
+            if index is None:
+                index = s._writable_index(embs.shape[1])
+            s._append_entries([{"id": f"bulk-{index.ntotal + i}", "text": t} for i, t in enumerate(chunk)])
+            index.add(embs)
+    s._save_index(index)
+
+
+def run_ingest(s: Store, corpus: SyntheticCorpus, size: int, sample: int, batch_size: int) -> Dict:
+    batches = corpus.batches(size)
+    measured: List[str] = []
+    while len(measured) < sample:
+        measured += next(batches)
+    rest = [measured[sample:]] if len(measured) > sample else []
+    measured = measured[:sample]
+
+    t0 = time.perf_counter()
+    asyncio.run(s.add_texts(measured, batch_size=batch_size))
+    seconds = time.perf_counter() - t0
+    out = {
+        "texts": len(measured),
+        "batch_size": batch_size,
+        "seconds": round(seconds, 3),
+        "texts_per_s": round(len(measured) / seconds, 1),
+    }
+
+    if size > sample:
+        # The rest is loaded without per-batch persistence; reported, not the headline number
+        t0 = time.perf_counter()
+        _bulk_load(s, itertools.chain(rest, batches), batch_size=max(batch_size, 1024))
+        out["bulk_loaded"] = size - sample
+        out["bulk_load_seconds"] = round(time.perf_counter() - t0, 3)
+    return out
+
+
+def run_search(s: Store, queries: List[str], ks: List[int], concurrency: List[int]) -> List[Dict]:
+    def one(args):
+        q, k = args
+        t0 = time.perf_counter()
+        s.search(q, k=k)
+        return time.perf_counter() - t0
+
+    # Warm-up (encoder cache, page cache)
+    for q in queries[:5]:
+        s.search(q, k=ks[0])
+
+    results = []
+    for k in ks:
+        for c in concurrency:
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=c) as pool:
+                latencies = list(pool.map(one, [(q, k) for q in queries]))
+            wall = time.perf_counter() - t0
+            results.append({"k": k, "concurrency": c, "qps": round(len(queries) / wall, 2), **percentiles(latencies)})
+    return results
+
+
+def run_search_mmr(s: Store, queries: List[str], k: int, mmr_lambda: float = 0.5) -> Dict:
+    """Diversity reranking vs plain search, sequential, same queries."""
+    plain, diverse = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        s.search(q, k=k)
+        t1 = time.perf_counter()
+        s.search(q, k=k, mmr_lambda=mmr_lambda)
+        diverse.append(time.perf_counter() - t1)
+        plain.append(t1 - t0)
+    out = {"k": k, "pool": 4 * k, "lambda": mmr_lambda, **percentiles(diverse)}
+    out["overhead_p50_ms"] = round(out["p50_ms"] - percentiles(plain)["p50_ms"], 3)
+    return out
+
+
+def run_graph(s: Store, queries: List[str], graph_k: int) -> Dict:
+    t0 = time.perf_counter()
+    asyncio.run(s.build_graph(k=graph_k))
+    build = time.perf_counter() - t0
+
+    latencies = []
+    pairs = list(zip(queries[0::2], queries[1::2]))
+    for a, b in pairs:
+        req = stores_api.GraphSearchReq(store=s.path.name, start=a, end=b, k=5)
+        t0 = time.perf_counter()
+        asyncio.run(stores_api.graph_search(req))
+        latencies.append(time.perf_counter() - t0)
+    return {
+        "k": graph_k,
+        "build_seconds": round(build, 3),
+        "graph_search": percentiles(latencies) if latencies else None,
+    }
+
+
+def run_size(
+    size: int,
+    seed: int,
+    ingest_sample: int,
+    batch_size: int,
+    queries: int,
+    ks: List[int],
+    concurrency: List[int],
+    graph_k: int,
+    graph_queries: int,
+    graph_max_size: Optional[int],
+) -> Dict:
+    corpus = SyntheticCorpus(seed=seed)
+    s = Store.create(f"bench-{size}", STORES_DIR, STUB_MODEL)
+    result: Dict = {"size": size}
+
+    result["ingest"] = run_ingest(s, corpus, size, min(size, ingest_sample), batch_size)
+    result["rss_after_ingest"] = peak_rss_bytes()
+
+    qs = corpus.queries(max(queries, 2 * graph_queries))
+    result["search"] = run_search(s, qs[:queries], ks, concurrency)
+    result["search_mmr"] = run_search_mmr(s, qs[:queries], ks[-1])
+
+    if graph_max_size is None or size <= graph_max_size:
+        result["graph"] = run_graph(s, qs[: 2 * graph_queries], graph_k)
+    else:
+        result["graph"] = {"skipped": f"size > --graph-max-size ({graph_max_size})"}
+
+    result["peak_rss_bytes"] = peak_rss_bytes()
+    return result
@@ -1,6 +1,39 @@
+import os
+import time
 from pathlib import Path
 
+# config is the first backend module imported; close enough to process start
+PROCESS_STARTED = time.time()
+
 CACHE_FOLDER = Path("./.cache/huggingface")
 STORES_DIR = Path("./.cache/stores")
+SNAPSHOTS_DIR = Path("./.cache/snapshots")
+
+STORES_DIR.mkdir(parents=True, exist_ok=True)
+SNAPSHOTS_DIR.mkdir(parents=True, exist_ok=True)
+
+# Background jobs
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))  # jobs running concurrently
+INTERACTIVE_UPLOAD_BYTES = int(os.getenv("INTERACTIVE_UPLOAD_BYTES", str(1 << 20)))  # smaller uploads jump the bulk queue
+JOB_PROGRESS_INTERVAL = float(os.getenv("JOB_PROGRESS_INTERVAL", "0.5"))  # min seconds between progress pushes per job
+JOB_LOG_RING = int(os.getenv("JOB_LOG_RING", "200"))  # log lines kept in memory per job; older ones spill to disk
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "30"))  # finished jobs older than this are pruned (0 = keep)
+JOB_RETENTION_MAX = int(os.getenv("JOB_RETENTION_MAX", "10000"))  # at most this many finished jobs are kept (0 = no cap)
+
+# Startup warm-up (runs in the background; /health reports readiness)
+WARMUP_STORES = os.getenv("WARMUP_STORES", "")  # comma separated store names to preload, "*" = all, empty = off
+WARMUP_MODELS = os.getenv("WARMUP_MODELS", "")  # extra model ids to load (models of warmed stores are loaded anyway)
+
+# Memory budget (loaded indexes, k-NN graphs and encoder models; least recently used are evicted first)
+MEMORY_BUDGET_MB = int(os.getenv("MEMORY_BUDGET_MB", "0"))  # 0 = no limit
+MODEL_IDLE_SECONDS = float(os.getenv("MODEL_IDLE_SECONDS", "300"))  # models used more recently than this are never evicted
+
+# Search
+RESULT_CACHE_MB = int(os.getenv("RESULT_CACHE_MB", "64"))  # cached /search, /interpolate, /graph_search responses (0 = off)
+FEDERATED_SEARCH_THREADS = int(os.getenv("FEDERATED_SEARCH_THREADS", str(min(8, os.cpu_count() or 1))))  # stores searched in parallel
+
+# k-NN graph
+GRAPH_FLUSH_SECONDS = float(os.getenv("GRAPH_FLUSH_SECONDS", "60"))  # ingest saves the extended graph at most this often (and when it ends)
 
-STORES_DIR.mkdir(parents=True, exist_ok=True)
\ No newline at end of file
+# Chunked ingestion (stores created with chunk_tokens)
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", "1"))  # encoder calls in flight per ingest batch (torch already uses intra-op threads)
@@ -1,90 +1,396 @@
-from .core import Job, JOBS, QUEUE
+from .core import Job, JobKind, JOBS
 from .broadcast import broadcast
+from .formats import UploadReader, open_upload
+from .scheduler import SCHEDULER
+from metrics.core import JOB_THROUGHPUT
+from metrics.trace import span, start_trace
 from stores.core import get_store
+from stores.snapshot import export_snapshot, import_snapshot
+from config import STORES_DIR
+from typing import Dict
 import asyncio
+import time
 
 
-async def worker():
-    while True:
-        task = await QUEUE.get()
+async def run_build_graph(job: Job):
+    params = job.params
+    job.status = "processing"
+    job.log("Graph build started.")
+    await broadcast(job)
 
-        # --- Graph-building job ---
-        if isinstance(task, tuple) and task[0] == "build_graph":
-            _, params, job_id = task
-            job = JOBS[job_id]
-            job.status = "processing"
-            job.log("Graph build started.")
-            job.save()
-            await broadcast(job)
+    try:
+        s = get_store(job.store)
+        with span("graph"):
+            await s.build_graph(
+                k=params.get("k", 10),
+                efConstruction=params.get("efConstruction", 200),
+                M=params.get("M", 32),
+                job=job,
+            )
 
-            try:
-                s = get_store(params["store"])
-                await s.build_graph(
-                    k=params.get("k", 10),
-                    efConstruction=params.get("efConstruction", 200),
-                    M=params.get("M", 32),
-                    job=job,
-                )
-
-                job.status = "done"
-                job.log("Graph build finished successfully.")
-                job.save()
-                await broadcast(job)
+        job.status = "done"
+        job.log("Graph build finished successfully.")
+        await broadcast(job)
 
-            except Exception as e:
-                job.status = "failed"
-                job.error = str(e)
-                job.log(f"Graph build failed: {e}")
-                job.save()
-                await broadcast(job)
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e)
+        job.log(f"Graph build failed: {e}")
+        await broadcast(job)
+
+
+async def run_eval_ann(job: Job):
+    params = job.params
+    job.status = "processing"
+    job.log("ANN evaluation started.")
+    await broadcast(job)
 
-            finally:
-                QUEUE.task_done()
-                continue
+    loop = asyncio.get_running_loop()
 
-        # --- Ingestion job ---
-        job: Job = task
-        job.status = "processing"
-        job.log("Job resumed." if job.processed > 0 else "Job started.")
-        job.save()
+    def progress(done: int, total: int, row: Dict):
+        # Called from the worker thread after each config
+        job.total = total
+        job.processed = done
+        job.progress = int(done / total * 100)
+        job.log(f"{row['config']}: recall={row['recall']:.3f} p50={row['p50_ms']:.3f}ms")
+        asyncio.run_coroutine_threadsafe(broadcast(job), loop)
+
+    try:
+        s = get_store(job.store)
+        report = await asyncio.to_thread(
+            s.eval_ann,
+            k=params.get("k", 10),
+            n_queries=params.get("queries", 200),
+            query_texts=params.get("query_texts"),
+            configs=params.get("configs"),
+            target_recall=params.get("target_recall", 0.95),
+            write=params.get("write", False),
+            progress=progress,
+        )
+
+        best = report["best"]
+        if best is None:
+            job.log(f"No config reached recall {report['target_recall']}.")
+        else:
+            action = "written to meta.json" if params.get("write") else "not written"
+            job.log(f"Best: {best['config']} recall={best['recall']:.3f} p50={best['p50_ms']:.3f}ms ({action})")
+        job.status = "done"
+        job.progress = 100
+        job.log("ANN evaluation finished successfully.")
         await broadcast(job)
 
-        try:
-            s = get_store(job.store)
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e)
+        job.log(f"ANN evaluation failed: {e}")
+        await broadcast(job)
 
-            # 1. Reconcile index with existing entries
-            await s.reconcile_index(
-                batch_size=getattr(job, "batch_size", 64),
-                job=job,
-            )
 
-            # 2. Count already persisted lines
-            already = len(s.get_all())
+async def run_find_duplicates(job: Job):
+    params = job.params
+    job.status = "processing"
+    job.log(f"Near-duplicate clustering started (threshold={params.get('threshold', 0.95)}).")
+    await broadcast(job)
 
-            # 3. Read upload file, skip already-ingested lines
-            lines = await asyncio.to_thread(
-                lambda: [ln.strip() for ln in open(job.path, "r") if ln.strip()]
-            )
-            remaining = lines[already:]
+    loop = asyncio.get_running_loop()
+
+    def progress(done: int, total: int, pairs: int):
+        # Called from the worker thread after each block
+        job.total = total
+        job.processed = done
+        job.progress = int(done / total * 100)
+        job.log(f"Scanned {done}/{total} rows, {pairs} pairs above threshold")
+        asyncio.run_coroutine_threadsafe(broadcast(job), loop)
+
+    try:
+        s = get_store(job.store)
+        stats = await asyncio.to_thread(
+            s.find_duplicates,
+            threshold=params.get("threshold", 0.95),
+            k=params.get("k", 32),
+            block_size=params.get("block_size", 4096),
+            progress=progress,
+        )
+        job.status = "done"
+        job.progress = 100
+        job.log(f"Found {stats['clusters']} clusters covering {stats['duplicate_rows']} duplicate entries.")
+        await broadcast(job)
+
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e)
+        job.log(f"Near-duplicate clustering failed: {e}")
+        await broadcast(job)
+
+
+async def run_topics(job: Job):
+    params = job.params
+    job.status = "processing"
+    job.log(f"Topic clustering started (k={params.get('k', 50)}).")
+    await broadcast(job)
+
+    loop = asyncio.get_running_loop()
+
+    def progress(phase: str, done: int, total: int):
+        # Called from the worker thread after training and after each block
+        job.total = total
+        job.processed = done
+        job.progress = int(done / total * 100) if phase == "assign" else 0
+        job.log("K-means trained, assigning entries..." if phase == "train" else f"Assigned {done}/{total} entries")
+        asyncio.run_coroutine_threadsafe(broadcast(job), loop)
+
+    try:
+        s = get_store(job.store)
+        topics = await asyncio.to_thread(
+            s.compute_topics,
+            k=params.get("k", 50),
+            niter=params.get("niter", 20),
+            sample=params.get("sample", 2000),
+            representatives=params.get("representatives", 5),
+            progress=progress,
+        )
+        job.status = "done"
+        job.progress = 100
+        job.log(f"Computed {topics.k} topics over {topics.n} entries.")
+        await broadcast(job)
+
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e)
+        job.log(f"Topic clustering failed: {e}")
+        await broadcast(job)
+
+
+def _snapshot_progress(job: Job, loop: asyncio.AbstractEventLoop):
+    """Progress callback for snapshot work running in a worker thread."""
+    phase = {"name": None}
+
+    def progress(done: int, total: int, name: str):
+        if name != phase["name"]:
+            phase["name"] = name
+            job.log(f"Writing {name}..." if job.kind == JobKind.EXPORT_SNAPSHOT else f"Importing {name}...")
+        job.total = total
+        job.processed = done
+        job.progress = int(done / total * 100) if total else 100
+        asyncio.run_coroutine_threadsafe(broadcast(job), loop)
+
+    return progress
 
-            # 4. Ingest remainder incrementally
-            await s.add_texts(
-                remaining,
-                batch_size=getattr(job, "batch_size", 64),
-                job=job,
-            )
 
+async def run_export_snapshot(job: Job):
+    params = job.params
+    job.status = "processing"
+    job.log(f"Snapshot export started -> {job.path.name}")
+    await broadcast(job)
+
+    try:
+        s = get_store(job.store)
+        t0 = time.monotonic()
+        directory = await asyncio.to_thread(
+            export_snapshot,
+            s,
+            job.path,
+            include_index=params.get("include_index"),
+            include_graph=params.get("include_graph", True),
+            progress=_snapshot_progress(job, asyncio.get_running_loop()),
+        )
+        size = job.path.stat().st_size
+        elapsed = max(time.monotonic() - t0, 1e-9)
+        job.status = "done"
+        job.progress = 100
+        job.log(
+            f"Exported {directory['count']} entries, blocks: {', '.join(directory['blocks'])} "
+            f"({size / 2**20:.1f} MiB, {size / 2**20 / elapsed:.1f} MiB/s)"
+        )
+        await broadcast(job)
+
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e)
+        job.log(f"Snapshot export failed: {e}")
+        await broadcast(job)
+
+
+async def run_import_snapshot(job: Job):
+    params = job.params
+    job.status = "processing"
+    job.log(f"Snapshot import started from {job.path.name}")
+    await broadcast(job)
+
+    try:
+        result = await asyncio.to_thread(
+            import_snapshot,
+            job.path,
+            STORES_DIR,
+            job.store,
+            overwrite=params.get("overwrite", False),
+            progress=_snapshot_progress(job, asyncio.get_running_loop()),
+        )
+        job.status = "done"
+        job.progress = 100
+        job.log(f"Imported {result['count']} entries (dim={result['dim']}) into store {job.store}.")
+        await broadcast(job)
+
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e)
+        job.log(f"Snapshot import failed: {e}")
+        await broadcast(job)
+
+
+def _recover_uncheckpointed(s, reader: UploadReader, ckpt: Dict, batch_size: int):
+    """
+    The store has rows past the checkpoint: either our last batch was written
+    before the checkpoint was committed, or another job wrote to the store since.
+    Compare the rows after the checkpoint with the next upload lines and skip
+    the lines that are already in the store. In chunked stores one line may
+    span several rows (its chunks).
+    """
+    records, _ = reader.read(batch_size)
+    texts = [r["text"] for r in records]
+    n = ckpt["entries"][1]
+    row, done = n, 0
+    while done < len(texts):
+        entry = s.get_rows([row]).get(row)
+        if entry is None:
+            break
+        if "parent" in entry:
+            if entry["chunk"] != 0 or entry["text"] not in texts[done]:
+                break
+            row += 1
+            while s.get_rows([row]).get(row, {}).get("parent") == entry["parent"]:
+                row += 1
+        elif entry["text"] == texts[done]:
+            row += 1
+        else:
+            break
+        done += 1
+
+    reader.seek(ckpt["offset"])
+    if done:
+        _, consumed = reader.read(done)
+        ckpt["offset"] += consumed
+        ckpt["texts"] += done
+    if s.count == row:
+        ckpt["entries"][1] = ckpt["index"][1] = s.count
+    else:
+        # Foreign rows follow ours: continue in a new row range
+        ckpt["entries"] = [s.count, s.count]
+        ckpt["index"] = [s.count, s.count]
+
+
+async def run_ingest(job: Job):
+    job.status = "processing"
+    job.log("Job resumed." if job.checkpoint or job.processed > 0 else "Job started.")
+    await broadcast(job)
+
+    batch_size = getattr(job, "batch_size", 64)
+    try:
+        s = get_store(job.store)
+
+        # 1. Reconcile index with existing entries (a crash can leave entries ahead of the index)
+        await s.reconcile_index(batch_size=batch_size, job=job)
+
+        # Uploads are read in batches of records; `offset` is a byte offset (a row for Parquet)
+        with await asyncio.to_thread(open_upload, job.path, job.params) as reader:
+            size = reader.size
+            # 2. Find where to resume
+            ckpt = job.checkpoint
+            if ckpt is None:
+                ckpt = {"offset": 0, "texts": 0, "entries": [s.count, s.count], "index": [s.count, s.count]}
+                reader.seek(0)
+                if job.processed > 0:
+                    # Job from before checkpoints: `processed` lines were already ingested
+                    _, ckpt["offset"] = await asyncio.to_thread(reader.read, job.processed)
+                    ckpt["texts"] = job.processed
+                    job.log(f"No checkpoint; skipping {job.processed} already ingested lines.")
+            else:
+                reader.seek(ckpt["offset"])
+                if s.count > ckpt["entries"][1]:
+                    await asyncio.to_thread(_recover_uncheckpointed, s, reader, ckpt, batch_size)
+                    job.log(f"Resuming after {ckpt['texts']} texts.")
+            job.commit_checkpoint(ckpt)
+            job.processed = ckpt["texts"]
+            job.log(f"Ingesting {job.params.get('format', 'text')} from {ckpt['offset']}/{size} (batch={batch_size}).")
+            await broadcast(job)
+
+            # 3. Stream the upload batch by batch, checkpointing after each commit
+            model = await s.load_encoder()
+            t0, texts0 = time.monotonic(), ckpt["texts"]
+            while True:
+                if job.stop_requested:
+                    break
+                with span("read"):
+                    records, consumed = await asyncio.to_thread(reader.read, batch_size)
+                if not records:
+                    ckpt["offset"] += consumed
+                    break
+
+                chunk = [r["text"] for r in records]
+                ids = [r.get("id") for r in records] if any("id" in r for r in records) else None
+                metadata = [r.get("metadata") for r in records] if any("metadata" in r for r in records) else None
+                await s.add_batch(model, chunk, ids=ids, metadata=metadata)
+                ckpt["offset"] += consumed
+                ckpt["texts"] += len(chunk)
+                ckpt["entries"][1] = ckpt["index"][1] = s.count
+                job.commit_checkpoint(ckpt)
+
+                job.processed = ckpt["texts"]
+                job.progress = int(ckpt["offset"] / size * 100) if size else 100
+                # Total is estimated from the bytes consumed so far
+                job.total = max(job.processed, int(job.processed * size / max(ckpt["offset"], 1)))
+                rate = (ckpt["texts"] - texts0) / max(time.monotonic() - t0, 1e-9)
+                JOB_THROUGHPUT.set(rate, job=job.id, store=job.store)
+                job.log(f"Processed {job.processed} texts ({ckpt['offset']}/{size}, {rate:.1f} texts/s)")
+                await broadcast(job)
+
+        # Batches extend the k-NN graph in memory; save it once for the job
+        await asyncio.to_thread(s.flush_graph)
+
+        if job.stop_requested == "pause":
+            job.status = "paused"
+            job.log(f"Paused after {job.processed} texts.")
+        elif job.stop_requested == "cancel":
+            job.status = "cancelled"
+            job.log(f"Cancelled after {job.processed} texts (ingested entries are kept).")
+        else:
             job.status = "done"
+            job.total = job.processed
+            job.progress = 100
+            job.commit_checkpoint(ckpt)
+            if s.topics is not None:
+                # New rows join the existing topics (no re-clustering)
+                await asyncio.to_thread(s.sync_topics)
+            if reader.skipped:
+                job.log(f"Skipped {reader.skipped} rows without text.")
             job.log("Ingestion finished successfully.")
-            job.save()
-            await broadcast(job)
+        job.stop_requested = None
+        await broadcast(job)
+
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e)
+        job.log(f"Error: {e}")
+        await broadcast(job)
+
+    finally:
+        JOB_THROUGHPUT.remove(job=job.id, store=job.store)
+
+
+HANDLERS = {
+    JobKind.INGEST: run_ingest,
+    JobKind.BUILD_GRAPH: run_build_graph,
+    JobKind.EVAL_ANN: run_eval_ann,
+    JobKind.FIND_DUPLICATES: run_find_duplicates,
+    JobKind.TOPICS: run_topics,
+    JobKind.EXPORT_SNAPSHOT: run_export_snapshot,
+    JobKind.IMPORT_SNAPSHOT: run_import_snapshot,
+}
 
-        except Exception as e:
-            job.status = "failed"
-            job.error = str(e)
-            job.log(f"Error: {e}")
-            job.save()
-            await broadcast(job)
 
-        finally:
-            QUEUE.task_done()
+async def run_job(job: Job):
+    """Entry point handed to the scheduler: dispatch on the job kind."""
+    with start_trace(f"job {job.kind.value} {job.id}") as trace:
+        await HANDLERS[job.kind](job)
+    job.log(f"Timing: {trace.describe()}; total {trace.duration:.2f}s")
+    await broadcast(job, force=True)
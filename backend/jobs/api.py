@@ -1,12 +1,111 @@
-from fastapi import APIRouter
-from jobs.core import list_jobs
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query
+from jobs.broadcast import broadcast
+from jobs.core import DB, JOBS, JobKind, get_job, list_jobs, prune_jobs
+from jobs.scheduler import SCHEDULER
 
 router = APIRouter()
 
 @router.get("/jobs")
-def list_jobs_route():
+def list_jobs_route(
+    status: Optional[List[str]] = Query(None),
+    store: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+):
     """
-    Return all jobs, including pending, processing, done, failed.
+    Return jobs newest first (pending, processing, done, failed), optionally
+    filtered by status (repeatable) and store, plus scheduler queue depth and wait times.
+    Pass `next_cursor` back as `cursor` to get the next page.
     """
-    jobs = list_jobs()
-    return {"jobs": [job.dict() for job in jobs.values()]}
\ No newline at end of file
+    before = tuple(cursor.split("|", 1)) if cursor else None
+    jobs = list_jobs(status=status, store=store, limit=limit, before=before)
+    next_cursor = f"{jobs[-1]['created_at']}|{jobs[-1]['id']}" if len(jobs) == limit else None
+    return {
+        "jobs": jobs,
+        "total": DB.count(statuses=status, store=store),
+        "next_cursor": next_cursor,
+        "queue": SCHEDULER.stats(),
+    }
+
+
+@router.get("/jobs/{job_id}")
+def job_detail(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job.dict()
+
+
+@router.get("/jobs/{job_id}/logs")
+def job_logs(job_id: str):
+    """
+    Full log of a job: lines spilled to the journal plus the in-memory tail.
+    """
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return {"id": job.id, "logs": job.all_logs()}
+
+
+async def _stop_job(job_id: str, action: str):
+    """
+    Pause or cancel a job. Queued jobs stop right away; a running ingest stops
+    at the next batch boundary, after its last batch has been committed.
+    """
+    queued = await SCHEDULER.remove(job_id)
+    if queued is not None:
+        queued.status = "paused" if action == "pause" else "cancelled"
+        queued.log(f"Job {queued.status} before it started.")
+        await broadcast(queued)
+        JOBS.pop(job_id, None)
+        return {"ok": True, "status": queued.status}
+
+    job = JOBS.get(job_id)
+    if job is None or not SCHEDULER.is_running(job_id):
+        existing = get_job(job_id)
+        if existing is None:
+            raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+        if action == "cancel" and existing.status == "paused":
+            existing.status = "cancelled"
+            existing.log("Paused job cancelled.")
+            existing.save()
+            return {"ok": True, "status": existing.status}
+        raise HTTPException(status_code=409, detail=f"Job is {existing.status}")
+    if job.kind != JobKind.INGEST:
+        raise HTTPException(status_code=409, detail=f"Running {job.kind.value} jobs cannot be stopped")
+
+    job.stop_requested = action
+    job.log(f"{action.capitalize()} requested; stopping at the next batch boundary.")
+    await broadcast(job)
+    return {"ok": True, "status": "stopping"}
+
+
+@router.post("/jobs/{job_id}/pause")
+async def pause_job(job_id: str):
+    return await _stop_job(job_id, "pause")
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    return await _stop_job(job_id, "cancel")
+
+
+@router.post("/jobs/{job_id}/resume")
+async def resume_job(job_id: str):
+    """Requeue a paused job; it continues from its last checkpoint."""
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    if job.status != "paused":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}, not paused")
+    job.log("Job resumed by request.")
+    job.started_at = None
+    await SCHEDULER.submit(job)
+    return {"ok": True, "status": job.status}
+
+
+@router.post("/jobs/prune")
+def prune_jobs_route():
+    """Apply the retention policy now."""
+    return {"removed": prune_jobs()}
@@ -1,20 +1,88 @@
-from .core import JOBS, clients, Job
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
 
-async def broadcast(job: Job):
+from config import JOB_PROGRESS_INTERVAL
+from metrics.core import BROADCAST_COALESCED, BROADCAST_SECONDS
+from .core import INACTIVE_STATUSES, JOBS, clients, Job
+
+
+@dataclass
+class _Sent:
+    """What subscribers last received for a job."""
+    at: float = 0.0
+    fields: Dict = field(default_factory=dict)
+    log_count: int = 0
+    flush: Optional[asyncio.TimerHandle] = None
+
+
+class ProgressPublisher:
     """
-    Broadcast a job update to all connected websocket clients.
-    Also update JOBS dict and persist job to disk.
+    Coalesces job updates before they hit disk and websockets:
+      - at most one push per job every `min_interval` seconds (status changes go out at once)
+      - suppressed updates are not lost: a trailing flush sends them when the interval ends
+      - messages are deltas: changed progress fields + log lines since the last push
     """
-    # Ensure it's saved + visible in JOBS
-    JOBS[job.id] = job
-    job.save()
 
-    # Prepare payload
-    msg = {"type": "job_update", "job": job.dict()}
+    def __init__(self, min_interval: float = JOB_PROGRESS_INTERVAL):
+        self.min_interval = min_interval
+        self._sent: Dict[str, _Sent] = {}
+
+    async def publish(self, job: Job, force: bool = False):
+        JOBS[job.id] = job
+        sent = self._sent.get(job.id)
+        if sent is not None and not force and job.status == sent.fields.get("status"):
+            remaining = self.min_interval - (time.monotonic() - sent.at)
+            if remaining > 0:
+                BROADCAST_COALESCED.inc()
+                if sent.flush is None:
+                    loop = asyncio.get_running_loop()
+                    sent.flush = loop.call_later(remaining, lambda: asyncio.ensure_future(self.flush(job)))
+                return
+        await self.flush(job)
+
+    async def flush(self, job: Job):
+        with BROADCAST_SECONDS.time():
+            await self._flush(job)
+
+    async def _flush(self, job: Job):
+        first = job.id not in self._sent
+        sent = self._sent.setdefault(job.id, _Sent())
+        if sent.flush is not None:
+            sent.flush.cancel()
+            sent.flush = None
+
+        # Persist + build the delta
+        job.save()
+        fields = job.progress_fields()
+        changes = {k: v for k, v in fields.items() if sent.fields.get(k, ...) != v}
+        logs = job.logs_since(sent.log_count)
+        # First push for a job: clients may not know it yet, send it whole
+        msg = {"type": "job_update", "job": job.dict()} if first else {
+            "type": "job_delta",
+            "id": job.id,
+            "changes": changes,
+            "log_offset": sent.log_count,
+            "logs": logs,
+            "log_count": job.log_count,
+        }
+        sent.at = time.monotonic()
+        sent.fields = fields
+        sent.log_count = job.log_count
+
+        if job.status in INACTIVE_STATUSES:
+            self._sent.pop(job.id, None)
 
-    # Broadcast to all connected clients
-    dead_clients = []
-    for ws in list(clients):
+        await send_to_subscribers(job.id, msg)
+
+
+async def send_to_subscribers(job_id: str, msg: Dict):
+    """Send a message to every websocket subscribed to `job_id` (or to all jobs)."""
+    dead_clients: List = []
+    for ws, subscribed in list(clients.items()):
+        if subscribed is not None and job_id not in subscribed:
+            continue
         try:
             await ws.send_json(msg)
         except Exception as e:
@@ -23,4 +91,15 @@ async def broadcast(job: Job):
 
     # Cleanup broken sockets
     for ws in dead_clients:
-        clients.discard(ws)
+        clients.pop(ws, None)
+
+
+PUBLISHER = ProgressPublisher()
+
+
+async def broadcast(job: Job, force: bool = False):
+    """
+    Publish a job update to subscribed websocket clients (rate-limited, as a delta).
+    Also keeps the job in the JOBS dict and persists it whenever an update goes out.
+    """
+    await PUBLISHER.publish(job, force=force)
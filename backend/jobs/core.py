@@ -1,21 +1,73 @@
-import asyncio, json
-from datetime import datetime, timezone
+import json
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from enum import Enum
 from pathlib import Path
-from typing import Dict
+from typing import Deque, Dict, List, Optional, Tuple
 import uuid
 from fastapi import WebSocket
 
+from config import JOB_LOG_RING, JOB_RETENTION_DAYS, JOB_RETENTION_MAX
+from .db import JobDB, TERMINAL_STATUSES
+
 JOBS_DIR = Path(".cache/jobs")
 JOBS_DIR.mkdir(exist_ok=True)
 
-JOBS = {}
-QUEUE = asyncio.Queue()
-clients: set[WebSocket] = set()
+# Live (queued / running) jobs; finished ones only live in the database
+JOBS: Dict[str, "Job"] = {}
+# Statuses of jobs that are not queued or running
+INACTIVE_STATUSES = TERMINAL_STATUSES + ("paused",)
+# websocket -> subscribed job ids (None = all jobs)
+clients: Dict[WebSocket, Optional[set[str]]] = {}
+
+
+class JobKind(str, Enum):
+    INGEST = "ingest"
+    BUILD_GRAPH = "build_graph"
+    EVAL_ANN = "eval_ann"
+    FIND_DUPLICATES = "find_duplicates"
+    TOPICS = "topics"
+    EXPORT_SNAPSHOT = "export_snapshot"
+    IMPORT_SNAPSHOT = "import_snapshot"
+
+
+class Priority(str, Enum):
+    INTERACTIVE = "interactive"
+    BULK = "bulk"
+
+
+# Scheduling order: interactive jobs are always picked before bulk ones
+PRIORITY_ORDER = [Priority.INTERACTIVE, Priority.BULK]
+
+# Kinds that mutate a store and need its exclusive lock
+# (exports take it too, so the snapshot is consistent). Duplicate clustering and
+# topics rewrite store files + meta.json: an import must not swap the directory under them.
+WRITER_KINDS = {
+    JobKind.INGEST,
+    JobKind.BUILD_GRAPH,
+    JobKind.FIND_DUPLICATES,
+    JobKind.TOPICS,
+    JobKind.EXPORT_SNAPSHOT,
+    JobKind.IMPORT_SNAPSHOT,
+}
 
 
 class Job:
-    def __init__(self, store: str, filename: str, path: Path, batch_size: int, job_id: str | None = None):
+    def __init__(
+        self,
+        store: str,
+        filename: str,
+        path: Path,
+        batch_size: int,
+        job_id: str | None = None,
+        kind: JobKind = JobKind.INGEST,
+        params: Optional[Dict] = None,
+        priority: Priority = Priority.BULK,
+    ):
         self.id = job_id or str(uuid.uuid4())
+        self.kind = JobKind(kind)
+        self.params = params or {}
+        self.priority = Priority(priority)
         self.store = store
         self.filename = filename
         self.path = path
@@ -25,9 +77,19 @@ class Job:
         self.total = 0
         self.processed = 0
         self.error = None
-        self.logs: list[str] = []
+        # Recent log lines only; older lines spill to `log_file` on save
+        self.logs: Deque[Dict] = deque(maxlen=JOB_LOG_RING)
+        self.log_count = 0
+        self._spill: List[Dict] = []
         self.created_at = datetime.now().isoformat()
         self.updated_at = self.created_at
+        self.queued_at: Optional[str] = None
+        self.started_at: Optional[str] = None
+        # Ingest resume point, committed after every batch:
+        #   offset: upload bytes consumed (rows for Parquet), entries/index: [start, end) rows written by this job
+        self.checkpoint: Optional[Dict] = None
+        # Set by pause/cancel requests; honored at the next batch boundary
+        self.stop_requested: Optional[str] = None
 
     def _now(self) -> str:
         return datetime.now(timezone.utc).isoformat()
@@ -37,12 +99,49 @@ class Job:
 
     def log(self, message: str):
         ts = self._now()
+        if len(self.logs) == self.logs.maxlen:
+            self._spill.append(self.logs[0])
         self.logs.append({"timestamp": ts, "message": message})
+        self.log_count += 1
         self.touch()
 
+    def logs_since(self, count: int) -> List[Dict]:
+        """Log lines with absolute index >= count that are still in the ring."""
+        new = self.log_count - count
+        if new <= 0:
+            return []
+        return list(self.logs)[max(0, len(self.logs) - new):]
+
+    def progress_fields(self) -> Dict:
+        """Small, frequently changing fields sent in progress deltas."""
+        return {
+            "status": self.status,
+            "progress": self.progress,
+            "processed": self.processed,
+            "total": self.total,
+            "error": self.error,
+            "updated_at": self.updated_at,
+            "started_at": self.started_at,
+        }
+
+    @property
+    def is_writer(self) -> bool:
+        # ANN evaluation only writes when asked to store its best config
+        return self.kind in WRITER_KINDS or (self.kind == JobKind.EVAL_ANN and bool(self.params.get("write")))
+
+    def wait_seconds(self) -> Optional[float]:
+        """Time spent queued (so far, if not started yet)."""
+        if not self.queued_at:
+            return None
+        end = datetime.fromisoformat(self.started_at) if self.started_at else datetime.now(timezone.utc)
+        return max((end - datetime.fromisoformat(self.queued_at)).total_seconds(), 0.0)
+
     def dict(self):
         return {
             "id": self.id,
+            "kind": self.kind.value,
+            "priority": self.priority.value,
+            "params": self.params,
             "batch_size": self.batch_size,
             "store": self.store,
             "filename": self.filename,
@@ -51,71 +150,142 @@ class Job:
             "processed": self.processed,
             "total": self.total,
             "error": self.error,
-            "logs": self.logs,
+            "logs": list(self.logs),
+            "log_count": self.log_count,
             "created_at": self.created_at,
             "updated_at": self.updated_at,
+            "queued_at": self.queued_at,
+            "started_at": self.started_at,
+            "wait_seconds": self.wait_seconds(),
+            "checkpoint": self.checkpoint,
             "path": str(self.path),
         }
 
     # -----------------------
     # Persistence
     # -----------------------
-    @property
-    def file(self) -> Path:
-        return JOBS_DIR / f"{self.id}.json"
-
     def save(self):
         self.updated_at = datetime.now().isoformat()
-        with open(self.file, "w") as f:
-            json.dump(self.dict(), f, indent=2)
+        if self._spill:
+            first_seq = self.log_count - len(self.logs) - len(self._spill)
+            DB.append_logs(self.id, first_seq, self._spill)
+            self._spill = []
+        DB.upsert(self.dict())
+
+    def commit_checkpoint(self, checkpoint: Dict):
+        self.checkpoint = checkpoint
+        self.touch()
+        DB.save_checkpoint(self.id, checkpoint, self.updated_at)
+
+    def all_logs(self) -> List[Dict]:
+        """Spilled lines from the journal followed by the in-memory ring."""
+        return DB.logs(self.id) + self._spill + list(self.logs)
 
     @classmethod
-    def load(cls, file: Path):
-        with open(file, "r") as f:
-            data = json.load(f)
-        print(data)
-        print(data.get("store"))
+    def from_dict(cls, data: Dict) -> "Job":
+        # Jobs saved before typed kinds: graph builds were marked by filename only
+        kind = data.get("kind") or (JobKind.BUILD_GRAPH if data["filename"] == "graph" else JobKind.INGEST)
+        params = data.get("params") or ({"store": data["store"], "k": data["batch_size"]} if kind == JobKind.BUILD_GRAPH else {})
         job = cls(
             store=data["store"],
             filename=data["filename"],
             path=Path(data["path"]),
             batch_size=data["batch_size"],
             job_id=data["id"],
+            kind=kind,
+            params=params,
+            priority=data.get("priority", Priority.BULK),
         )
         job.status = data["status"]
         job.progress = data["progress"]
         job.total = data["total"]
         job.processed = data["processed"]
         job.error = data["error"]
-        job.logs = data["logs"]
+        overflow = len(data["logs"]) - job.logs.maxlen
+        if overflow > 0:
+            job._spill = data["logs"][:overflow]
+        job.logs.extend(data["logs"])
+        job.log_count = data.get("log_count", len(data["logs"]))
         job.created_at = data["created_at"]
         job.updated_at = data["updated_at"]
+        job.queued_at = data.get("queued_at")
+        job.started_at = data.get("started_at")
+        job.checkpoint = data.get("checkpoint")
         return job
 
-def list_jobs() -> Dict[str, Job]:
-    """
-    Load all jobs from disk into JOBS dict.
-    """
-    global JOBS
-    JOBS = {}
+    @classmethod
+    def load(cls, file: Path):
+        with open(file, "r") as f:
+            return cls.from_dict(json.load(f))
+
+
+def _migrate_json_jobs():
+    """One-off import of the old one-JSON-file-per-job layout into the database."""
+    legacy = JOBS_DIR / "legacy"
     for file in JOBS_DIR.glob("*.json"):
         try:
             job = Job.load(file)
-            JOBS[job.id] = job
+            log_file = file.with_suffix(".log")
+            if log_file.exists():
+                with open(log_file, "r") as f:
+                    DB.append_logs(job.id, 0, [json.loads(ln) for ln in f if ln.strip()])
+            job.save()
+            legacy.mkdir(exist_ok=True)
+            file.rename(legacy / file.name)
+            if log_file.exists():
+                log_file.rename(legacy / log_file.name)
         except Exception as e:
-            print(f"[jobs] Failed to load job from {file}: {e}")
-    return JOBS
+            print(f"[jobs] Failed to migrate job from {file}: {e}")
+
+
+DB = JobDB(JOBS_DIR / "jobs.db")
+_migrate_json_jobs()
+
+
+def get_job(job_id: str) -> Optional[Job]:
+    """Live job object if queued/running, else the persisted one."""
+    if job_id in JOBS:
+        return JOBS[job_id]
+    data = DB.get(job_id)
+    return Job.from_dict(data) if data else None
+
+
+def list_jobs(
+    status: Optional[List[str]] = None,
+    store: Optional[str] = None,
+    limit: Optional[int] = None,
+    before: Optional[Tuple[str, str]] = None,
+) -> List[Dict]:
+    """
+    Jobs newest first, filtered by status/store, one page at a time
+    (`before` is a (created_at, id) cursor). Live jobs report their in-memory state.
+    """
+    rows = DB.query(statuses=status, store=store, limit=limit, before=before)
+    return [JOBS[row["id"]].dict() if row["id"] in JOBS else row for row in rows]
+
+
+def prune_jobs() -> int:
+    """Apply retention: drop finished jobs older than JOB_RETENTION_DAYS / beyond JOB_RETENTION_MAX."""
+    older_than = None
+    if JOB_RETENTION_DAYS > 0:
+        older_than = (datetime.now() - timedelta(days=JOB_RETENTION_DAYS)).isoformat()
+    keep_last = JOB_RETENTION_MAX if JOB_RETENTION_MAX > 0 else None
+    removed = DB.prune(older_than=older_than, keep_last=keep_last)
+    if removed:
+        print(f"[jobs] Pruned {removed} finished jobs")
+    return removed
 
 
-async def restore_incomplete_jobs(queue: asyncio.Queue):
+async def restore_incomplete_jobs(scheduler):
     """
     On startup, requeue any jobs that were 'processing' or 'pending'
     when the server stopped.
     """
-    jobs = list_jobs()
-    for job in jobs.values():
-        if job.status in ("processing", "pending"):
-            print(f"[jobs] Requeuing interrupted job {job.id} ({job.status})")
-            job.status = "pending"
-            job.log("Job requeued after restart.")
-            await queue.put(job)
\ No newline at end of file
+    prune_jobs()
+    for data in reversed(DB.query(statuses=["processing", "pending"])):
+        job = Job.from_dict(data)
+        print(f"[jobs] Requeuing interrupted job {job.id} ({job.status})")
+        job.status = "pending"
+        job.started_at = None
+        job.log("Job requeued after restart.")
+        await scheduler.submit(job)
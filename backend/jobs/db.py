@@ -0,0 +1,168 @@
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    store TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_created ON jobs(created_at, id);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs(status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_by_store ON jobs(store, created_at);
+
+CREATE TABLE IF NOT EXISTS job_logs (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    line TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+TERMINAL_STATUSES = ("done", "failed", "cancelled")
+
+
+class JobDB:
+    """
+    SQLite (WAL) backing for job state.
+      - jobs: one row per job, full job JSON in `data`, indexed by status/store/created_at
+      - job_logs: append-only log lines that fell out of a job's in-memory ring
+    Works on plain dicts so it stays independent of the Job class.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    # -----------------------------
+    # Writes
+    # -----------------------------
+    def upsert(self, data: Dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, store, kind, status, created_at, updated_at, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET status=excluded.status, "
+                "updated_at=excluded.updated_at, data=excluded.data",
+                (
+                    data["id"], data["store"], data["kind"], data["status"],
+                    data["created_at"], data["updated_at"], json.dumps(data),
+                ),
+            )
+
+    def save_checkpoint(self, job_id: str, checkpoint: Dict, updated_at: str):
+        """Update only the job's checkpoint (no full job rewrite)."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET updated_at = ?, "
+                "data = json_set(data, '$.checkpoint', json(?), '$.updated_at', ?) WHERE id = ?",
+                (updated_at, json.dumps(checkpoint), updated_at, job_id),
+            )
+
+    def append_logs(self, job_id: str, first_seq: int, lines: List[Dict]):
+        if not lines:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO job_logs (job_id, seq, line) VALUES (?, ?, ?)",
+                [(job_id, first_seq + i, json.dumps(line)) for i, line in enumerate(lines)],
+            )
+
+    def prune(self, older_than: Optional[str] = None, keep_last: Optional[int] = None) -> int:
+        """
+        Delete finished jobs (and their logs) created before `older_than`,
+        and/or beyond the `keep_last` most recent finished jobs.
+        """
+        marks = ",".join("?" * len(TERMINAL_STATUSES))
+        ids: List[str] = []
+        with self._lock:
+            if older_than is not None:
+                ids += [r[0] for r in self._conn.execute(
+                    f"SELECT id FROM jobs WHERE status IN ({marks}) AND created_at < ?",
+                    (*TERMINAL_STATUSES, older_than),
+                )]
+            if keep_last is not None:
+                ids += [r[0] for r in self._conn.execute(
+                    f"SELECT id FROM jobs WHERE status IN ({marks}) "
+                    "ORDER BY created_at DESC, id DESC LIMIT -1 OFFSET ?",
+                    (*TERMINAL_STATUSES, keep_last),
+                )]
+            ids = list(dict.fromkeys(ids))
+            if ids:
+                self._conn.execute("BEGIN")
+                self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(i,) for i in ids])
+                self._conn.executemany("DELETE FROM job_logs WHERE job_id = ?", [(i,) for i in ids])
+                self._conn.execute("COMMIT")
+        return len(ids)
+
+    # -----------------------------
+    # Reads
+    # -----------------------------
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def query(
+        self,
+        statuses: Optional[Iterable[str]] = None,
+        store: Optional[str] = None,
+        limit: Optional[int] = None,
+        before: Optional[Tuple[str, str]] = None,
+    ) -> List[Dict]:
+        """
+        Jobs newest first. `before` is a (created_at, id) keyset cursor:
+        only jobs strictly older than it are returned.
+        """
+        where, args = [], []
+        if statuses:
+            statuses = list(statuses)
+            where.append(f"status IN ({','.join('?' * len(statuses))})")
+            args += statuses
+        if store:
+            where.append("store = ?")
+            args.append(store)
+        if before:
+            where.append("(created_at, id) < (?, ?)")
+            args += list(before)
+        sql = "SELECT data FROM jobs"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC, id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def count(self, statuses: Optional[Iterable[str]] = None, store: Optional[str] = None) -> int:
+        where, args = [], []
+        if statuses:
+            statuses = list(statuses)
+            where.append(f"status IN ({','.join('?' * len(statuses))})")
+            args += statuses
+        if store:
+            where.append("store = ?")
+            args.append(store)
+        sql = "SELECT COUNT(*) FROM jobs" + (" WHERE " + " AND ".join(where) if where else "")
+        with self._lock:
+            return self._conn.execute(sql, args).fetchone()[0]
+
+    def logs(self, job_id: str) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT line FROM job_logs WHERE job_id = ? ORDER BY seq", (job_id,)
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
@@ -0,0 +1,288 @@
+import csv
+import json
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Upload formats understood by the ingest worker
+FORMATS = ("text", "jsonl", "csv", "parquet")
+
+# Long posts easily pass csv's default 128 KiB field limit
+CSV_FIELD_LIMIT = 64 << 20
+
+_SUFFIXES = {
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".csv": "csv",
+    ".tsv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+}
+
+
+def detect_format(filename: str) -> str:
+    return _SUFFIXES.get(Path(filename).suffix.lower(), "text")
+
+
+def _jsonable(value):
+    # Entries are stored as JSON: dates, decimals, bytes... become strings
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, list):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    return str(value)
+
+
+def _record(text, eid, meta: Optional[Dict]) -> Optional[Dict]:
+    """One upload record as {"text", "id"?, "metadata"?}; None when it has no text."""
+    if text is None:
+        return None
+    text = str(text).strip()
+    if not text:
+        return None
+    out = {"text": text}
+    if eid is not None and str(eid) != "":
+        out["id"] = str(eid)
+    if meta:
+        out["metadata"] = {k: _jsonable(v) for k, v in meta.items()}
+    return out
+
+
+# -----------------------------
+# Readers
+# -----------------------------
+class UploadReader:
+    """
+    Streams an uploaded file as batches of records {"text", "id"?, "metadata"?}.
+    Positions are opaque resume points for the job checkpoint: bytes for
+    line-based formats, rows for Parquet. `size` is the end position.
+    """
+
+    size: int = 0
+    skipped: int = 0  # rows without text (or unparseable) passed over
+
+    def seek(self, position: int):
+        raise NotImplementedError
+
+    def read(self, n: int) -> Tuple[List[Dict], int]:
+        """Up to n records and the positions consumed. Blocking."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TextReader(UploadReader):
+    """One entry per non-empty line (the original upload format)."""
+
+    def __init__(self, path: Path):
+        self.f = open(path, "rb")
+        self.size = path.stat().st_size
+
+    def seek(self, position: int):
+        self.f.seek(position)
+
+    def _parse(self, raw: bytes) -> Optional[Dict]:
+        text = raw.decode("utf-8", errors="replace").strip()
+        return {"text": text} if text else None
+
+    def read(self, n: int) -> Tuple[List[Dict], int]:
+        records, consumed = [], 0
+        while len(records) < n:
+            raw = self.f.readline()
+            if not raw:
+                break
+            consumed += len(raw)
+            record = self._parse(raw)
+            if record is not None:
+                records.append(record)
+        return records, consumed
+
+    def close(self):
+        self.f.close()
+
+
+class JSONLReader(TextReader):
+    """One JSON object per line; text / id / metadata taken from its fields."""
+
+    def __init__(self, path: Path, text_column: str, id_column: Optional[str], metadata_columns: List[str]):
+        super().__init__(path)
+        self.text_column, self.id_column, self.metadata_columns = text_column, id_column, metadata_columns
+
+    def _parse(self, raw: bytes) -> Optional[Dict]:
+        if not raw.strip():
+            return None
+        try:
+            row = json.loads(raw)
+        except ValueError:
+            row = None
+        if not isinstance(row, dict):
+            self.skipped += 1
+            return None
+        meta = {c: row.get(c) for c in self.metadata_columns if c in row}
+        record = _record(row.get(self.text_column), row.get(self.id_column) if self.id_column else None, meta)
+        if record is None:
+            self.skipped += 1
+        return record
+
+
+class CSVReader(UploadReader):
+    """
+    CSV (or TSV) with a header row. Records may span lines (quoted newlines);
+    positions are the bytes of whole records, so resuming never lands mid-record.
+    """
+
+    def __init__(self, path: Path, text_column: str, id_column: Optional[str], metadata_columns: List[str]):
+        self.f = open(path, "rb")
+        self.size = path.stat().st_size
+        self.delimiter = "\t" if path.suffix.lower() == ".tsv" else ","
+        csv.field_size_limit(max(csv.field_size_limit(), CSV_FIELD_LIMIT))
+        self._consumed = self._reported = 0
+        self._rows = self._reader()
+        header = next(self._rows, None) or []
+        if header:
+            header[0] = header[0].lstrip("\ufeff")
+        self.header_bytes = self._consumed
+        missing = [c for c in [text_column, id_column, *metadata_columns] if c and c not in header]
+        if missing:
+            self.close()
+            raise ValueError(f"Columns not in the CSV header: {missing}")
+        col = {name: i for i, name in enumerate(header)}
+        self.text_i = col[text_column]
+        self.id_i = col[id_column] if id_column else None
+        self.meta_i = [(c, col[c]) for c in metadata_columns]
+
+    def _lines(self) -> Iterator[str]:
+        # csv pulls one physical line at a time, so _consumed is exact after each record
+        for raw in iter(self.f.readline, b""):
+            self._consumed += len(raw)
+            yield raw.decode("utf-8", errors="replace")
+
+    def _reader(self):
+        return csv.reader(self._lines(), delimiter=self.delimiter)
+
+    def seek(self, position: int):
+        self.f.seek(max(position, self.header_bytes))
+        self._consumed, self._reported = self.f.tell(), position
+        self._rows = self._reader()
+
+    def read(self, n: int) -> Tuple[List[Dict], int]:
+        records = []
+        while len(records) < n:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            if not row:
+                continue
+            if len(row) <= self.text_i:
+                self.skipped += 1
+                continue
+            meta = {c: row[i] for c, i in self.meta_i if i < len(row)}
+            eid = row[self.id_i] if self.id_i is not None and self.id_i < len(row) else None
+            record = _record(row[self.text_i], eid, meta)
+            if record is None:
+                self.skipped += 1
+            else:
+                records.append(record)
+        # Bytes since the last reported position (the first read includes the header)
+        consumed, self._reported = self._consumed - self._reported, self._consumed
+        return records, consumed
+
+    def close(self):
+        self.f.close()
+
+
+class ParquetReader(UploadReader):
+    """
+    Parquet read as Arrow record batches of just the declared columns, one row
+    group at a time. Positions are row numbers.
+    """
+
+    def __init__(self, path: Path, text_column: str, id_column: Optional[str], metadata_columns: List[str]):
+        import pyarrow.parquet as pq
+
+        self.file = pq.ParquetFile(path)
+        names = self.file.schema_arrow.names
+        self.columns = list(dict.fromkeys(c for c in [text_column, id_column, *metadata_columns] if c))
+        missing = [c for c in self.columns if c not in names]
+        if missing:
+            self.file.close()
+            raise ValueError(f"Columns not in the Parquet schema: {missing}")
+        self.text_column, self.id_column, self.metadata_columns = text_column, id_column, metadata_columns
+        self.size = self.file.metadata.num_rows
+        self._pending = None
+        self.seek(0)
+
+    def seek(self, position: int):
+        # Start at the row group holding `position`, dropping the rows before it
+        first, skip = 0, position
+        md = self.file.metadata
+        while first < md.num_row_groups and skip >= md.row_group(first).num_rows:
+            skip -= md.row_group(first).num_rows
+            first += 1
+        groups = list(range(first, md.num_row_groups))
+        self._batches = self.file.iter_batches(row_groups=groups, columns=self.columns) if groups else iter(())
+        self._pending, self._skip = None, skip
+
+    def _next_rows(self, n: int):
+        """Up to n rows as one Arrow batch (slices, no copies), or None at the end."""
+        while self._pending is None or self._pending.num_rows == 0:
+            batch = next(self._batches, None)
+            if batch is None:
+                return None
+            if self._skip:
+                dropped = min(self._skip, batch.num_rows)
+                batch, self._skip = batch.slice(dropped), self._skip - dropped
+            self._pending = batch
+        out, self._pending = self._pending.slice(0, n), self._pending.slice(n)
+        return out
+
+    def read(self, n: int) -> Tuple[List[Dict], int]:
+        records, consumed = [], 0
+        while consumed < n:
+            batch = self._next_rows(n - consumed)
+            if batch is None:
+                break
+            consumed += batch.num_rows
+            texts = batch.column(self.text_column).to_pylist()
+            ids = batch.column(self.id_column).to_pylist() if self.id_column else [None] * len(texts)
+            meta_cols = {c: batch.column(c).to_pylist() for c in self.metadata_columns}
+            for j, (text, eid) in enumerate(zip(texts, ids)):
+                record = _record(text, eid, {c: v[j] for c, v in meta_cols.items()})
+                if record is None:
+                    self.skipped += 1
+                else:
+                    records.append(record)
+        return records, consumed
+
+    def close(self):
+        self.file.close()
+
+
+def open_upload(path: Path, params: Optional[Dict] = None) -> UploadReader:
+    """
+    Reader for an ingest job's upload. `params` (the job params) declare
+    format, text_column, id_column and metadata_columns; plain text otherwise.
+    Raises ValueError when declared columns are missing.
+    """
+    params = params or {}
+    fmt = params.get("format") or "text"
+    if fmt == "text":
+        return TextReader(path)
+    cls = {"jsonl": JSONLReader, "csv": CSVReader, "parquet": ParquetReader}[fmt]
+    return cls(path, params.get("text_column") or "text", params.get("id_column"), params.get("metadata_columns") or [])
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
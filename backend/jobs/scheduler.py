@@ -0,0 +1,140 @@
+import asyncio
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+from config import JOB_WORKERS
+from .core import Job, JOBS, PRIORITY_ORDER, Priority, prune_jobs
+
+JobHandler = Callable[[Job], Awaitable[None]]
+
+
+class Scheduler:
+    """
+    Runs up to `workers` jobs concurrently.
+
+    - Priority classes: a pending interactive job always starts before a bulk one.
+    - Fairness: within a class, stores are served round-robin, so one store with
+      many queued jobs cannot starve the others.
+    - Writers (ingest, graph builds) hold an exclusive per-store lock; a job whose
+      store is locked waits while jobs for other stores go ahead.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = max(1, workers)
+        # priority -> store -> FIFO of jobs; dict order is the round-robin order
+        self._pending: Dict[Priority, "OrderedDict[str, Deque[Job]]"] = {
+            p: OrderedDict() for p in PRIORITY_ORDER
+        }
+        self._locked: set[str] = set()
+        self._running: Dict[str, Job] = {}
+        self._recent_waits: Deque[float] = deque(maxlen=200)
+        self._cond = asyncio.Condition()
+        self._tasks: List[asyncio.Task] = []
+
+    # -----------------------------
+    # Queueing
+    # -----------------------------
+    async def submit(self, job: Job):
+        job.status = "pending"
+        job.queued_at = job._now()
+        JOBS[job.id] = job
+        job.save()
+        async with self._cond:
+            self._pending[job.priority].setdefault(job.store, deque()).append(job)
+            self._cond.notify()
+
+    async def remove(self, job_id: str) -> Optional[Job]:
+        """Take a job out of the queue if it has not started yet."""
+        async with self._cond:
+            for queues in self._pending.values():
+                for store, q in list(queues.items()):
+                    for job in q:
+                        if job.id == job_id:
+                            q.remove(job)
+                            if not q:
+                                del queues[store]
+                            return job
+        return None
+
+    def is_running(self, job_id: str) -> bool:
+        return job_id in self._running
+
+    def _next(self) -> Optional[Job]:
+        for priority in PRIORITY_ORDER:
+            queues = self._pending[priority]
+            for store in list(queues):
+                q = queues[store]
+                if q[0].is_writer and store in self._locked:
+                    continue
+                job = q.popleft()
+                # Move the store to the back of the rotation
+                del queues[store]
+                if q:
+                    queues[store] = q
+                return job
+        return None
+
+    # -----------------------------
+    # Workers
+    # -----------------------------
+    async def _worker(self, handler: JobHandler):
+        while True:
+            async with self._cond:
+                job = self._next()
+                while job is None:
+                    await self._cond.wait()
+                    job = self._next()
+                if job.is_writer:
+                    self._locked.add(job.store)
+                self._running[job.id] = job
+                job.started_at = job._now()
+                self._recent_waits.append(job.wait_seconds() or 0.0)
+
+            try:
+                await handler(job)
+            except Exception as e:
+                print(f"[scheduler] Job {job.id} crashed: {e}")
+            finally:
+                async with self._cond:
+                    self._running.pop(job.id, None)
+                    if job.is_writer:
+                        self._locked.discard(job.store)
+                    self._cond.notify_all()
+                # Finished jobs live in the database only
+                JOBS.pop(job.id, None)
+                prune_jobs()
+
+    def start(self, handler: JobHandler):
+        self._tasks = [asyncio.create_task(self._worker(handler)) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # -----------------------------
+    # Introspection
+    # -----------------------------
+    def stats(self) -> Dict:
+        pending = [job for queues in self._pending.values() for q in queues.values() for job in q]
+        waits = [job.wait_seconds() or 0.0 for job in pending]
+        recent = list(self._recent_waits)
+        by_store: Dict[str, int] = {}
+        for job in pending:
+            by_store[job.store] = by_store.get(job.store, 0) + 1
+        return {
+            "workers": self.workers,
+            "running": len(self._running),
+            "depth": len(pending),
+            "depth_by_priority": {
+                p.value: sum(len(q) for q in self._pending[p].values()) for p in PRIORITY_ORDER
+            },
+            "depth_by_store": by_store,
+            "locked_stores": sorted(self._locked),
+            "oldest_wait_seconds": max(waits, default=0.0),
+            "avg_start_wait_seconds": sum(recent) / len(recent) if recent else 0.0,
+        }
+
+
+SCHEDULER = Scheduler()
@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from config import MEMORY_BUDGET_MB, MODEL_IDLE_SECONDS
+from metrics.core import REGISTRY, counter, gauge
+
+RESIDENT_BYTES = gauge("threadsearch_memory_resident_bytes", "Bytes held by loaded indexes / graphs / models", ["kind"])
+MAPPED_BYTES = gauge("threadsearch_memory_mapped_bytes", "Bytes of memory-mapped indexes (page cache, not counted in the budget)")
+BUDGET_BYTES = gauge("threadsearch_memory_budget_bytes", "Configured memory budget (0 = no limit)")
+EVICTIONS = counter("threadsearch_memory_evictions_total", "Resources unloaded to stay within the memory budget", ["kind"])
+
+
+class Resident:
+    """One loaded resource (a store's index / graph, an encoder model)."""
+
+    def __init__(self, key: str, kind: str, owner: str, nbytes: int, evict: Callable[[], Optional[bool]],
+                 mapped: bool = False, evictable: Optional[Callable[[], bool]] = None):
+        self.key = key
+        self.kind = kind
+        self.owner = owner
+        self.nbytes = nbytes
+        self.mapped = mapped  # mmap-backed: pages belong to the OS page cache
+        self.evict = evict
+        self.evictable = evictable  # None = always
+        self.loaded_at = time.time()
+        self.last_used = time.time()
+
+    def dict(self) -> Dict:
+        return {
+            "kind": self.kind,
+            "owner": self.owner,
+            "bytes": self.nbytes,
+            "mapped": self.mapped,
+            "loaded_at": self.loaded_at,
+            "idle_seconds": round(time.time() - self.last_used, 1),
+        }
+
+
+class MemoryBudget:
+    """
+    Global LRU over everything we keep loaded. Owners `track` a resource when they
+    load it, `touch` it on use and `forget` it when they drop it themselves.
+    When the resident total goes over the limit, the least recently used evictable
+    resources are unloaded via their `evict` callback (the owner reloads lazily).
+    Memory-mapped resources are reported but don't count against the budget.
+    """
+
+    def __init__(self, limit_bytes: int = 0):
+        self.limit = limit_bytes
+        self._items: "OrderedDict[str, Resident]" = OrderedDict()
+        self._lock = threading.Lock()
+        BUDGET_BYTES.set(limit_bytes)
+
+    def track(self, key: str, kind: str, owner: str, nbytes: int, evict: Callable[[], Optional[bool]],
+              mapped: bool = False, evictable: Optional[Callable[[], bool]] = None):
+        """`evict` may return False to decline (owner busy); the resource then stays tracked."""
+        with self._lock:
+            self._items[key] = Resident(key, kind, owner, int(nbytes), evict, mapped, evictable)
+            self._items.move_to_end(key)
+        self.enforce(keep=key)
+
+    def touch(self, key: str):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                item.last_used = time.time()
+                self._items.move_to_end(key)
+
+    def forget(self, key: str):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def get(self, key: str) -> Optional[Resident]:
+        return self._items.get(key)
+
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(r.nbytes for r in self._items.values() if not r.mapped)
+
+    def enforce(self, keep: Optional[str] = None) -> List[str]:
+        """Evict LRU resources until under the limit. `keep` (just loaded) is never picked."""
+        if not self.limit:
+            return []
+        evicted, declined = [], set()
+        while True:
+            with self._lock:
+                total = sum(r.nbytes for r in self._items.values() if not r.mapped)
+                if total <= self.limit:
+                    break
+                victim = next(
+                    (r for r in self._items.values()
+                     if r.key != keep and r.key not in declined and not r.mapped
+                     and (r.evictable is None or r.evictable())),
+                    None,
+                )
+                if victim is None:
+                    break  # everything left is in use
+                del self._items[victim.key]
+            # Outside the lock: owners take their own locks while unloading
+            if victim.evict() is False:
+                # Owner busy (e.g. mid-load under its lock): keep it, unless it was re-tracked meanwhile
+                declined.add(victim.key)
+                with self._lock:
+                    self._items.setdefault(victim.key, victim)
+                continue
+            EVICTIONS.inc(kind=victim.kind)
+            evicted.append(victim.key)
+            print(f"[memory] Evicted {victim.key} ({victim.nbytes / 2**20:.1f} MiB, "
+                  f"idle {time.time() - victim.last_used:.0f}s); {total / 2**20:.1f} MiB > budget {self.limit / 2**20:.0f} MiB")
+        return evicted
+
+    def owned_by(self, owner: str) -> Dict[str, Dict]:
+        """Resources of one owner keyed by role ("index", "writer", "graph", ...: the key prefix)."""
+        with self._lock:
+            return {r.key.split(":", 1)[0]: r.dict() for r in self._items.values() if r.owner == owner}
+
+    def dict(self) -> Dict:
+        with self._lock:
+            items = list(self._items.values())
+        return {
+            "budget_bytes": self.limit,
+            "resident_bytes": sum(r.nbytes for r in items if not r.mapped),
+            "mapped_bytes": sum(r.nbytes for r in items if r.mapped),
+            "items": {r.key: r.dict() for r in reversed(items)},  # most recently used first
+        }
+
+    def collect(self):
+        by_kind: Dict[str, int] = {"index": 0, "graph": 0, "model": 0}
+        mapped = 0
+        with self._lock:
+            for r in self._items.values():
+                if r.mapped:
+                    mapped += r.nbytes
+                else:
+                    by_kind[r.kind] = by_kind.get(r.kind, 0) + r.nbytes
+        for kind, n in by_kind.items():
+            RESIDENT_BYTES.set(n, kind=kind)
+        MAPPED_BYTES.set(mapped)
+
+
+BUDGET = MemoryBudget(MEMORY_BUDGET_MB * 2**20)
+REGISTRY.register_collector(BUDGET.collect)
+
+
+def model_idle(model) -> bool:
+    """Encoders are only evicted after MODEL_IDLE_SECONDS without an embed call."""
+    return time.monotonic() - getattr(model, "last_used", 0.0) >= MODEL_IDLE_SECONDS
@@ -0,0 +1,63 @@
+import asyncio
+from typing import Literal, Optional
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+
+from .core import REGISTRY
+from .trace import PROFILER, RECENT_TRACES
+
+router = APIRouter()
+
+# Upper bound on one profiling run so a forgotten request cannot pin a thread forever
+MAX_PROFILE_SECONDS = 300
+
+
+class ProfileReq(BaseModel):
+    seconds: float = 10
+    requests: Optional[int] = None  # stop after N completed requests (bounded by `seconds`)
+    interval_ms: float = 5
+    format: Literal["json", "collapsed"] = "json"
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text exposition of counters, histograms and per-store gauges."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/admin/traces")
+def recent_traces(limit: int = 50, min_ms: float = 0, name: Optional[str] = None):
+    """Recently finished request/job traces, newest first."""
+    out = []
+    for t in reversed(RECENT_TRACES):
+        if t["duration_ms"] < min_ms or (name and name not in t["name"]):
+            continue
+        out.append(t)
+        if len(out) >= limit:
+            break
+    return {"traces": out}
+
+
+@router.post("/admin/profile")
+async def profile(req: ProfileReq):
+    """
+    Sample the stacks of all threads for `seconds` (or until `requests` more
+    requests complete) and return the aggregated profile.
+    format=collapsed returns flamegraph.pl / speedscope input.
+    """
+    if PROFILER.active:
+        raise HTTPException(409, "A profile is already running")
+    if req.seconds <= 0 or req.interval_ms <= 0:
+        raise HTTPException(422, "seconds and interval_ms must be positive")
+
+    seconds = min(req.seconds, MAX_PROFILE_SECONDS)
+    try:
+        result = await asyncio.to_thread(PROFILER.run, seconds, req.requests, req.interval_ms / 1000)
+    except RuntimeError as e:
+        raise HTTPException(409, str(e))
+
+    if req.format == "collapsed":
+        return PlainTextResponse("".join(f"{s['stack']} {s['count']}\n" for s in result["stacks"]))
+    return result
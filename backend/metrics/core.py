@@ -0,0 +1,229 @@
+import bisect
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .trace import record_span
+
+# Seconds; covers sub-ms FAISS calls up to multi-second encoder batches / index writes
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[str, ...]
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}", *self.samples()]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, v in items:
+            yield f"{self.name}{_fmt_labels(self.labelnames, key)} {v}"
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def remove(self, **labels):
+        with self._lock:
+            self._values.pop(self._key(labels), None)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, v in items:
+            yield f"{self.name}{_fmt_labels(self.labelnames, key)} {v}"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        span: Optional[str] = None,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Timed blocks also become spans of this name on the current request/job trace
+        self.span = span
+        # key -> (per-bucket counts incl. +Inf, sum)
+        self._values: Dict[LabelKey, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[i] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(elapsed, **labels)
+            if self.span:
+                record_span(self.span, elapsed)
+
+    def wrap(self, fn: Callable, **labels) -> Callable:
+        """Timed version of `fn`, e.g. for asyncio.to_thread(HIST.wrap(model.embed), texts)."""
+        def timed(*args, **kwargs):
+            with self.time(**labels):
+                return fn(*args, **kwargs)
+        return timed
+
+    def samples(self):
+        with self._lock:
+            items = [(k, (list(c), t[0])) for k, (c, t) in self._values.items()]
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                le = 'le="%s"' % ("+Inf" if bound == float("inf") else repr(bound))
+                yield f"{self.name}_bucket{_fmt_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {total}"
+            yield f"{self.name}_count{_fmt_labels(self.labelnames, key)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        # Callbacks run at scrape time (per-store gauges, process memory, ...)
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, fn: Callable[[], None]):
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        for fn in self._collectors:
+            try:
+                fn()
+            except Exception as e:
+                print(f"[metrics] Collector {getattr(fn, '__name__', fn)} failed: {e}")
+        lines: List[str] = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help, labelnames))
+
+
+def gauge(name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, help, labelnames))
+
+
+def histogram(
+    name: str,
+    help: str,
+    labelnames: Sequence[str] = (),
+    buckets: Optional[Sequence[float]] = None,
+    span: Optional[str] = None,
+) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labelnames, buckets or DEFAULT_BUCKETS, span))
+
+
+# -----------------------------
+# Hot-path metrics shared across the backend
+# -----------------------------
+ENCODE_SECONDS = histogram("threadsearch_encode_seconds", "Time spent in model.embed per call", ["model"], span="encode")
+ENCODED_TEXTS = counter("threadsearch_encoded_texts_total", "Texts passed to model.embed", ["model"])
+SEARCH_SECONDS = histogram("threadsearch_search_seconds", "Time spent in FAISS index.search per call", ["op"], span="ann")
+HYDRATE_SECONDS = histogram("threadsearch_hydrate_seconds", "Time spent reading/parsing entries.jsonl", ["op"], span="hydrate")
+INDEX_WRITE_SECONDS = histogram("threadsearch_index_write_seconds", "Time spent in faiss.write_index", span="index_write")
+BROADCAST_SECONDS = histogram("threadsearch_broadcast_seconds", "Time spent persisting + pushing a job update", span="broadcast")
+BROADCAST_COALESCED = counter("threadsearch_broadcast_coalesced_total", "Job updates folded into a later push")
+INGESTED_TEXTS = counter("threadsearch_ingested_texts_total", "Texts committed to stores", ["store"])
+JOB_THROUGHPUT = gauge("threadsearch_job_ingest_texts_per_second", "Ingest throughput of running jobs", ["job", "store"])
+
+
+PROCESS_RSS = gauge("threadsearch_process_resident_bytes", "Resident memory of the backend process")
+
+
+def _collect_process():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        PROCESS_RSS.set(pages * resource.getpagesize())
+    except OSError:
+        # No procfs (macOS): fall back to peak RSS
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        PROCESS_RSS.set(usage if sys.platform == "darwin" else usage * 1024)
+
+
+REGISTRY.register_collector(_collect_process)
+
+
+def embed(model, texts: List[str]):
+    """model.embed with timing + text counting."""
+    model_id = getattr(model, "repo_id", type(model).__name__)
+    model.last_used = time.monotonic()  # idle models can be evicted (see memory.py)
+    ENCODED_TEXTS.inc(len(texts), model=model_id)
+    with ENCODE_SECONDS.time(model=model_id):
+        return model.embed(texts)
@@ -0,0 +1,170 @@
+import sys
+import threading
+import time
+from collections import Counter as _Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, List, Optional
+
+
+class Trace:
+    """
+    Span timings for one request or background job, aggregated by span name
+    (a job runs thousands of batches; we keep totals, not every span).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.spans: Dict[str, List[float]] = {}  # name -> [total seconds, count]
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            span = self.spans.setdefault(name, [0.0, 0])
+            span[0] += seconds
+            span[1] += 1
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._t0
+
+    def server_timing(self) -> str:
+        """Server-Timing header value (durations in ms)."""
+        parts = [f"{name};dur={total * 1000:.2f}" for name, (total, _) in self.spans.items()]
+        if self.duration is not None:
+            parts.append(f"total;dur={self.duration * 1000:.2f}")
+        return ", ".join(parts)
+
+    def summary(self) -> Dict:
+        return {
+            "name": self.name,
+            "started": self.started,
+            "duration_ms": round((self.duration or 0.0) * 1000, 3),
+            "spans": {
+                name: {"ms": round(total * 1000, 3), "count": count}
+                for name, (total, count) in self.spans.items()
+            },
+        }
+
+    def describe(self) -> str:
+        """One-line human summary, e.g. for job logs."""
+        parts = [f"{name} {total:.2f}s ({count})" for name, (total, count) in self.spans.items()]
+        return ", ".join(parts) or "no spans"
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+# Finished traces, newest last
+RECENT_TRACES: Deque[Dict] = deque(maxlen=500)
+
+
+@contextmanager
+def start_trace(name: str):
+    trace = Trace(name)
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.finish()
+        _current.reset(token)
+        RECENT_TRACES.append(trace.summary())
+
+
+def record_span(name: str, seconds: float):
+    trace = _current.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+@contextmanager
+def span(name: str):
+    """Time a block into the current trace (no-op outside a request/job)."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, time.perf_counter() - start)
+
+
+# -----------------------------
+# Sampling profiler
+# -----------------------------
+class StackSampler:
+    """
+    Samples the Python stacks of every thread (event loop + to_thread workers)
+    at a fixed interval. Only one profile runs at a time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = False
+        self._requests_left: Optional[int] = None
+        self._done = threading.Event()
+
+    @property
+    def active(self) -> bool:
+        return self._active
+
+    def request_done(self):
+        """Called by the request middleware; ends request-bounded profiles."""
+        if self._requests_left is not None:
+            self._requests_left -= 1
+            if self._requests_left <= 0:
+                self._done.set()
+
+    def run(self, seconds: float, requests: Optional[int] = None, interval: float = 0.005) -> Dict:
+        """
+        Blocking: sample for `seconds`, or until `requests` more requests have
+        completed (bounded by `seconds`). Call off the event loop.
+        """
+        with self._lock:
+            if self._active:
+                raise RuntimeError("A profile is already running")
+            self._active = True
+            self._requests_left = requests
+            self._done.clear()
+
+        me = threading.get_ident()
+        stacks: _Counter = _Counter()
+        own: _Counter = _Counter()
+        samples = 0
+        start = time.perf_counter()
+        try:
+            deadline = start + seconds
+            while time.perf_counter() < deadline and not self._done.is_set():
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    names = []
+                    f = frame
+                    while f is not None:
+                        code = f.f_code
+                        names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{f.f_lineno})")
+                        f = f.f_back
+                    if not names:
+                        continue
+                    stacks[";".join(reversed(names))] += 1
+                    own[names[0]] += 1
+                samples += 1
+                time.sleep(interval)
+        finally:
+            with self._lock:
+                self._active = False
+                self._requests_left = None
+
+        return {
+            "seconds": round(time.perf_counter() - start, 3),
+            "samples": samples,
+            "interval_ms": interval * 1000,
+            "top_self": [{"frame": k, "count": v} for k, v in own.most_common(50)],
+            "stacks": [{"stack": k, "count": v} for k, v in stacks.most_common(500)],
+        }
+
+
+PROFILER = StackSampler()
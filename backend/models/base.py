@@ -1,7 +1,10 @@
+import re
 from typing import List, Optional, Protocol
 
 import numpy as np
 
+_WORD = re.compile(r"\S+")
+
 
 class BaseModel(Protocol):
     def encode(self, texts: List[str]) -> np.ndarray:
@@ -9,6 +12,8 @@ class BaseModel(Protocol):
 
 class BaseEmbeddingModel:
     model: Optional[BaseModel] = None
+    last_used: float = 0.0  # time.monotonic() of the last embed call
+    max_tokens: Optional[int] = None  # longest input encoded without truncation (None = unknown)
 
     @classmethod
     def download(cls, cache_dir: Optional[str] = None):
@@ -22,7 +27,22 @@ class BaseEmbeddingModel:
     def embed(self, texts: List[str]) -> np.ndarray:
         """Encode texts into embeddings."""
         raise NotImplementedError
+
+    def token_spans(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        (n_tokens, 2) character [start, end) spans of each text's tokens, as the
+        encoder counts them (used to chunk long texts). Default: whitespace words.
+        """
+        return [np.array([m.span() for m in _WORD.finditer(t)], dtype=np.int64).reshape(-1, 2) for t in texts]
     
     def unload(self):
         """Unload model from memory."""
-        self.model = None
\ No newline at end of file
+        self.model = None
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the loaded weights (torch modules: parameters + buffers)."""
+        module = self.model
+        if module is None or not hasattr(module, "parameters"):
+            return 0
+        tensors = list(module.parameters()) + list(getattr(module, "buffers", lambda: [])())
+        return sum(t.numel() * t.element_size() for t in tensors)
@@ -1,7 +1,6 @@
 from typing import List, Optional
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from .base import BaseEmbeddingModel
 
 class NomicEmbedTextV15(BaseEmbeddingModel):
@@ -9,12 +8,22 @@ class NomicEmbedTextV15(BaseEmbeddingModel):
 
     @classmethod
     def download(cls, cache_dir: Optional[str] = None):
+        from sentence_transformers import SentenceTransformer  # heavy (torch); imported on first use
+
         # Download model weights to local cache
         SentenceTransformer(cls.repo_id, trust_remote_code=True, cache_folder=cache_dir)
 
     def load(self, cache_dir: Optional[str] = None):
+        from sentence_transformers import SentenceTransformer
+
         self.model = SentenceTransformer(self.repo_id, trust_remote_code=True, local_files_only=True, cache_folder=cache_dir)
+        self.max_tokens = self.model.max_seq_length
 
     def embed(self, texts: List[str]) -> np.ndarray:
         embeddings = self.model.encode(texts, convert_to_numpy=True)
-        return embeddings
\ No newline at end of file
+        return embeddings
+
+    def token_spans(self, texts: List[str]) -> List[np.ndarray]:
+        # Fast tokenizer offsets: chunks are cut exactly where the encoder would count
+        enc = self.model.tokenizer(texts, add_special_tokens=False, return_offsets_mapping=True)
+        return [np.asarray(o, dtype=np.int64).reshape(-1, 2) for o in enc["offset_mapping"]]
@@ -1,5 +1,7 @@
-from typing import Dict, List, Type, TypedDict
-from .nomic_ai import NomicEmbedTextV15
+import importlib
+import threading
+import time
+from typing import Dict, List, Type, TypedDict, Union
 from .base import BaseEmbeddingModel
 
 class ModelSpec(TypedDict):
@@ -7,7 +9,9 @@ class ModelSpec(TypedDict):
     name: str
     description: str
     tags: List[str]
-    cls: Type[BaseEmbeddingModel]
+    # "module:Class", imported on first use so the registry stays cheap to import
+    # (encoder modules pull in sentence_transformers / torch)
+    cls: Union[str, Type[BaseEmbeddingModel]]
 
 MODELS: Dict[str, ModelSpec] = {
     "nomic-ai/nomic-embed-text-v1.5": {
@@ -15,9 +19,63 @@ MODELS: Dict[str, ModelSpec] = {
         "name": "nomic-embed-text-v1.5",
         "description": "Small, fast, general-purpose embeddings",
         "tags": ["lightweight", "fast"],
-        "cls": NomicEmbedTextV15,
-    }
+        "cls": "models.nomic_ai:NomicEmbedTextV15",
+    },
+    # Offline, deterministic; used by the benchmark suite (backend/bench)
+    "stub/hash-embedding-384": {
+        "repo": "stub/hash-embedding-384",
+        "name": "hash-embedding-384 (stub)",
+        "description": "Deterministic hashed bag-of-words vectors, no weights (benchmarks/testing)",
+        "tags": ["offline", "benchmark"],
+        "cls": "models.stub:StubHashEmbedding",
+    },
 }
 
 def get_model(repo_id: str) -> Type[BaseEmbeddingModel]:
-    return MODELS[repo_id]["cls"]
\ No newline at end of file
+    cls = MODELS[repo_id]["cls"]
+    if isinstance(cls, str):
+        module, _, name = cls.partition(":")
+        cls = getattr(importlib.import_module(module), name)
+        MODELS[repo_id]["cls"] = cls
+    return cls
+
+
+# -----------------------------
+# Loaded encoders (one shared instance per model)
+# -----------------------------
+_LOADED: Dict[str, BaseEmbeddingModel] = {}
+_LOAD_LOCKS: Dict[str, threading.Lock] = {}
+_LOCKS_GUARD = threading.Lock()
+
+def get_encoder(repo_id: str, cache_dir=None) -> BaseEmbeddingModel:
+    """
+    Loaded encoder for `repo_id`, shared across requests and jobs.
+    Blocking on first use; concurrent callers wait for the same load.
+    """
+    # Imported here: memory pulls in config (creates the cwd-relative cache dirs),
+    # which offline tools that only need get_model (bot/) shouldn't trigger
+    from memory import BUDGET, model_idle
+
+    model = _LOADED.get(repo_id)
+    if model is not None:
+        BUDGET.touch(f"model:{repo_id}")
+        return model
+    with _LOCKS_GUARD:
+        lock = _LOAD_LOCKS.setdefault(repo_id, threading.Lock())
+    with lock:
+        model = _LOADED.get(repo_id)
+        if model is None:
+            model = get_model(repo_id)()
+            model.load(cache_dir)
+            model.last_used = time.monotonic()
+            _LOADED[repo_id] = model
+            # Idle encoders may be dropped when over the memory budget; reloaded on next use
+            BUDGET.track(
+                f"model:{repo_id}", "model", repo_id, model.nbytes(),
+                evict=lambda: _LOADED.pop(repo_id, None),
+                evictable=lambda: model_idle(model),
+            )
+    return model
+
+def loaded_models() -> List[str]:
+    return list(_LOADED)
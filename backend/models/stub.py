@@ -0,0 +1,48 @@
+import hashlib
+from typing import Dict, List, Optional
+
+import numpy as np
+from .base import BaseEmbeddingModel
+
+
+class StubHashEmbedding(BaseEmbeddingModel):
+    """
+    Deterministic offline encoder for benchmarks and local testing.
+    Each token maps to a fixed random vector (seeded by its hash); a text is the
+    normalized sum of its token vectors, so texts sharing words land close together.
+    No weights, no downloads.
+    """
+
+    repo_id: str = "stub/hash-embedding-384"
+    dim: int = 384
+
+    # token -> vector, shared across instances (bounded, cleared when full)
+    _token_cache: Dict[str, np.ndarray] = {}
+    _token_cache_max: int = 200_000
+
+    @classmethod
+    def download(cls, cache_dir: Optional[str] = None):
+        # Nothing to download
+        pass
+
+    def load(self, cache_dir: Optional[str] = None):
+        self.model = self
+
+    def _token_vector(self, token: str) -> np.ndarray:
+        vec = self._token_cache.get(token)
+        if vec is None:
+            seed = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+            vec = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            if len(self._token_cache) >= self._token_cache_max:
+                self._token_cache.clear()
+            self._token_cache[token] = vec
+        return vec
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            tokens = text.lower().split() or [""]
+            for tok in tokens:
+                out[i] += self._token_vector(tok)
+        out /= np.linalg.norm(out, axis=1, keepdims=True) + 1e-12
+        return out
@@ -0,0 +1,97 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from config import RESULT_CACHE_MB
+from metrics.core import REGISTRY, counter, gauge
+
+CACHE_REQUESTS = counter("threadsearch_result_cache_requests_total", "Result cache lookups", ["endpoint", "result"])
+CACHE_EVICTIONS = counter("threadsearch_result_cache_evictions_total", "Result cache entries dropped to stay within the byte limit")
+CACHE_BYTES = gauge("threadsearch_result_cache_bytes", "Bytes of cached responses (JSON size)")
+CACHE_ENTRIES = gauge("threadsearch_result_cache_entries", "Cached responses")
+
+
+class ResultCache:
+    """
+    Byte-bounded LRU of endpoint responses. Keys embed the generation of every
+    store involved, so a write to a store makes its old entries unreachable;
+    `invalidate` also drops them right away to free the space.
+    Sizes are the JSON length of the response, measured once on insert.
+    """
+
+    def __init__(self, limit_bytes: int):
+        self.limit = limit_bytes
+        self._items: "OrderedDict[Hashable, Tuple[Any, int, Tuple[str, ...]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits: Dict[str, int] = {}
+        self._misses: Dict[str, int] = {}
+
+    def get(self, endpoint: str, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+                self._hits[endpoint] = self._hits.get(endpoint, 0) + 1
+            else:
+                self._misses[endpoint] = self._misses.get(endpoint, 0) + 1
+        CACHE_REQUESTS.inc(endpoint=endpoint, result="hit" if item is not None else "miss")
+        return item[0] if item is not None else None
+
+    def put(self, key: Hashable, value: Any, stores: Tuple[str, ...]):
+        nbytes = len(json.dumps(value, separators=(",", ":"), default=str))
+        if not self.limit or nbytes > self.limit:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._items[key] = (value, nbytes, stores)
+            self._bytes += nbytes
+            while self._bytes > self.limit:
+                _, (_, size, _) = self._items.popitem(last=False)
+                self._bytes -= size
+                CACHE_EVICTIONS.inc()
+
+    def invalidate(self, store: str):
+        """Drop every entry involving `store` (called when its generation changes)."""
+        with self._lock:
+            stale = [key for key, (_, _, stores) in self._items.items() if store in stores]
+            for key in stale:
+                self._bytes -= self._items.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def cached(self, endpoint: str, key: Hashable, stores: Tuple[str, ...], compute: Callable[[], Any]) -> Any:
+        value = self.get(endpoint, key)
+        if value is None:
+            value = compute()
+            self.put(key, value, stores)
+        return value
+
+    def dict(self) -> Dict:
+        with self._lock:
+            endpoints = sorted(self._hits.keys() | self._misses.keys())
+            per_endpoint = {}
+            for e in endpoints:
+                hits, misses = self._hits.get(e, 0), self._misses.get(e, 0)
+                per_endpoint[e] = {"hits": hits, "misses": misses, "hit_ratio": round(hits / (hits + misses), 4)}
+            return {
+                "limit_bytes": self.limit,
+                "bytes": self._bytes,
+                "entries": len(self._items),
+                "endpoints": per_endpoint,
+            }
+
+    def collect(self):
+        with self._lock:
+            CACHE_BYTES.set(self._bytes)
+            CACHE_ENTRIES.set(len(self._items))
+
+
+RESULTS = ResultCache(RESULT_CACHE_MB * 2**20)
+REGISTRY.register_collector(RESULTS.collect)
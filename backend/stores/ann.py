@@ -0,0 +1,195 @@
+"""
+ANN index configurations and a recall/latency evaluation harness.
+
+A config is a plain dict, e.g.
+    {"index": "hnsw", "M": 32, "efConstruction": 200, "efSearch": 64}
+    {"index": "ivfpq", "nlist": 1024, "pq_m": 48, "nprobe": 16, "rerank": 4}
+Build-time keys pick the index structure; search-time keys (nprobe, efSearch,
+rerank) are swept on one built index.
+"""
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+SEARCH_PARAMS = ("nprobe", "efSearch", "rerank")
+
+# FAISS wants >= 39 training points per IVF centroid
+MIN_POINTS_PER_CENTROID = 39
+
+
+def structure_key(cfg: Dict) -> Tuple:
+    """Build-time part of a config (configs sharing it share one built index)."""
+    return tuple(sorted((k, v) for k, v in cfg.items() if k not in SEARCH_PARAMS))
+
+
+def build_index(xb: np.ndarray, cfg: Dict, train_size: int = 100_000, seed: int = 0) -> faiss.Index:
+    """Train (if needed) and fill an inner-product index described by `cfg`."""
+    d = xb.shape[1]
+    kind = cfg["index"]
+    if kind == "flat":
+        index = faiss.IndexFlatIP(d)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(d, cfg.get("M", 32), faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = cfg.get("efConstruction", 200)
+    elif kind in ("ivf", "ivfpq"):
+        quantizer = faiss.IndexFlatIP(d)
+        if kind == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, d, cfg["nlist"], faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, d, cfg["nlist"], cfg["pq_m"], cfg.get("pq_nbits", 8), faiss.METRIC_INNER_PRODUCT)
+    else:
+        raise ValueError(f"Unknown index type: {kind}")
+
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample = xb if len(xb) <= train_size else xb[np.sort(rng.choice(len(xb), train_size, replace=False))]
+        index.train(sample)
+
+    if kind == "ivfpq" or cfg.get("rerank", 1) > 1:
+        # Exact re-scoring of rerank * k candidates; keeps the full vectors alongside
+        index = faiss.IndexRefineFlat(index)
+    index.add(xb)
+    return index
+
+
+def set_search_params(index: faiss.Index, cfg: Dict):
+    """Apply nprobe / efSearch / rerank to an index (keys the index doesn't have are ignored)."""
+    base = index
+    if isinstance(index, faiss.IndexRefine):
+        index.k_factor = float(cfg.get("rerank", 1))
+        base = faiss.downcast_index(index.base_index)
+    if "nprobe" in cfg and hasattr(base, "nprobe"):
+        base.nprobe = int(cfg["nprobe"])
+    if "efSearch" in cfg and hasattr(base, "hnsw"):
+        base.hnsw.efSearch = int(cfg["efSearch"])
+
+
+def selector_params(index: faiss.Index, sel: faiss.IDSelector) -> faiss.SearchParameters:
+    """
+    SearchParameters restricting `index.search` to the ids `sel` accepts, carrying
+    over the index's current nprobe / efSearch / rerank (explicit params replace them).
+    Keep a reference to `sel` for as long as the params are used.
+    """
+    if isinstance(index, faiss.IndexRefine):
+        base = selector_params(faiss.downcast_index(index.base_index), sel)
+        return faiss.IndexRefineSearchParameters(sel=sel, k_factor=index.k_factor, base_index_params=base)
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=sel, nprobe=index.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=sel, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=sel)
+
+
+def default_grid(n: int, d: int) -> List[Dict]:
+    """Candidate configs sized for n vectors of dimension d."""
+    grid: List[Dict] = [{"index": "flat"}]
+
+    for M in (16, 32):
+        for ef in (16, 32, 64, 128, 256):
+            grid.append({"index": "hnsw", "M": M, "efConstruction": 200, "efSearch": ef})
+
+    nlist = 1 << int(round(np.log2(max(4 * np.sqrt(n), 1))))
+    nlist = min(nlist, n // MIN_POINTS_PER_CENTROID)
+    if nlist >= 16:
+        nprobes = [p for p in (1, 2, 4, 8, 16, 32, 64, 128) if p <= nlist]
+        for p in nprobes:
+            grid.append({"index": "ivf", "nlist": nlist, "nprobe": p})
+        for m in (d // 8, d // 4):
+            if m and d % m == 0 and n >= 256 * MIN_POINTS_PER_CENTROID:
+                for p in nprobes:
+                    for r in (1, 4, 16):
+                        grid.append({"index": "ivfpq", "nlist": nlist, "pq_m": m, "pq_nbits": 8, "nprobe": p, "rerank": r})
+    return grid
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    hits = sum(len(set(f[f >= 0]) & set(t[t >= 0])) for f, t in zip(found, truth))
+    return hits / (len(truth) * k)
+
+
+def _index_bytes(index: faiss.Index) -> int:
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def evaluate(
+    xb: np.ndarray,
+    xq: np.ndarray,
+    k: int = 10,
+    configs: Optional[Iterable[Dict]] = None,
+    progress: Optional[Callable[[int, int, Dict], None]] = None,
+) -> List[Dict]:
+    """
+    Exact ground truth by flat scan, then recall@k and per-query latency for
+    every config. Queries run one at a time, like the search endpoint.
+    """
+    n, d = xb.shape
+    k = min(k, n)
+    configs = list(configs or default_grid(n, d))
+
+    flat = faiss.IndexFlatIP(d)
+    flat.add(xb)
+    _, truth = flat.search(xq, k)
+
+    # Group by structure so each index is built once
+    groups: Dict[Tuple, List[Dict]] = {}
+    for cfg in configs:
+        groups.setdefault(structure_key(cfg), []).append(cfg)
+
+    rows: List[Dict] = []
+    done = 0
+    for cfgs in groups.values():
+        t0 = time.perf_counter()
+        index = flat if cfgs[0]["index"] == "flat" else build_index(xb, cfgs[0])
+        build_seconds = time.perf_counter() - t0
+        size = _index_bytes(index)
+
+        for cfg in cfgs:
+            set_search_params(index, cfg)
+            found = np.empty((len(xq), k), dtype=np.int64)
+            latencies = np.empty(len(xq))
+            for i in range(len(xq)):
+                t1 = time.perf_counter()
+                _, I = index.search(xq[i : i + 1], k)
+                latencies[i] = time.perf_counter() - t1
+                found[i] = I[0]
+            rows.append({
+                "config": cfg,
+                "recall": round(recall_at_k(found, truth), 4),
+                "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 4),
+                "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 4),
+                "qps": round(len(xq) / float(latencies.sum()), 1),
+                "build_seconds": round(build_seconds, 3),
+                "index_bytes": size,
+            })
+            done += 1
+            if progress:
+                progress(done, len(configs), rows[-1])
+    return rows
+
+
+def best_config(rows: List[Dict], target_recall: float) -> Optional[Dict]:
+    """Fastest (p50, then p99) row meeting the target recall."""
+    ok = [r for r in rows if r["recall"] >= target_recall]
+    if not ok:
+        return None
+    return min(ok, key=lambda r: (r["p50_ms"], r["p99_ms"], r["index_bytes"]))
+
+
+def recommendation(row: Dict, k: int, target_recall: float, n: int, n_queries: int) -> Dict:
+    """The meta.json["ann"] record for a chosen row."""
+    return {
+        "config": row["config"],
+        "k": k,
+        "target_recall": target_recall,
+        "recall": row["recall"],
+        "p50_ms": row["p50_ms"],
+        "p99_ms": row["p99_ms"],
+        "vectors": n,
+        "queries": n_queries,
+        "evaluated_at": datetime.now(timezone.utc).isoformat(),
+    }
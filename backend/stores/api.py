@@ -1,18 +1,32 @@
+import asyncio
+import json
+import os
+import shutil
 import uuid
-from typing import List, Optional
-from fastapi import APIRouter, UploadFile
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Literal, Optional
+from fastapi import APIRouter, HTTPException, Query, Request, UploadFile
 from fastapi.params import Form
+from fastapi.responses import FileResponse, StreamingResponse
 import numpy as np
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from pathlib import Path
-import networkx as nx
 
 
-from models.registry import get_model
-from config import STORES_DIR
-from jobs.core import Job, JOBS, QUEUE
+from memory import BUDGET
+from result_cache import RESULTS
+from models.registry import get_encoder
+from metrics.core import embed
+from metrics.trace import span
+from config import CACHE_FOLDER, INTERACTIVE_UPLOAD_BYTES, SNAPSHOTS_DIR, STORES_DIR
+from jobs.core import Job, JobKind, Priority
+from jobs.formats import FORMATS, detect_format, open_upload, parquet_available
+from jobs.scheduler import SCHEDULER
 
-from .core import Store, get_store, list_stores
+from .core import ANN_EVAL_FILE, Store, federated_search, get_store, l2norm, list_stores, resolve_stores
+from .snapshot import SNAPSHOT_SUFFIX, Snapshot, SnapshotError
+from .vectors import ARROW_MEDIA_TYPE, arrow_available, arrow_stream, raw_stream, vector_chunks
+from .view import StoreView
 
 
 # -----------------------------
@@ -21,6 +35,9 @@ from .core import Store, get_store, list_stores
 class CreateStoreReq(BaseModel):
     name: str
     model: str
+    # Split texts longer than chunk_tokens encoder tokens into overlapping chunks (None = store whole)
+    chunk_tokens: Optional[int] = Field(None, ge=16, le=8192)
+    chunk_overlap: int = Field(32, ge=0)
 
 
 class AddTextReq(BaseModel):
@@ -41,22 +58,71 @@ class DeleteTextReq(BaseModel):
 
 class SearchReq(BaseModel):
     store: str
-    query: str
+    query: Optional[str] = None
+    queries: Optional[List[str]] = None  # batch mode: one result list per query
     k: int = 5
+    # Diversity (MMR) reranking: set mmr_lambda to enable (1.0 = pure relevance)
+    mmr_lambda: Optional[float] = Field(None, ge=0.0, le=1.0)
+    mmr_pool: Optional[int] = Field(None, ge=1, le=1000)  # candidates reranked; default 4 * k
+    collapse_duplicates: bool = False  # best hit per near-duplicate cluster (see /stores/find_duplicates)
+    aggregate: Literal["max", "sum", "none"] = "max"  # chunked stores: score a document by its chunks ("none" = raw chunks)
 
 
-class InterpolateReq(BaseModel):
-    store: str
+class FederatedSearchReq(BaseModel):
+    stores: List[str] = Field(..., min_length=1)  # names and/or globs ("tweets-2024-*"); must share a model
+    query: Optional[str] = None
+    queries: Optional[List[str]] = None
+    k: int = 5
+    mmr_lambda: Optional[float] = Field(None, ge=0.0, le=1.0)  # applied per store
+    mmr_pool: Optional[int] = Field(None, ge=1, le=1000)
+    collapse_duplicates: bool = False
+    aggregate: Literal["max", "sum", "none"] = "max"
+
+
+VectorFormat = Literal["raw", "arrow"]  # raw: row-major little-endian buffer; arrow: IPC stream
+VectorDtype = Literal["float32", "float16"]
+
+MAX_EMBED_TEXTS = 4096
+
+
+class VectorsReq(BaseModel):
+    rows: Optional[List[int]] = None  # index rows, in output order...
+    ids: Optional[List[str]] = None  # ...or entry ids
+    format: VectorFormat = "raw"
+    dtype: VectorDtype = "float32"
+
+
+class EmbedReq(BaseModel):
+    texts: List[str] = Field(..., min_length=1, max_length=MAX_EMBED_TEXTS)
+    model: Optional[str] = None  # model id...
+    store: Optional[str] = None  # ...or the model of this store (vectors comparable with its index)
+    normalize: bool = True
+    batch_size: int = Field(256, ge=1, le=MAX_EMBED_TEXTS)
+    format: VectorFormat = "raw"
+    dtype: VectorDtype = "float32"
+
+
+class SentencePair(BaseModel):
     sentence_a: str
     sentence_b: str
+
+
+class InterpolateReq(BaseModel):
+    store: str
+    sentence_a: Optional[str] = None
+    sentence_b: Optional[str] = None
+    pairs: Optional[List[SentencePair]] = None  # batch mode: many paths per request
     steps: int = 5  # number of points to interpolate
     k: int = 1      # how many results per step
+    method: Literal["linear", "slerp"] = "linear"
+    dedup: bool = False  # never repeat an entry along a path
 
 class BuildGraphReq(BaseModel):
     store: str
     k: int = 10
     efConstruction: int = 200
     M: int = 32
+    priority: Priority = Priority.BULK
 
 class GraphSearchReq(BaseModel):
     store: str
@@ -64,6 +130,41 @@ class GraphSearchReq(BaseModel):
     end: str
     k: int = 5
 
+class EvalAnnReq(BaseModel):
+    store: str
+    k: int = 10
+    queries: int = 200  # sampled from the store's own entries...
+    query_texts: Optional[List[str]] = None  # ...unless queries are supplied
+    target_recall: float = 0.95
+    write: bool = False  # store the best config in meta.json
+    configs: Optional[List[Dict[str, Any]]] = None  # default: grid sized for the store
+    priority: Priority = Priority.BULK
+
+class FindDuplicatesReq(BaseModel):
+    store: str
+    threshold: float = Field(0.95, gt=0.0, le=1.0)  # cosine similarity
+    k: int = Field(32, ge=1, le=1024)  # neighbors checked per entry
+    block_size: int = Field(4096, ge=1, le=65536)  # rows per FAISS call
+    priority: Priority = Priority.BULK
+
+class TopicsReq(BaseModel):
+    store: str
+    k: int = Field(50, ge=1, le=4096)  # number of topics
+    niter: int = Field(20, ge=1, le=200)  # k-means iterations
+    sample: int = Field(2000, ge=0, le=20000)  # points kept for the 2D layout
+    representatives: int = Field(5, ge=1, le=50)  # entries closest to each centroid
+    priority: Priority = Priority.BULK
+
+class ExportSnapshotReq(BaseModel):
+    include_index: Optional[bool] = None  # default: only for non-flat indexes
+    include_graph: bool = True
+    priority: Priority = Priority.BULK
+
+class ImportSnapshotReq(BaseModel):
+    name: str  # target store
+    file: str  # snapshot in the snapshots dir (exported here or uploaded)
+    overwrite: bool = False
+    priority: Priority = Priority.BULK
 
 
 # -----------------------------
@@ -71,6 +172,8 @@ class GraphSearchReq(BaseModel):
 # -----------------------------
 router = APIRouter()
 
+MAX_PAGE = 1000  # entries per page
+
 
 @router.get("/stores/list")
 def stores_list():
@@ -79,14 +182,38 @@ def stores_list():
 
 @router.post("/stores/create")
 def create_store(req: CreateStoreReq):
-    Store.create(req.name, STORES_DIR, req.model)
-    return {"ok": True, "name": req.name, "model": req.model}
+    chunking = None
+    if req.chunk_tokens is not None:
+        if req.chunk_overlap >= req.chunk_tokens:
+            raise HTTPException(status_code=422, detail="chunk_overlap must be smaller than chunk_tokens")
+        chunking = {"max_tokens": req.chunk_tokens, "overlap": req.chunk_overlap}
+    Store.create(req.name, STORES_DIR, req.model, chunking=chunking)
+    return {"ok": True, "name": req.name, "model": req.model, "chunking": chunking}
 
 
 @router.get("/stores/info/{name}")
 def store_info(name: str):
+    # Doesn't load anything: count comes from the index header when it isn't resident
     s = get_store(name)
-    return {"name": name, "model": s.meta["model"], "count": s.count}
+    return {"name": name, "model": s.meta["model"], "count": s.count, "residency": s.residency()}
+
+
+@router.get("/stores/memory")
+def stores_memory():
+    """Everything currently loaded (indexes, graphs, models), most recently used first."""
+    return BUDGET.dict()
+
+
+@router.get("/stores/cache")
+def stores_cache():
+    """Result cache size and per-endpoint hit ratios."""
+    return RESULTS.dict()
+
+
+@router.delete("/stores/cache")
+def clear_stores_cache():
+    RESULTS.clear()
+    return {"cleared": True}
 
 
 @router.post("/stores/add_text")
@@ -104,9 +231,134 @@ def store_add_texts(req: AddTextsReq):
 
 
 @router.get("/stores/{name}/entries")
-def store_entries(name: str):
+def store_entries(
+    name: str,
+    cursor: int = Query(0, ge=0),  # row to start from (next_cursor of the previous page)
+    limit: int = Query(100, ge=1, le=MAX_PAGE),
+    q: Optional[str] = None,  # substring filter on text
+    prefix: Optional[str] = None,  # text prefix filter
+    ignore_case: bool = True,
+    max_scan: int = Query(100_000, ge=1),  # rows examined per filtered page
+):
+    """
+    Entries page by page, served from the row offset index.
+    Filtered pages may be short (at most `max_scan` rows are examined per call);
+    follow `next_cursor` until it is null.
+    """
+    s = get_store(name)
+    entries, next_cursor, total = s.page_entries(cursor, limit, q, prefix, ignore_case, max_scan)
+    return {"entries": entries, "next_cursor": next_cursor, "total": total}
+
+
+@router.get("/stores/{name}/entries/stream")
+def store_entries_stream(
+    name: str,
+    cursor: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    q: Optional[str] = None,
+    prefix: Optional[str] = None,
+    ignore_case: bool = True,
+):
+    """All (matching) entries as NDJSON, read lazily from entries.jsonl."""
     s = get_store(name)
-    return {"entries": s.get_all()}
+
+    def lines():
+        for entry in s.iter_entries(cursor, limit, q, prefix, ignore_case):
+            yield json.dumps(entry) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+# -----------------------------
+# Binary vectors
+# -----------------------------
+def _vector_response(chunks, count: int, dim: int, fmt: str, dtype: str, headers: Optional[Dict[str, str]] = None):
+    """
+    Stream (rows, vectors) chunks as raw bytes or Arrow IPC.
+    Shape and dtype travel in headers, so raw buffers can be read with
+    np.frombuffer(body, dtype).reshape(count, dim).
+    """
+    if fmt == "arrow" and not arrow_available():
+        raise HTTPException(status_code=501, detail="Arrow output needs pyarrow installed on the server")
+    headers = {"X-Vector-Count": str(count), "X-Vector-Dim": str(dim), "X-Vector-Dtype": dtype, **(headers or {})}
+    if fmt == "arrow":
+        return StreamingResponse(arrow_stream(chunks, dim, dtype), media_type=ARROW_MEDIA_TYPE, headers=headers)
+    headers["Content-Length"] = str(count * dim * (4 if dtype == "float32" else 2))
+    return StreamingResponse(raw_stream(chunks, dtype), media_type="application/octet-stream", headers=headers)
+
+
+def _store_vectors(view: StoreView, rows: Optional[np.ndarray], start: int, stop: Optional[int], fmt: str, dtype: str):
+    source = view.vectors()
+    if rows is not None:
+        bad = rows[(rows < 0) | (rows >= source.n)]
+        if len(bad):
+            raise HTTPException(status_code=404, detail=f"Rows out of range (store has {source.n}): {bad[:10].tolist()}")
+        count = len(rows)
+    else:
+        stop = source.n if stop is None else min(stop, source.n)
+        start = min(start, stop)
+        count = stop - start
+    chunks = vector_chunks(source, rows, start, stop, dtype)
+    return _vector_response(chunks, count, source.d, fmt, dtype, {"X-Store-Generation": str(view.generation)})
+
+
+@router.get("/stores/{name}/vectors")
+def store_vectors(
+    name: str,
+    start: int = Query(0, ge=0),
+    stop: Optional[int] = Query(None, ge=0),  # exclusive; default: all rows
+    format: VectorFormat = "raw",
+    dtype: VectorDtype = "float32",
+):
+    """
+    Stored vectors of rows [start, stop) as a binary stream, in index row order
+    (row i is entry i of /stores/{name}/entries). Flat indexes are streamed
+    straight from the mapped index file.
+    """
+    return _store_vectors(get_store(name).view(), None, start, stop, format, dtype)
+
+
+@router.post("/stores/{name}/vectors")
+def store_vectors_select(name: str, req: VectorsReq):
+    """Stored vectors of the given rows or entry ids, in request order."""
+    if (req.rows is None) == (req.ids is None):
+        raise HTTPException(status_code=422, detail="Provide rows or ids")
+    # Ids resolve against the same generation the vectors are read from
+    view = get_store(name).view()
+    if req.ids is not None:
+        rows, missing = view.rows_for_ids(req.ids)
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Unknown ids: {missing[:10]}")
+    else:
+        rows = np.asarray(req.rows, dtype=np.int64)
+    return _store_vectors(view, rows, 0, None, req.format, req.dtype)
+
+
+@router.post("/embed")
+def embed_texts(req: EmbedReq):
+    """Embed arbitrary texts and return the vectors in the same binary formats as /stores/{name}/vectors."""
+    if (req.model is None) == (req.store is None):
+        raise HTTPException(status_code=422, detail="Provide model or store")
+    model_id = get_store(req.store).meta["model"] if req.store is not None else req.model
+    try:
+        model = get_encoder(model_id, CACHE_FOLDER)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown model: {model_id}")
+    # First batch up front: fixes the dimension for the headers and surfaces model errors as a status code
+    first = np.asarray(embed(model, req.texts[:req.batch_size]), dtype=np.float32)
+
+    def chunks():
+        lo, vecs = 0, first
+        while True:
+            if req.normalize:
+                vecs = l2norm(vecs)
+            yield np.arange(lo, lo + len(vecs), dtype=np.int64), vecs
+            lo += len(vecs)
+            if lo >= len(req.texts):
+                return
+            vecs = np.asarray(embed(model, req.texts[lo:lo + req.batch_size]), dtype=np.float32)
+
+    return _vector_response(chunks(), len(req.texts), first.shape[1], req.format, req.dtype, {"X-Model": model_id})
 
 
 @router.post("/stores/delete_text")
@@ -130,94 +382,459 @@ async def upload_file(
     store: str = Form(...),
     file: UploadFile = None,
     batch_size: int = Form(64),
+    priority: Optional[Priority] = Form(None),
+    # Structured uploads: format defaults from the file suffix (.jsonl/.csv/.tsv/.parquet; else one text per line)
+    format: Optional[str] = Form(None),
+    text_column: str = Form("text"),
+    id_column: Optional[str] = Form(None),  # caller ids replace generated uuids where non-empty
+    metadata_columns: Optional[str] = Form(None),  # comma separated, stored as entry["metadata"]
 ):
+    fmt = format or detect_format(file.filename)
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=422, detail=f"Unknown format {fmt!r}; expected one of {list(FORMATS)}")
+    if fmt == "parquet" and not parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet uploads need pyarrow installed on the server")
+    params = {}
+    if fmt != "text":
+        params = {
+            "format": fmt,
+            "text_column": text_column,
+            "id_column": id_column or None,
+            "metadata_columns": [c.strip() for c in (metadata_columns or "").split(",") if c.strip()],
+        }
+
     tmp_path = Path(f"/tmp/{uuid.uuid4()}_{file.filename}")
     with open(tmp_path, "wb") as f:
-        f.write(await file.read())
+        await asyncio.to_thread(shutil.copyfileobj, file.file, f, 1 << 20)
+
+    # Fail fast on missing columns (reads only the header / Parquet footer)
+    try:
+        open_upload(tmp_path, params).close()
+    except (ValueError, OSError) as e:
+        tmp_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=422, detail=f"Cannot read {fmt} upload: {e}")
+
+    # Small uploads are interactive unless the caller says otherwise
+    if priority is None:
+        small = tmp_path.stat().st_size <= INTERACTIVE_UPLOAD_BYTES
+        priority = Priority.INTERACTIVE if small else Priority.BULK
 
     # create job with batch_size
-    job = Job(store, file.filename, tmp_path, batch_size=batch_size)
-    JOBS[job.id] = job
-    await QUEUE.put(job)
+    job = Job(store, file.filename, tmp_path, batch_size=batch_size, params=params, priority=priority)
+    await SCHEDULER.submit(job)
 
-    return {"job_id": job.id}
+    return {"job_id": job.id, "priority": job.priority.value}
 
 
 # 🔑 New POST /search endpoint
+# -----------------------------
+# Result cache: keyed by store generation, so writes invalidate
+# -----------------------------
+def _cache_key(endpoint: str, stores: List[Store], req: BaseModel):
+    return (
+        endpoint,
+        tuple((s.path.name, s._ino, s.published_generation) for s in stores),
+        json.dumps(req.dict(), sort_keys=True, separators=(",", ":")),
+    )
+
+
+def _cached(endpoint: str, stores: List[Store], req: BaseModel, compute):
+    # The key loads nothing (a hit never touches FAISS); `compute` pins a view on a miss.
+    # Its generation is >= the key's, so a key never holds older results than it names.
+    key = _cache_key(endpoint, stores, req)
+    return RESULTS.cached(endpoint, key, tuple(s.path.name for s in stores), compute)
+
+
 @router.post("/search")
 def search(req: SearchReq):
     s = get_store(req.store)
-    results = s.search(req.query, req.k)
+    return _cached("search", [s], req, lambda: _search(s, req))
+
+
+def _search(s: Store, req: SearchReq):
+    if req.queries is not None:
+        return {"results": s.search_batch(req.queries, req.k, req.mmr_lambda, req.mmr_pool, req.collapse_duplicates, req.aggregate)}
+    if req.query is None:
+        raise HTTPException(status_code=422, detail="Provide query or queries")
+    results = s.search(req.query, req.k, req.mmr_lambda, req.mmr_pool, req.collapse_duplicates, req.aggregate)
     return {"results": results}
 
 
+@router.post("/search/federated")
+def search_federated(req: FederatedSearchReq):
+    """One query over many stores: encoded once, stores searched in parallel, global top-k."""
+    if (req.query is None) == (req.queries is None):
+        raise HTTPException(status_code=422, detail="Provide query or queries")
+    try:
+        names = resolve_stores(req.stores)
+        stores = [get_store(name) for name in names]
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return _cached("search_federated", stores, req, lambda: _search_federated(stores, req))
+
+
+def _search_federated(stores: List[Store], req: FederatedSearchReq):
+    queries = req.queries if req.queries is not None else [req.query]
+    try:
+        results = federated_search(stores, queries, req.k, req.mmr_lambda, req.mmr_pool, req.collapse_duplicates, req.aggregate)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"stores": [s.path.name for s in stores], "results": results if req.queries is not None else results[0]}
+
+
 @router.post("/interpolate")
 def interpolate(req: InterpolateReq):
     s = get_store(req.store)
-    model_id = s.meta["model"]
-    model = get_model(model_id)()
-    model.load()
-
-    # encode both endpoints
-    v_a = model.embed([req.sentence_a]).astype(np.float32)[0]
-    v_b = model.embed([req.sentence_b]).astype(np.float32)[0]
-
-    results = []
-    for i in range(1, req.steps + 1):
-        t = i / (req.steps + 1)
-        v_interp = (1 - t) * v_a + t * v_b
-        v_interp = v_interp / np.linalg.norm(v_interp)  # normalize like search
-        sims, ids = s.index.search(np.array([v_interp]), min(req.k, s.count))
-        entries = s.get_all()
-        step_results = [
-            {
-                "id": entries[int(idx)]["id"],
-                "text": entries[int(idx)]["text"],
-                "score": float(sim),
-            }
-            for idx, sim in zip(ids[0], sims[0])
+    return _cached("interpolate", [s], req, lambda: _interpolate(s, req))
+
+
+def _interpolate(s: Store, req: InterpolateReq):
+    if req.pairs is not None:
+        pairs = [(p.sentence_a, p.sentence_b) for p in req.pairs]
+    elif req.sentence_a is not None and req.sentence_b is not None:
+        pairs = [(req.sentence_a, req.sentence_b)]
+    else:
+        raise HTTPException(status_code=422, detail="Provide sentence_a/sentence_b or pairs")
+
+    paths = s.interpolate(pairs, steps=req.steps, k=req.k, method=req.method, dedup=req.dedup)
+    if req.pairs is None:
+        return {"interpolations": paths[0]}
+    return {
+        "paths": [
+            {"sentence_a": a, "sentence_b": b, "interpolations": path}
+            for (a, b), path in zip(pairs, paths)
         ]
-        results.append({"step": i, "results": step_results})
-    return {"interpolations": results}
+    }
 
 @router.post("/stores/build_graph")
 async def build_graph(req: BuildGraphReq):
-    from jobs.core import Job, JOBS, QUEUE
-
     # Create background job
-    job = Job(store=req.store, filename="graph", path=Path(""), batch_size=req.k)
+    job = Job(
+        store=req.store,
+        filename="graph",
+        path=Path(""),
+        batch_size=req.k,
+        kind=JobKind.BUILD_GRAPH,
+        params=req.dict(exclude={"priority"}),
+        priority=req.priority,
+    )
     job.log("Queued graph build job")
-    JOBS[job.id] = job
-    await QUEUE.put(("build_graph", req.dict(), job.id))
+    await SCHEDULER.submit(job)
     return {"job_id": job.id}
 
 
-@router.post("/graph_search")
-async def graph_search(req: GraphSearchReq):
-    s = get_store(req.store)
+@router.post("/stores/eval_ann")
+async def eval_ann(req: EvalAnnReq):
+    get_store(req.store)  # fail before queueing if the store is missing
+    job = Job(
+        store=req.store,
+        filename="eval_ann",
+        path=Path(""),
+        batch_size=req.k,
+        kind=JobKind.EVAL_ANN,
+        params=req.dict(exclude={"priority"}),
+        priority=req.priority,
+    )
+    job.log("Queued ANN evaluation job")
+    await SCHEDULER.submit(job)
+    return {"job_id": job.id}
+
 
-    # 1) Get embeddings
-    model_id = s.meta["model"]
-    encoder = get_model(model_id)()
-    encoder.load()
-    v_start = encoder.embed([req.start]).astype(np.float32)
-    v_end = encoder.embed([req.end]).astype(np.float32)
+@router.get("/stores/{name}/ann_eval")
+def ann_eval_report(name: str):
+    s = get_store(name)
+    path = s.path / ANN_EVAL_FILE
+    if not path.exists():
+        raise HTTPException(404, "No ANN evaluation for this store yet")
+    with open(path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    return {**report, "applied": s.meta.get("ann")}
 
-    G: nx.Graph
-    # 2) Ensure graph exists
-    print("Loading Grap...")
-    if not hasattr(s, "graph") or s.graph is None:
-        print("Graph not Found. Building graph...")
-        G = await s.build_graph()
 
-    else:
-        G = s.graph
+# -----------------------------
+# Near-duplicates
+# -----------------------------
+@router.post("/stores/find_duplicates")
+async def find_duplicates(req: FindDuplicatesReq):
+    get_store(req.store)  # fail before queueing if the store is missing
+    job = Job(
+        store=req.store,
+        filename="find_duplicates",
+        path=Path(""),
+        batch_size=req.block_size,
+        kind=JobKind.FIND_DUPLICATES,
+        params=req.dict(exclude={"priority"}),
+        priority=req.priority,
+    )
+    job.log("Queued near-duplicate clustering job")
+    await SCHEDULER.submit(job)
+    return {"job_id": job.id}
+
+
+def _clusters(view: StoreView):
+    clusters = view.clusters
+    if clusters is None:
+        raise HTTPException(404, "No near-duplicate clusters for this store yet")
+    return clusters
+
+
+@router.get("/stores/{name}/clusters")
+def list_clusters(
+    name: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=MAX_PAGE),
+    min_size: int = Query(2, ge=1),
+    samples: int = Query(3, ge=0, le=20),
+):
+    """Near-duplicate clusters, largest first, with a few member texts each."""
+    s = get_store(name)
+    view = s.view()
+    clusters = _clusters(view)
+    page = clusters.clusters(offset, limit, min_size)
+    members = {c["id"]: clusters.members(c["id"])[:samples] for c in page["clusters"]} if samples else {}
+    rows = view.get_rows({int(r) for m in members.values() for r in m})
+    for c in page["clusters"]:
+        c["samples"] = [rows[int(r)] for r in members.get(c["id"], []) if int(r) in rows]
+    return {**page, "stats": s.meta.get("dedup"), "count": view.n}
+
+
+@router.get("/stores/{name}/clusters/{cluster_id}")
+def cluster_members(name: str, cluster_id: int, offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=MAX_PAGE)):
+    view = get_store(name).view()
+    members = _clusters(view).members(cluster_id)
+    if not len(members):
+        raise HTTPException(404, f"No cluster {cluster_id}")
+    page = members[offset:offset + limit]
+    rows = view.get_rows(page)
+    return {
+        "id": cluster_id,
+        "size": int(len(members)),
+        "entries": [{"row": int(r), **rows[int(r)]} for r in page if int(r) in rows],
+        "next_offset": offset + len(page) if offset + len(page) < len(members) else None,
+    }
+
+
+# -----------------------------
+# Topics
+# -----------------------------
+@router.post("/stores/topics")
+async def compute_topics(req: TopicsReq):
+    get_store(req.store)  # fail before queueing if the store is missing
+    job = Job(
+        store=req.store,
+        filename="topics",
+        path=Path(""),
+        batch_size=req.k,
+        kind=JobKind.TOPICS,
+        params=req.dict(exclude={"priority"}),
+        priority=req.priority,
+    )
+    job.log("Queued topic clustering job")
+    await SCHEDULER.submit(job)
+    return {"job_id": job.id}
 
+
+def _topics(s: Store) -> StoreView:
+    # Read-only: new rows are assigned by the ingest / topics jobs, not here
+    view = s.view()
+    if view.topics is None:
+        raise HTTPException(404, "No topics for this store yet")
+    return view
+
+
+def _topics_freshness(view: StoreView) -> Dict:
+    # Rows added after the last assignment aren't in any topic yet
+    return {"count": view.n, "stale": view.topics.n < view.n}
+
+
+@router.get("/stores/{name}/topics")
+def get_topics(name: str):
+    """Topic sizes, centroid positions and representative entries."""
+    view = _topics(get_store(name))
+    summary = view.topics.summary()
+    rows = view.get_rows({r for t in summary["topics"] for r in t["representatives"]})
+    for t in summary["topics"]:
+        t["representatives"] = [
+            {"row": r, "id": rows[r]["id"], "text": rows[r]["text"]} for r in t["representatives"] if r in rows
+        ]
+    return {**summary, **_topics_freshness(view)}
+
+
+@router.get("/stores/{name}/topics/layout")
+def get_topics_layout(name: str):
+    """Sampled entries projected on the centroid plane (rows / x / y / topic arrays)."""
+    view = _topics(get_store(name))
+    return {**view.topics.layout(), **_topics_freshness(view)}
+
+
+@router.get("/stores/{name}/topics/{topic_id}")
+def topic_members(name: str, topic_id: int, offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=MAX_PAGE)):
+    view = _topics(get_store(name))
+    topics = view.topics
+    if not 0 <= topic_id < topics.k:
+        raise HTTPException(404, f"No topic {topic_id}")
+    members = topics.members(topic_id)
+    page = members[offset:offset + limit]
+    rows = view.get_rows(page)
+    return {
+        "id": topic_id,
+        "size": int(len(members)),
+        "entries": [{"row": int(r), **rows[int(r)]} for r in page if int(r) in rows],
+        "next_offset": offset + len(page) if offset + len(page) < len(members) else None,
+        **_topics_freshness(view),
+    }
+
+
+# -----------------------------
+# Snapshots
+# -----------------------------
+def _snapshot_path(file: str) -> Path:
+    if "/" in file or file.startswith(".") or not file.endswith(SNAPSHOT_SUFFIX):
+        raise HTTPException(400, f"Invalid snapshot name (expected <name>{SNAPSHOT_SUFFIX})")
+    return SNAPSHOTS_DIR / file
+
+
+async def _queue_import(name: str, path: Path, overwrite: bool, priority: Priority) -> Job:
+    job = Job(
+        store=name,
+        filename=path.name,
+        path=path,
+        batch_size=0,
+        kind=JobKind.IMPORT_SNAPSHOT,
+        params={"overwrite": overwrite},
+        priority=priority,
+    )
+    job.log("Queued snapshot import job")
+    await SCHEDULER.submit(job)
+    return job
+
+
+@router.post("/stores/{name}/export")
+async def export_store(name: str, req: ExportSnapshotReq):
+    get_store(name)  # fail before queueing if the store is missing
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    path = SNAPSHOTS_DIR / f"{name}-{stamp}{SNAPSHOT_SUFFIX}"
+    job = Job(
+        store=name,
+        filename=path.name,
+        path=path,
+        batch_size=0,
+        kind=JobKind.EXPORT_SNAPSHOT,
+        params=req.dict(exclude={"priority"}),
+        priority=req.priority,
+    )
+    job.log("Queued snapshot export job")
+    await SCHEDULER.submit(job)
+    return {"job_id": job.id, "file": path.name, "download": f"/stores/snapshots/{path.name}"}
+
+
+@router.get("/stores/snapshots")
+def list_snapshots():
+    out = []
+    for p in sorted(SNAPSHOTS_DIR.glob(f"*{SNAPSHOT_SUFFIX}")):
+        info = {"file": p.name, "bytes": p.stat().st_size}
+        try:
+            with Snapshot(p) as snap:
+                d = snap.directory
+                info.update(store=d["meta"].get("name"), model=d["meta"].get("model"), count=d["count"],
+                            dim=d["dim"], created_at=d["created_at"], blocks=sorted(d["blocks"]))
+        except (SnapshotError, ValueError, OSError) as e:
+            info["error"] = str(e)
+        out.append(info)
+    return {"snapshots": out}
+
+
+@router.get("/stores/snapshots/{file}")
+def download_snapshot(file: str):
+    path = _snapshot_path(file)
+    if not path.exists():
+        raise HTTPException(404, "Snapshot not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=file)
+
+
+@router.put("/stores/snapshots/{file}")
+async def upload_snapshot(
+    file: str,
+    request: Request,
+    import_as: Optional[str] = None,
+    overwrite: bool = False,
+    priority: Priority = Priority.BULK,
+):
+    """
+    Raw (optionally chunked) request body streamed to disk.
+    With ?import_as=<store>, an import job is queued once the upload is complete.
+    """
+    path = _snapshot_path(file)
+    partial = path.with_name(path.name + ".partial")
+    size = 0
+    try:
+        with open(partial, "wb") as f:
+            async for chunk in request.stream():
+                f.write(chunk)
+                size += len(chunk)
+        os.replace(partial, path)
+    finally:
+        partial.unlink(missing_ok=True)
+
+    out = {"file": file, "bytes": size}
+    if import_as:
+        job = await _queue_import(import_as, path, overwrite, priority)
+        out["job_id"] = job.id
+    return out
+
+
+@router.post("/stores/import")
+async def import_store(req: ImportSnapshotReq):
+    path = _snapshot_path(req.file)
+    if not path.exists():
+        raise HTTPException(404, "Snapshot not found")
+    if (STORES_DIR / req.name).exists() and not req.overwrite:
+        raise HTTPException(409, f"Store already exists: {req.name}")
+    job = await _queue_import(req.name, path, req.overwrite, req.priority)
+    return {"job_id": job.id}
+
+
+@router.post("/graph_search")
+async def graph_search(req: GraphSearchReq):
+    s = get_store(req.store)
+    # Ensure the graph exists and is fresh before keying: building / syncing bumps the generation
+    if s.graph_outdated:
+        with span("graph"):
+            if s.graph is None:
+                print("Graph not Found. Building graph...")
+                await s.build_graph()
+            else:
+                # Catch up on rows ingested since the last sync and repair tombstones
+                await asyncio.to_thread(s.sync_graph)
+    key = _cache_key("graph_search", [s], req)
+    result = RESULTS.get("graph_search", key)
+    if result is None:
+        result = await _graph_search(s, req)
+        RESULTS.put(key, result, (s.path.name,))
+    return result
+
+
+async def _graph_search(s: Store, req: GraphSearchReq):
+    # 1) Get embeddings (off-thread, like /search)
+    encoder = await s.load_encoder()
+    v_start, v_end = (await asyncio.to_thread(embed, encoder, [req.start, req.end])).astype(np.float32)
+
+    # 2) Path over the pinned graph (networkx / FAISS work off the event loop too)
+    return await asyncio.to_thread(_graph_path, s, v_start[None, :], v_end[None, :], req.k)
+
+
+def _graph_path(s: Store, v_start: np.ndarray, v_end: np.ndarray, k: Optional[int]):
+    print("Loading Graph...")
+    with span("graph"):
+        view = s.view()
+        graph = view.graph
+        G = graph.to_networkx()
     print("Graph Loaded")
 
     # 3) Find closest nodes in the graph for start and end
-    entries = s.get_all()
-    embs = s.index.reconstruct_n(0, len(entries))
+    #    (only rows below the watermark are graph nodes)
+    n = graph.n
+    embs = view.index.reconstruct_n(0, n)
     dists_start = np.dot(embs, v_start.T).flatten()
     dists_end = np.dot(embs, v_end.T).flatten()
     start_node = int(np.argmax(dists_start))
@@ -225,15 +842,23 @@ async def graph_search(req: GraphSearchReq):
 
     # 4) Shortest path in the graph
     print("Computing Shortest Path...")
-    path = nx.shortest_path(G, source=start_node, target=end_node, weight="weight")
+    import networkx as nx
+
+    with span("graph"):
+        path = nx.shortest_path(G, source=start_node, target=end_node, weight="weight")
 
-    # 5) Optionally truncate or interpolate path to req.k
-    if req.k and len(path) > req.k + 2:
+    # 5) Optionally truncate or interpolate path to k
+    if k and len(path) > k + 2:
         # keep start + end, subsample intermediate nodes
-        step = max(1, len(path) // (req.k + 1))
+        step = max(1, len(path) // (k + 1))
         path = path[::step]
         if path[-1] != end_node:
             path.append(end_node)
 
+    entries = view.get_rows(path)
     nodes = [{"id": entries[i]["id"], "text": entries[i]["text"]} for i in path]
-    return {"nodes": nodes, "distance": float(len(path))}
\ No newline at end of file
+    return {
+        "nodes": nodes,
+        "distance": float(len(path)),
+        "graph": {"watermark": n, "count": view.n, "stale": n < view.n},
+    }
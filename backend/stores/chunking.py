@@ -0,0 +1,172 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import EMBED_THREADS
+from metrics.core import embed
+
+from .dedup import relabel_after_delete
+from .graph import _save_array
+
+PARENTS_FILE = "parents.npy"
+
+AGGREGATIONS = ("max", "sum")
+
+
+# -----------------------------
+# Splitting
+# -----------------------------
+def chunk_spans(spans: np.ndarray, max_tokens: int, overlap: int) -> np.ndarray:
+    """
+    (m, 2) character ranges of windows of at most `max_tokens` tokens, each
+    sharing `overlap` tokens with the previous one; the last window ends at the
+    last token. `spans` are the (n_tokens, 2) token spans of one text.
+    """
+    n = len(spans)
+    step = max_tokens - overlap
+    starts = np.arange(0, max(n - max_tokens, 0) + step, step)
+    ends = np.minimum(starts + max_tokens, n) - 1
+    return np.stack([spans[starts, 0], spans[ends, 1]], axis=1)
+
+
+def split_texts(model, texts: List[str], max_tokens: int, overlap: int) -> List[List[str]]:
+    """
+    Each text as a list of chunks, counted in the encoder's own tokens.
+    Texts within `max_tokens` come back whole (one chunk).
+    """
+    if model.max_tokens:
+        max_tokens = min(max_tokens, model.max_tokens - 2)  # room for [CLS]/[SEP]-style specials
+    overlap = min(overlap, max_tokens // 2)
+    out = []
+    for text, spans in zip(texts, model.token_spans(texts)):
+        if len(spans) <= max_tokens:
+            out.append([text])
+        else:
+            out.append([text[a:b] for a, b in chunk_spans(spans, max_tokens, overlap)])
+    return out
+
+
+# -----------------------------
+# Embedding
+# -----------------------------
+_EMBED_POOL: Optional[ThreadPoolExecutor] = None
+_EMBED_POOL_LOCK = threading.Lock()
+
+
+def _embed_pool() -> ThreadPoolExecutor:
+    global _EMBED_POOL
+    with _EMBED_POOL_LOCK:
+        if _EMBED_POOL is None:
+            _EMBED_POOL = ThreadPoolExecutor(max_workers=EMBED_THREADS, thread_name_prefix="embed")
+        return _EMBED_POOL
+
+
+def embed_batches(model, texts: List[str], batch_size: int) -> np.ndarray:
+    """
+    Embed many texts in encoder calls of `batch_size`, grouping texts of similar
+    length so each call pads little. Calls run on EMBED_THREADS threads.
+    Rows come back in input order. Blocking.
+    """
+    order = np.argsort([len(t) for t in texts], kind="stable")
+    batches = [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+    def run(rows: np.ndarray) -> np.ndarray:
+        return np.asarray(embed(model, [texts[i] for i in rows]), dtype=np.float32)
+
+    if EMBED_THREADS > 1 and len(batches) > 1:
+        results = list(_embed_pool().map(run, batches))
+    else:
+        results = [run(rows) for rows in batches]
+    out = np.empty((len(texts), results[0].shape[1]), dtype=np.float32)
+    for rows, embs in zip(batches, results):
+        out[rows] = embs
+    return out
+
+
+# -----------------------------
+# Chunk -> parent mapping
+# -----------------------------
+class ChunkParents:
+    """
+    Parent entry of every index row as one int64 array: labels[row] is the row
+    of the parent's first chunk (whole entries are their own parent). Same
+    layout as duplicate clusters, so deletes remap it the same way.
+    """
+
+    def __init__(self, labels: np.ndarray):
+        self.labels = labels
+
+    @property
+    def n(self) -> int:
+        return int(self.labels.shape[0])
+
+    def label(self, rows: np.ndarray) -> np.ndarray:
+        rows = np.asarray(rows, dtype=np.int64)
+        out = rows.copy()
+        inside = (rows >= 0) & (rows < self.n)
+        out[inside] = self.labels[rows[inside]]
+        return out
+
+    def extend(self, start: int, entries: List[Dict]) -> "ChunkParents":
+        """
+        Labels for `entries` appended as rows start, start+1, ...; a chunk's parent
+        starts `chunk` rows above it. Labels past `start` (left by an interrupted
+        write) are replaced.
+        """
+        if start > self.n:
+            raise ValueError(f"Parent labels cover {self.n} rows, appending at {start}")
+        rows = start + np.arange(len(entries), dtype=np.int64)
+        back = np.fromiter((e.get("chunk", 0) for e in entries), dtype=np.int64, count=len(entries))
+        return ChunkParents(np.concatenate([np.asarray(self.labels[:start]), rows - back]))
+
+    def remove_rows(self, rows: List[int]) -> "ChunkParents":
+        return ChunkParents(relabel_after_delete(self.labels, rows))
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["ChunkParents"]:
+        labels_path = path / PARENTS_FILE
+        if not labels_path.exists():
+            return None
+        return cls(np.load(labels_path, mmap_mode="r"))
+
+    def save(self, path: Path):
+        _save_array(path / PARENTS_FILE, np.ascontiguousarray(self.labels, dtype=np.int64))
+
+
+def aggregate_chunks(ids: np.ndarray, sims: np.ndarray, labels: np.ndarray, how: str = "max") -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fold (Q, k) chunk hits into parent hits, for all queries at once: one hit
+    per (query, parent), scored by the max or sum of its chunks' scores and
+    represented by its best chunk. Parents are sorted by score, compacted to
+    the left and padded with -1 / -inf.
+    """
+    Q = ids.shape[0]
+    valid = ids >= 0
+    q = np.broadcast_to(np.arange(Q)[:, None], ids.shape)[valid]
+    lab, s, rid = labels[valid], sims[valid], ids[valid]
+
+    # Group by (query, parent), best chunk first within each group
+    order = np.lexsort((-s, lab, q))
+    q, lab, s, rid = q[order], lab[order], s[order], rid[order]
+    first = np.ones(len(q), dtype=bool)
+    first[1:] = (q[1:] != q[:-1]) | (lab[1:] != lab[:-1])
+    starts = np.flatnonzero(first)
+    if how == "max" or not len(starts):
+        score = s[starts]
+    else:
+        score = np.add.reduceat(s, starts)
+    gq, best = q[starts], rid[starts]
+
+    # Rank parents within each query
+    order = np.lexsort((-score, gq))
+    gq, score, best = gq[order], score[order], best[order]
+    rank = np.arange(len(gq)) - np.searchsorted(gq, gq)
+
+    out_ids = np.full_like(ids, -1)
+    out_sims = np.full_like(sims, -np.inf)
+    out_ids[gq, rank] = best
+    out_sims[gq, rank] = score
+    return out_ids, out_sims
@@ -1,20 +1,46 @@
 import asyncio
+import fnmatch
+import os
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-import pickle
-from typing import Dict, List, Optional, TypedDict
+from typing import Dict, List, Optional, Tuple, TypedDict
 import json
 import uuid
+import weakref
 import faiss
 import numpy as np
 
 from jobs import broadcast
 from jobs.core import Job
-from config import CACHE_FOLDER, STORES_DIR
-from models.registry import get_model
+from config import CACHE_FOLDER, FEDERATED_SEARCH_THREADS, GRAPH_FLUSH_SECONDS, STORES_DIR
+from memory import BUDGET
+from result_cache import RESULTS
+from models.registry import get_encoder, loaded_models
+from metrics.core import (
+    HYDRATE_SECONDS, INDEX_WRITE_SECONDS, INGESTED_TEXTS, REGISTRY, SEARCH_SECONDS, embed, gauge,
+)
+from metrics.trace import span
+from . import ann
+from .chunking import AGGREGATIONS, ChunkParents, aggregate_chunks, embed_batches, split_texts
+from .dedup import CLUSTERS_FILE, DuplicateClusters, collapse, find_duplicates
+from .entries import EntryOffsets, read_rows
+from .graph import KNNGraph, top_k_neighbors
+from .topics import Topics, compute_topics
+from .view import StoreView, open_pinned
+
+
+ANN_EVAL_FILE = "ann_eval.json"
+# Largest candidate pool searched when collapsing near-duplicates
+COLLAPSE_MAX_FETCH = 4096
 
 
 def list_stores() -> List[str]:
-    return [p.name for p in STORES_DIR.iterdir() if p.is_dir()]
+    # Dot-dirs are in-progress imports / replaced stores
+    return [p.name for p in STORES_DIR.iterdir() if p.is_dir() and not p.name.startswith(".")]
 
 class MetaData(TypedDict):
     name: str
@@ -28,15 +54,118 @@ def l2norm(x: np.ndarray) -> np.ndarray:
     return x / n
 
 
+def interpolation_points(v_a: np.ndarray, v_b: np.ndarray, steps: int, method: str = "linear") -> np.ndarray:
+    """
+    Build all interior interpolation points for P pairs at once.
+    v_a, v_b: (P, d) unit vectors -> (P, steps, d) unit vectors, t = i / (steps + 1).
+    """
+    t = (np.arange(1, steps + 1, dtype=np.float32) / (steps + 1))[None, :, None]
+    if method == "slerp":
+        cos = np.clip(np.sum(v_a * v_b, axis=1), -1.0, 1.0)[:, None, None]
+        omega = np.arccos(cos)
+        sin = np.sin(omega)
+        # Nearly parallel endpoints: slerp degenerates to lerp
+        safe = sin > 1e-6
+        sin = np.where(safe, sin, 1.0)
+        w_a = np.where(safe, np.sin((1 - t) * omega) / sin, 1 - t)
+        w_b = np.where(safe, np.sin(t * omega) / sin, t)
+    elif method == "linear":
+        w_a, w_b = 1 - t, t
+    else:
+        raise ValueError(f"Unknown interpolation method: {method}")
+
+    points = w_a * v_a[:, None, :] + w_b * v_b[:, None, :]
+    P, T, d = points.shape
+    return l2norm(points.reshape(P * T, d)).reshape(P, T, d)
+
+
+def mmr(rel: np.ndarray, vecs: np.ndarray, valid: np.ndarray, k: int, lam: float = 0.5) -> np.ndarray:
+    """
+    Maximal marginal relevance over Q candidate pools at once.
+    rel: (Q, p) query similarities, vecs: (Q, p, d) unit vectors, valid: (Q, p) mask.
+    Greedily picks argmax(lam * rel - (1 - lam) * max sim to already picked);
+    returns (Q, k) positions into each pool, -1 where the pool ran out.
+    """
+    Q, p = rel.shape
+    sim = np.matmul(vecs, vecs.transpose(0, 2, 1))  # one (p, p) matrix per query (BLAS)
+    rows = np.arange(Q)
+    open_ = valid.copy()
+    closest = np.zeros((Q, p), dtype=np.float32)  # max similarity to the picked set
+    picks = np.full((Q, k), -1, dtype=np.int64)
+    for j in range(min(k, p)):
+        score = rel if j == 0 else lam * rel - (1 - lam) * closest
+        score = np.where(open_, score, -np.inf)
+        best = np.argmax(score, axis=1)
+        ok = open_[rows, best]
+        picks[ok, j] = best[ok]
+        open_[rows, best] = False
+        closest = np.maximum(closest, sim[rows, best]) if j else sim[rows, best]
+    return picks
+
+
+def _new_entry(text: str, i: int, ids: Optional[List] = None, metadata: Optional[List] = None) -> Dict:
+    # Caller-provided id / metadata of the i-th text of a batch, if any
+    entry = {"id": (ids[i] if ids else None) or str(uuid.uuid4()), "text": text}
+    if metadata and metadata[i]:
+        entry["metadata"] = metadata[i]
+    return entry
+
+
+def _read_index(path: Path, mmap: bool = True) -> Tuple[faiss.Index, bool]:
+    """
+    Read an index file. With `mmap`, its storage is mapped read-only where FAISS
+    supports it (IO_FLAG_MMAP_IFC): pages come from the page cache on demand.
+    Returns (index, mapped). A mapped index must never be mutated.
+    """
+    if mmap and hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        try:
+            return faiss.read_index(str(path), faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY), True
+        except RuntimeError:
+            pass  # index type without mmap support
+    return faiss.read_index(str(path)), False
+
+
 class Store:
+    """
+    One store directory. Stores are shared (see `get_store`) and load lazily:
+      - `index`: read-only view of index.faiss, memory-mapped where supported
+      - a private writable copy, created by the first write and kept for the next ones
+      - `graph`: the k-NN graph arrays
+    All three are tracked by the global memory budget and may be evicted when
+    idle; they are reloaded from disk on next use. Writes are serialized per store.
+
+    Readers work on a `view()`: one pinned generation of index + entries + derived
+    data. A write pins the current view when it starts and publishes the new
+    generation when it ends, so searches never wait on ingestion and never see
+    half of a write.
+    """
+
     def __init__(self, path: Path):
         self.path = path
         self.meta = self.load_meta()
         self.entries_path = self.path / "entries.jsonl"
+        self.offsets = EntryOffsets(self.entries_path)
         self.index_path = self.path / "index.faiss"
-        self.graph_path = self.path / "graph.faiss"
-        self.index: Optional[faiss.Index] = self._load_index()
-        # self.graph: Optional[faiss.Index] = self._load_graph()
+        self._ino = path.stat().st_ino  # a replaced directory (snapshot import) is a new store
+
+        self._lock = threading.RLock()  # lazy loads / evictions
+        self._write_lock = threading.RLock()  # one writer at a time: entries + index + graph
+        self._pins = 0  # writers in progress; writer copy and graph aren't evictable meanwhile
+        self._index: Optional[faiss.Index] = None
+        self._index_loaded = False
+        self._writer: Optional[faiss.Index] = None
+        self._graph: Optional[KNNGraph] = None  # may be ahead of disk during ingestion
+        self._graph_saved: Optional[KNNGraph] = None  # as last saved: what views serve
+        self._graph_dirty = False
+        self._graph_saved_at = time.monotonic()
+        self._graph_loaded = False
+        self._clusters: Optional[DuplicateClusters] = None  # memory-mapped, not budgeted
+        self._clusters_loaded = False
+        self._topics: Optional[Topics] = None  # small arrays + memory-mapped assignments
+        self._topics_loaded = False
+        self._parents: Optional[ChunkParents] = None  # memory-mapped; only for chunked stores
+        self._parents_loaded = False
+        self._view: Optional[StoreView] = None  # published generation (None = take it from disk)
 
 
     def load_meta(self) -> MetaData:
@@ -47,29 +176,322 @@ class Store:
             return json.load(f)
 
     @staticmethod
-    def create(name: str, root: Path, model_id: str):
+    def create(name: str, root: Path, model_id: str, chunking: Optional[Dict] = None):
+        """`chunking` = {"max_tokens", "overlap"}: long texts are stored as overlapping chunks."""
         store_path = root / name
         store_path.mkdir(parents=True, exist_ok=True)
         meta = {"name": name, "model": model_id, "dim": None}
+        if chunking:
+            meta["chunking"] = chunking
+            ChunkParents(np.zeros(0, dtype=np.int64)).save(store_path)
         with open(store_path / "meta.json", "w") as f:
             json.dump(meta, f, indent=2)
-        return Store(store_path)
+        return _open_store(store_path, fresh=True)
+
+    # -----------------------------
+    # Residency (lazy loads, memory budget)
+    # -----------------------------
+    def _key(self, role: str) -> str:
+        return f"{role}:{self.path.name}"
+
+    def _track(self, role: str, nbytes: int, mapped: bool = False):
+        ref = weakref.ref(self)
+
+        def evict() -> bool:
+            # Called by whichever thread went over budget, possibly holding another
+            # store's lock: never wait for ours (False = skipped, try another victim)
+            s = ref()
+            return s is None or s._unload(role, blocking=False)
+
+        def evictable() -> bool:
+            # The read view can always go (readers keep their own reference);
+            # the writer copy and graph only when no write is in progress.
+            # Unlocked hint only: _unload re-checks under the store lock.
+            s = ref()
+            return s is None or role == "index" or s._pins == 0
+
+        BUDGET.track(self._key(role), "graph" if role == "graph" else "index", self.path.name,
+                     nbytes, evict, mapped=mapped, evictable=evictable)
+
+    def _unload(self, role: str, blocking: bool = True) -> bool:
+        """Drop a loaded resource. Returns False if it was skipped (lock busy, or a write pinned it)."""
+        if not self._lock.acquire(blocking=blocking):
+            return False
+        try:
+            if role == "index":
+                self._index, self._index_loaded = None, False
+                if not self._pins:
+                    self._view = None  # readers holding it keep their reference
+            elif self._pins and not blocking:
+                return False  # a write started since the victim was picked
+            elif role == "writer":
+                self._writer = None
+            elif role == "graph":
+                # Unsaved rows are re-inserted from the index by the next sync
+                self._graph, self._graph_saved, self._graph_loaded = None, None, False
+                self._graph_dirty = False
+            return True
+        finally:
+            self._lock.release()
+
+    def release(self):
+        """Drop everything this store holds (store deleted / replaced on disk)."""
+        for role in ("index", "writer", "graph"):
+            BUDGET.forget(self._key(role))
+            self._unload(role)
+        with self._lock:
+            self._view = None
+
+    @contextmanager
+    def _writing(self):
+        """
+        Serialize writers; keeps the writer copy and graph resident meanwhile. Blocking.
+        Readers keep getting the view pinned on entry until the outermost write
+        ends; then the next `view()` takes the new generation from disk.
+        """
+        with self._write_lock:
+            # Pin and publish in one step: an eviction in between would drop the view
+            # and let a reader build one from half-written files
+            with self._lock:
+                self._pins += 1
+                try:
+                    if self._pins == 1:
+                        self.view()
+                except BaseException:
+                    self._pins -= 1
+                    raise
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self._pins -= 1
+                    pinned = None
+                    if not self._pins:
+                        pinned, self._view = self._view, None
+                if pinned is not None and pinned.generation != self.generation:
+                    # Results cached against the pinned view during the write
+                    RESULTS.invalidate(self.path.name)
+
+    def view(self) -> StoreView:
+        """The current published generation, pinned for as long as the caller holds it."""
+        with self._lock:
+            if self._view is None:
+                # Never mid-write: writers pin a view before touching any file
+                index = self.index
+                entries = open_pinned(self.entries_path)
+                self._view = StoreView(
+                    self.generation,
+                    index,
+                    open_pinned(self.index_path) if index is not None else None,
+                    entries,
+                    self.offsets.load() if entries is not None else np.empty(0, dtype="<u8"),
+                    self._published_graph(),
+                    self.clusters,
+                    self.topics,
+                    self.parents,
+                )
+            return self._view
+
+    @property
+    def published_generation(self) -> int:
+        """
+        Generation `view()` serves, without loading anything: the pinned view's
+        during a write (meta is bumped mid-write), else the one in meta.
+        """
+        with self._lock:
+            return self._view.generation if self._view is not None else self.generation
+
+    def residency(self) -> Dict:
+        """What this store holds in memory right now (never triggers a load)."""
+        owned = BUDGET.owned_by(self.path.name)
+        out = {}
+        for role in ("index", "writer", "graph"):
+            r = owned.get(role)
+            out[role] = {
+                "state": ("mapped" if r["mapped"] else "loaded") if r else "unloaded",
+                "bytes": r["bytes"] if r else 0,
+                "idle_seconds": r["idle_seconds"] if r else None,
+            }
+        out["model"] = {"id": self.meta["model"], "loaded": self.meta["model"] in loaded_models()}
+        out["resident_bytes"] = sum(r["bytes"] for r in owned.values() if not r["mapped"])
+        return out
 
     # -----------------------------
     # Index handling
     # -----------------------------
-    def _load_index(self) -> Optional[faiss.Index]:
+    def _load_index(self) -> Tuple[Optional[faiss.Index], bool]:
         if self.index_path.exists():
-            return faiss.read_index(str(self.index_path))
-        return None
+            index, mapped = _read_index(self.index_path, mmap=True)
+            # Tuned search-time params (nprobe / efSearch / rerank), see eval_ann
+            if self.meta.get("ann"):
+                ann.set_search_params(index, self.meta["ann"]["config"])
+            return index, mapped
+        return None, False
+
+    @property
+    def index(self) -> Optional[faiss.Index]:
+        """Read-only view of the index, loaded on first use. Never mutate it (see `_writable_index`)."""
+        loaded = None
+        with self._lock:
+            if not self._index_loaded:
+                self._index, mapped = self._load_index()
+                self._index_loaded = True
+                if self._index is not None:
+                    loaded = (self.index_path.stat().st_size, mapped)
+            index = self._index
+        # Budget bookkeeping (and any eviction it triggers) outside our lock
+        if loaded is not None:
+            self._track("index", loaded[0], mapped=loaded[1])
+        elif index is not None:
+            BUDGET.touch(self._key("index"))
+        return index
+
+    def _writable_index(self, dim: Optional[int] = None) -> Optional[faiss.Index]:
+        """
+        Owned, mutable copy of the index (created as IndexFlatIP(dim) if there is none yet).
+        Call inside `_writing()`; persist changes with `_save_index(index)`.
+        """
+        loaded = None
+        with self._lock:
+            if self._writer is None and self.index_path.exists():
+                self._writer, _ = _read_index(self.index_path, mmap=False)
+                loaded = self.index_path.stat().st_size
+            if self._writer is None and dim is not None:
+                self._writer = faiss.IndexFlatIP(dim)
+            index = self._writer
+        if loaded is not None:
+            self._track("writer", loaded)
+        if index is not None and dim is not None and index.d != dim:
+            raise ValueError(f"Index dim {index.d} != embedding dim {dim}")
+        BUDGET.touch(self._key("writer"))
+        return index
+
+    def _save_index(self, index: Optional[faiss.Index] = None):
+        """Persist the writer copy (new file + rename: mapped readers keep the old one)."""
+        index = index if index is not None else self._writer
+        if index is None:
+            return
+        tmp = self.index_path.with_suffix(".faiss.tmp")
+        with INDEX_WRITE_SECONDS.time():
+            faiss.write_index(index, str(tmp))
+            os.replace(tmp, self.index_path)
+        with self._lock:
+            self._writer = index
+            # Readers re-map the new file on next use
+            self._index, self._index_loaded = None, False
+        BUDGET.forget(self._key("index"))
+        self._track("writer", self.index_path.stat().st_size)
+        self._bump_generation()
+
+    def _drop_index(self):
+        self.index_path.unlink(missing_ok=True)
+        for role in ("index", "writer"):
+            BUDGET.forget(self._key(role))
+        with self._lock:
+            self._writer = None
+            self._index, self._index_loaded = None, True
+        self._bump_generation()
+
+    @property
+    def generation(self) -> int:
+        """
+        Bumped on every change that can alter query results (index, graph, clusters,
+        ANN params). Cached results are keyed by it; derived data (topics) records
+        the generation it saw.
+        """
+        return int(self.meta.get("generation", 0))
 
-    def _save_index(self):
-        if self.index is not None:
-            faiss.write_index(self.index, str(self.index_path))
+    def _bump_generation(self):
+        self.meta["generation"] = self.generation + 1
+        self._write_meta()
+        RESULTS.invalidate(self.path.name)
 
     @property
     def count(self) -> int:
-        return self.index.ntotal if self.index is not None else 0
+        with self._lock:
+            index = self._writer if self._writer is not None else self._index
+            if index is not None:
+                return int(index.ntotal)
+            if self._index_loaded or not self.index_path.exists():
+                return 0
+        # Not loaded: read the count from the file header
+        return _index_ntotal(self.index_path)
+
+    # -----------------------------
+    # k-NN graph residency
+    # -----------------------------
+    @property
+    def graph(self) -> Optional[KNNGraph]:
+        loaded = False
+        with self._lock:
+            if not self._graph_loaded:
+                self._graph = KNNGraph.load(self.path)
+                self._graph_saved = self._graph.snapshot() if self._graph is not None else None
+                self._graph_loaded = True
+                loaded = self._graph is not None
+            graph = self._graph
+        if loaded:
+            self._track("graph", graph.nbytes)
+        elif graph is not None:
+            BUDGET.touch(self._key("graph"))
+        return graph
+
+    def _published_graph(self) -> Optional[KNNGraph]:
+        with self._lock:
+            self.graph  # loads it
+            return self._graph_saved
+
+    @property
+    def clusters(self) -> Optional[DuplicateClusters]:
+        with self._lock:
+            if not self._clusters_loaded:
+                self._clusters = DuplicateClusters.load(self.path)
+                self._clusters_loaded = True
+            return self._clusters
+
+    def _set_clusters(self, clusters: Optional[DuplicateClusters]):
+        if clusters is None:
+            (self.path / CLUSTERS_FILE).unlink(missing_ok=True)
+            self.meta.pop("dedup", None)
+        else:
+            clusters.save(self.path)
+            self.meta["dedup"] = {**self.meta.get("dedup", {}), **clusters.meta()}
+        self._bump_generation()
+        with self._lock:
+            self._clusters, self._clusters_loaded = DuplicateClusters.load(self.path), True
+
+    @property
+    def topics(self) -> Optional[Topics]:
+        with self._lock:
+            if not self._topics_loaded:
+                self._topics = Topics.load(self.path, self.meta.get("topics"))
+                self._topics_loaded = True
+            return self._topics
+
+    def _set_topics(self, topics: Optional[Topics], arrays: bool = True):
+        if topics is None:
+            Topics.remove_files(self.path)
+            self.meta.pop("topics", None)
+        else:
+            if arrays:
+                topics.save(self.path)
+            self.meta["topics"] = {**topics.info, "k": topics.k, "watermark": topics.n}
+        self._write_meta()
+        with self._lock:
+            self._topics, self._topics_loaded = Topics.load(self.path, self.meta.get("topics")), True
+
+    @property
+    def parents(self) -> Optional[ChunkParents]:
+        with self._lock:
+            if not self._parents_loaded:
+                self._parents = ChunkParents.load(self.path)
+                self._parents_loaded = True
+            return self._parents
+
+    def _set_parents(self, parents: ChunkParents):
+        parents.save(self.path)
+        with self._lock:
+            self._parents, self._parents_loaded = ChunkParents.load(self.path), True
 
     # -----------------------------
     # Entries
@@ -77,7 +499,7 @@ class Store:
     def _get_all(self) -> List[Dict]:
         if not self.entries_path.exists():
             return []
-        with open(self.entries_path, "r", encoding="utf-8") as f:
+        with HYDRATE_SECONDS.time(op="get_all"), open(self.entries_path, "r", encoding="utf-8") as f:
             return [json.loads(line) for line in f if line.strip()]
 
     def _append_entries(self, entries: List[Dict]):
@@ -86,6 +508,109 @@ class Store:
             for entry in entries:
                 f.write(json.dumps(entry) + "\n")
 
+    def _count_entries(self) -> int:
+        # Count rows without parsing them
+        if not self.entries_path.exists():
+            return 0
+        with open(self.entries_path, "rb") as f:
+            return sum(1 for line in f if line.strip())
+
+    async def load_encoder(self):
+        # Shared encoder; the first load runs in a worker thread (blocking)
+        return await asyncio.to_thread(get_encoder, self.meta["model"], CACHE_FOLDER)
+
+    async def add_batch(
+        self,
+        model,
+        chunk: List[str],
+        graph_repair: Optional[int] = None,
+        ids: Optional[List[Optional[str]]] = None,
+        metadata: Optional[List[Optional[Dict]]] = None,
+    ) -> List[Dict]:
+        """
+        Embed and persist one batch: entries.jsonl and index.faiss; the k-NN graph
+        is extended in memory (callers `flush_graph` when done).
+        `ids` replace the generated uuids where given; `metadata` is stored with
+        each entry (and returned with its search hits).
+        In chunked stores, long texts become several chunk entries (see `_chunk_entries`).
+        When this returns, the batch is fully committed to disk.
+        """
+        if self.meta.get("chunking"):
+            entries_batch = await asyncio.to_thread(self._chunk_entries, model, chunk, ids, metadata)
+            embs = await asyncio.to_thread(embed_batches, model, [e["text"] for e in entries_batch], len(chunk))
+        else:
+            # 1) Compute embeddings (off-thread)
+            embs = await asyncio.to_thread(embed, model, chunk)
+
+            # 2) Create entries for THIS batch (ids + text)
+            entries_batch = [_new_entry(t, i, ids, metadata) for i, t in enumerate(chunk)]
+        embs = l2norm(embs.astype(np.float32))
+
+        # 3) Entries, index and graph under the store's write lock (off-thread)
+        await asyncio.to_thread(self._commit_batch, embs, entries_batch, graph_repair or len(chunk))
+
+        INGESTED_TEXTS.inc(len(chunk), store=self.path.name)
+
+        return entries_batch
+
+    def _chunk_entries(self, model, texts: List[str], ids: Optional[List] = None, metadata: Optional[List] = None) -> List[Dict]:
+        """
+        Entries for a batch of texts in a chunked store. Texts within the token
+        budget stay whole; longer ones become overlapping chunks, stored as
+        consecutive rows {"id": "<parent>#<i>", "text", "parent", "chunk": i}
+        (each carrying the parent's metadata).
+        """
+        cfg = self.meta["chunking"]
+        entries = []
+        for j, (text, chunks) in enumerate(zip(texts, split_texts(model, texts, cfg["max_tokens"], cfg["overlap"]))):
+            entry = _new_entry(text, j, ids, metadata)
+            if len(chunks) == 1:
+                entries.append(entry)
+            else:
+                parent = entry.pop("id")
+                entries.extend({**entry, "id": f"{parent}#{i}", "text": c, "parent": parent, "chunk": i} for i, c in enumerate(chunks))
+        return entries
+
+    def _commit_batch(self, embs: np.ndarray, entries: Optional[List[Dict]] = None, graph_repair: Optional[int] = None):
+        """
+        Append embedded rows: entries.jsonl (unless they are already there, see
+        reconcile_index), index.faiss and the in-memory k-NN graph. Blocking.
+        """
+        with self._writing():
+            # Ensure index is initialized / dims consistent (created on the first batch)
+            dim = int(embs.shape[1])
+            index = self._writable_index(dim)
+
+            # Set meta dim the first time
+            if not self.meta.get("dim"):
+                self.meta["dim"] = dim
+                self._write_meta()
+
+            if entries is not None:
+                self._append_entries(entries)
+
+            # Chunk -> parent labels for the new rows (entries already on disk when reconciling)
+            parents = self.parents
+            if parents is None and self.meta.get("chunking"):
+                parents = ChunkParents(np.zeros(0, dtype=np.int64))  # labels file lost: rebuilt below
+            if parents is not None:
+                start = int(index.ntotal)
+                if parents.n < start:
+                    # Labels lost to an interrupted write: rebuild them from the entries
+                    parents = parents.extend(parents.n, self._rows_list(parents.n, start))
+                rows = entries if entries is not None else self._rows_list(start, start + len(embs))
+                self._set_parents(parents.extend(start, rows))
+
+            # Add vectors to index & persist index file
+            index.add(embs)
+            self._save_index(index)
+
+            # Keep the k-NN graph (if any) in sync with the index; saved every GRAPH_FLUSH_SECONDS
+            if self.graph is not None:
+                self.sync_graph(graph_repair, index=index, save=False)
+                if time.monotonic() - self._graph_saved_at >= GRAPH_FLUSH_SECONDS:
+                    self.flush_graph()
+
     async def add_texts(self, texts: List[str], batch_size: int = 64, job: Job = None) -> List[Dict]:
         """
         Incrementally add texts:
@@ -101,14 +626,10 @@ class Store:
         if not texts:
             return []
 
-        model_id = self.meta["model"]
-        model = get_model(model_id)()
-        # Load encoder in a worker thread (blocking)
-        await asyncio.to_thread(model.load, CACHE_FOLDER)
+        model = await self.load_encoder()
 
         collect_results = job is None
-        if collect_results:
-            all_entries: List[Dict] = []
+        all_entries: List[Dict] = []
 
         total = len(texts)
         if job:
@@ -120,43 +641,13 @@ class Store:
 
         for i in range(0, total, batch_size):
             chunk = texts[i : i + batch_size]
+            entries_batch = await self.add_batch(model, chunk)
 
-            # 1) Compute embeddings (off-thread)
-            embs = await asyncio.to_thread(model.embed, chunk)
-            embs = l2norm(embs.astype(np.float32))
-
-            # 2) Create entries for THIS batch (ids + text)
-            entries_batch = [{"id": str(uuid.uuid4()), "text": t} for t in chunk]
-
-            # 3) Ensure index is initialized / dims consistent
-            dim = int(embs.shape[1])
-            if self.index is None:
-                # create index on first batch
-                self.index = faiss.IndexFlatIP(dim)
-            else:
-                if self.index.d != dim:
-                    raise ValueError(f"Index dim {self.index.d} != embedding dim {dim}")
-
-            # Set meta dim the first time
-            if not self.meta.get("dim"):
-                self.meta["dim"] = dim
-                # Persist meta change (off-thread)
-                await asyncio.to_thread(self._write_meta)
-
-            # 4) Append entries to file (off-thread)
-            await asyncio.to_thread(self._append_entries, entries_batch)
-
-            # 5) Add vectors to index & persist index file (off-thread)
-            await asyncio.to_thread(self.index.add, embs)
-            await asyncio.to_thread(faiss.write_index, self.index, str(self.index_path))
-
-            # 6) Track results if this is a small sync call
+            # Track results if this is a small sync call
             if collect_results:
-                if 'all_entries' not in locals():
-                    all_entries = []  # type: ignore
                 all_entries.extend(entries_batch)
 
-            # 7) Update job progress & broadcast
+            # Update job progress & broadcast
             if job:
                 job.processed += len(chunk)
                 # progress computed against this call's total
@@ -165,6 +656,7 @@ class Store:
                 job.log(f"Processed {job.processed}/{job.total}")
                 await broadcast(job)
 
+        await asyncio.to_thread(self.flush_graph)
         if job:
             job.progress = 100
             job.log("Ingestion complete.")
@@ -173,16 +665,18 @@ class Store:
         return all_entries if collect_results else []
 
     def _write_meta(self):
-        with open(self.path / "meta.json", "w", encoding="utf-8") as f:
+        # New file + rename: concurrent load_meta never sees a partial file
+        tmp = self.path / "meta.json.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
             json.dump(self.meta, f, indent=2)
+        os.replace(tmp, self.path / "meta.json")
 
     async def reconcile_index(self, batch_size: int = 64, job: Job = None):
         """
         Ensure the FAISS index and entries.jsonl are consistent.
         If entries tail exists beyond index.ntotal, (re-)embed and add only that tail.
         """
-        all_entries = self._get_all()
-        n_entries = len(all_entries)
+        n_entries = await asyncio.to_thread(self._count_entries)
         n_index = self.count
 
         if n_entries == n_index:
@@ -194,14 +688,13 @@ class Store:
                 "Manual repair required."
             )
 
-        # There are entries not yet in the index → index the tail
-        tail_texts = [e["text"] for e in all_entries[n_index:]]
+        # There are entries not yet in the index → index the tail (parse only those rows)
+        tail = await asyncio.to_thread(self.get_rows, range(n_index, n_entries))
+        tail_texts = [tail[r]["text"] for r in sorted(tail)]
         if not tail_texts:
             return
 
-        model_id = self.meta["model"]
-        model = get_model(model_id)()
-        await asyncio.to_thread(model.load, CACHE_FOLDER)
+        model = await self.load_encoder()
 
         if job:
             job.log(f"Reconciling index: adding missing {len(tail_texts)} entries.")
@@ -209,25 +702,14 @@ class Store:
 
         for i in range(0, len(tail_texts), batch_size):
             chunk = tail_texts[i : i + batch_size]
-            embs = await asyncio.to_thread(model.embed, chunk)
+            embs = await asyncio.to_thread(embed, model, chunk)
             embs = l2norm(embs.astype(np.float32))
-
-            dim = int(embs.shape[1])
-            if self.index is None:
-                self.index = faiss.IndexFlatIP(dim)
-                if not self.meta.get("dim"):
-                    self.meta["dim"] = dim
-                    await asyncio.to_thread(self._write_meta)
-            else:
-                if self.index.d != dim:
-                    raise ValueError(f"Index dim {self.index.d} != embedding dim {dim}")
-
-            await asyncio.to_thread(self.index.add, embs)
-            await asyncio.to_thread(faiss.write_index, self.index, str(self.index_path))
+            await asyncio.to_thread(self._commit_batch, embs, None, batch_size)
 
             if job:
                 job.log(f"Reconciled {min(n_index + i + len(chunk), n_entries)}/{n_entries}")
                 await broadcast(job)
+        await asyncio.to_thread(self.flush_graph)
 
     def add_text(self, text: str) -> Dict:
         # For small sync API usage; not used by the async worker path
@@ -238,79 +720,464 @@ class Store:
     def get_all(self) -> List[Dict]:
         return self._get_all()
 
-    def delete(self, entry_id: str) -> bool:
-        entries = self._get_all()
-        new_entries = [e for e in entries if e["id"] != entry_id]
-        if len(new_entries) == len(entries):
-            return False  # nothing deleted
-
-        model_id = self.meta["model"]
-        model = get_model(model_id)()
-        model.load(cache_dir=CACHE_FOLDER)
-        texts = [e["text"] for e in new_entries]
-
-        if texts:
-            embs = model.embed(texts).astype(np.float32)
-            embs = l2norm(embs)
-            self.index = faiss.IndexFlatIP(embs.shape[1])
-            self.index.add(embs)
-        else:
-            self.index = None
+    def _rows_list(self, start: int, stop: int) -> List[Dict]:
+        rows = self.get_rows(range(start, stop))
+        return [rows[r] for r in sorted(rows)]
 
-        self._save_index()
+    def get_rows(self, rows) -> Dict[int, Dict]:
+        """
+        Parse only the requested entry rows (seeks via the offset index).
+        Reads the latest entries.jsonl, including rows not indexed yet (recovery);
+        query paths hydrate through `view().get_rows` instead.
+        """
+        wanted = [int(r) for r in rows if r >= 0]
+        if not wanted or not self.entries_path.exists():
+            return {}
+        with HYDRATE_SECONDS.time(op="get_rows"):
+            return read_rows(self.entries_path, self.offsets.load(), wanted)
+
+    def page_entries(
+        self,
+        cursor: int = 0,
+        limit: int = 100,
+        q: Optional[str] = None,
+        prefix: Optional[str] = None,
+        ignore_case: bool = True,
+        max_scan: Optional[int] = None,
+    ) -> Tuple[List[Dict], Optional[int], int]:
+        """
+        One page of entries starting at row `cursor`, optionally filtered.
+        A filtered page may come back short when `max_scan` rows were examined
+        without filling it; keep following `next_cursor` (None = end).
+        Returns (entries with their row, next_cursor, total rows).
+        """
+        view = self.view()
+        total = view.n
+        items: List[Dict] = []
+        next_cursor = None
+        scanned = 0
+        with HYDRATE_SECONDS.time(op="page"):
+            for row, entry in view.scan(cursor, q, prefix, ignore_case):
+                scanned += 1
+                if entry is not None:
+                    items.append({"row": row, **entry})
+                if len(items) >= limit or (max_scan is not None and scanned >= max_scan):
+                    next_cursor = row + 1 if row + 1 < total else None
+                    break
+        return items, next_cursor, total
+
+    def iter_entries(
+        self,
+        cursor: int = 0,
+        limit: Optional[int] = None,
+        q: Optional[str] = None,
+        prefix: Optional[str] = None,
+        ignore_case: bool = True,
+    ):
+        """Lazily yield {"row", **entry} from row `cursor` on (constant memory)."""
+        sent = 0
+        for row, entry in self.view().scan(cursor, q, prefix, ignore_case):
+            if entry is None:
+                continue
+            yield {"row": row, **entry}
+            sent += 1
+            if limit is not None and sent >= limit:
+                return
 
-        with open(self.entries_path, "w", encoding="utf-8") as f:
-            for e in new_entries:
-                f.write(json.dumps(e) + "\n")
+    def delete(self, entry_id: str) -> bool:
+        with self._writing():
+            entries = self._get_all()
+            # A parent id deletes all of its chunks
+            doomed = [e["id"] == entry_id or e.get("parent") == entry_id for e in entries]
+            new_entries = [e for e, d in zip(entries, doomed) if not d]
+            if len(new_entries) == len(entries):
+                return False  # nothing deleted
+            rows = [i for i, d in enumerate(doomed) if d]
+
+            model = get_encoder(self.meta["model"], CACHE_FOLDER)
+            texts = [e["text"] for e in new_entries]
+
+            if texts:
+                embs = embed(model, texts).astype(np.float32)
+                embs = l2norm(embs)
+                index = faiss.IndexFlatIP(embs.shape[1])
+                index.add(embs)
+                self._save_index(index)
+            else:
+                self._drop_index()
+
+            # New file + rename: pinned views keep reading the old rows
+            tmp = self.entries_path.with_suffix(".jsonl.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                for e in new_entries:
+                    f.write(json.dumps(e) + "\n")
+            os.replace(tmp, self.entries_path)
+            EntryOffsets.invalidate(self.entries_path)
+
+            # Tombstone edges to the deleted rows; they get repaired on the next sync
+            graph = self.graph
+            if graph is not None:
+                for row in reversed(rows):
+                    if row < graph.n:
+                        graph.remove(row)
+                self._save_graph()
+
+            clusters = self.clusters
+            if clusters is not None:
+                self._set_clusters(clusters.remove_rows(rows) if new_entries else None)
+
+            parents = self.parents
+            if parents is not None:
+                self._set_parents(parents.remove_rows(rows))
+
+            # Private copy: the loaded Topics may be pinned by readers
+            topics = Topics.load(self.path, self.meta.get("topics"))
+            if topics is not None:
+                if new_entries:
+                    topics.remove_rows(rows)
+                    topics.info["generation"] = self.generation
+                self._set_topics(topics if new_entries else None)
 
         return True
 
-    def search(self, query: str, k: int = 5) -> List[Dict]:
-        if self.index is None or self.count == 0:
-            return []
-        model_id = self.meta["model"]
-        model = get_model(model_id)()
-        model.load(cache_dir=CACHE_FOLDER)
-        q_emb = model.embed([query]).astype(np.float32)
-        q_emb = l2norm(q_emb)
-        sims, ids = self.index.search(q_emb, min(k, self.count))
-        entries = self._get_all()
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        mmr_lambda: Optional[float] = None,
+        mmr_pool: Optional[int] = None,
+        collapse_duplicates: bool = False,
+        aggregate: str = "max",
+    ) -> List[Dict]:
+        return self.search_batch([query], k, mmr_lambda, mmr_pool, collapse_duplicates, aggregate)[0]
+
+    def search_batch(
+        self,
+        queries: List[str],
+        k: int = 5,
+        mmr_lambda: Optional[float] = None,
+        mmr_pool: Optional[int] = None,
+        collapse_duplicates: bool = False,
+        aggregate: str = "max",
+    ) -> List[List[Dict]]:
+        """
+        Top-k entries per query: one encode, one FAISS call, one hydration pass.
+        With `mmr_lambda`, the top `mmr_pool` hits (default 4k) are reranked for
+        diversity (1.0 = pure relevance, lower = fewer near-duplicates) using the
+        stored vectors; scores stay the query similarities.
+        With `collapse_duplicates` (and clusters from `find_duplicates`), only the
+        best hit per near-duplicate cluster is kept; results then carry their
+        "cluster" id and how many pool hits they "collapsed".
+        In chunked stores, chunk hits are folded into one hit per parent entry,
+        scored by the "max" or "sum" of its chunks (`aggregate`; "none" = raw
+        chunks). The hit shows the best chunk and carries its "parent" id.
+        """
+        index = self.index
+        if index is None or index.ntotal == 0 or not queries:
+            return [[] for _ in queries]
+        return self.search_vectors(self.encode_queries(queries), k, mmr_lambda, mmr_pool, collapse_duplicates, aggregate)
+
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        model = get_encoder(self.meta["model"], CACHE_FOLDER)
+        return l2norm(embed(model, queries).astype(np.float32))
+
+    def search_vectors(
+        self,
+        q_emb: np.ndarray,
+        k: int = 5,
+        mmr_lambda: Optional[float] = None,
+        mmr_pool: Optional[int] = None,
+        collapse_duplicates: bool = False,
+        aggregate: str = "max",
+    ) -> List[List[Dict]]:
+        """`search_batch` for already encoded (unit) query vectors."""
+        view = self.view()
+        index = view.index
+        if index is None or index.ntotal == 0:
+            return [[] for _ in q_emb]
+        if index.d != q_emb.shape[1]:
+            raise ValueError(f"Query dim {q_emb.shape[1]} != index dim {index.d}")
+
+        if aggregate not in AGGREGATIONS and aggregate != "none":
+            raise ValueError(f"Unknown aggregation: {aggregate}")
+        diverse = mmr_lambda is not None
+        clusters = view.clusters if collapse_duplicates else None
+        parents = view.parents if aggregate != "none" else None
+        grouped = clusters is not None or parents is not None
+        fetch = min(max(mmr_pool or 4 * k, k) if diverse or grouped else k, index.ntotal)
+        counts = None
+        while True:
+            with SEARCH_SECONDS.time(op="search"):
+                sims, ids = index.search(q_emb, fetch)
+            if not grouped:
+                break
+            with span("rerank"):
+                if parents is not None:
+                    ids, sims = aggregate_chunks(ids, sims, parents.label(ids), aggregate)
+                if clusters is not None:
+                    ids, sims, counts = collapse(ids, sims, clusters.label(ids))
+            # Long documents / big clusters can swallow the whole pool: widen it until k groups per query
+            if fetch >= min(index.ntotal, COLLAPSE_MAX_FETCH) or ((ids >= 0).sum(axis=1) >= k).all():
+                if clusters is not None:
+                    labels = clusters.label(ids)
+                break
+            fetch = min(fetch * 4, index.ntotal, COLLAPSE_MAX_FETCH)
+
+        if diverse:
+            with span("rerank"):
+                valid = ids >= 0
+                uniq, inverse = np.unique(ids[valid], return_inverse=True)
+                vecs = np.zeros(ids.shape + (index.d,), dtype=np.float32)
+                vecs[valid] = index.reconstruct_batch(uniq)[inverse]
+                picks = mmr(sims, vecs, valid, min(k, fetch), mmr_lambda)
+                safe = np.maximum(picks, 0)
+                ids = np.where(picks >= 0, np.take_along_axis(ids, safe, axis=1), -1)
+                sims = np.take_along_axis(sims, safe, axis=1)
+                if counts is not None:
+                    counts = np.take_along_axis(counts, safe, axis=1)
+                    labels = np.take_along_axis(labels, safe, axis=1)
+        else:
+            ids, sims = ids[:, :k], sims[:, :k]
+            if counts is not None:
+                counts, labels = counts[:, :k], labels[:, :k]
+
+        rows = view.get_rows({int(i) for i in ids.ravel() if i >= 0})
+        results = []
+        for q, (id_row, sim_row) in enumerate(zip(ids, sims)):
+            hits = []
+            for j, (idx, sim) in enumerate(zip(id_row, sim_row)):
+                if int(idx) not in rows:
+                    continue
+                entry = rows[int(idx)]
+                hit = {"id": entry["id"], "text": entry["text"], "score": float(sim)}
+                if "metadata" in entry:
+                    hit["metadata"] = entry["metadata"]
+                if "parent" in entry:
+                    hit["parent"], hit["chunk"] = entry["parent"], entry["chunk"]
+                if counts is not None:
+                    hit["cluster"] = int(labels[q, j])
+                    hit["collapsed"] = int(counts[q, j])
+                hits.append(hit)
+            results.append(hits)
+        return results
+
+    def interpolate(
+        self,
+        pairs: List[Tuple[str, str]],
+        steps: int = 5,
+        k: int = 1,
+        method: str = "linear",
+        dedup: bool = False,
+    ) -> List[List[Dict]]:
+        """
+        Nearest entries along the path between each (a, b) sentence pair.
+        All endpoints are encoded in one batch, all steps of all pairs are searched
+        in a single FAISS call and entries are hydrated once.
+        With `dedup`, an entry appears at most once along each path.
+        Returns, per pair, a list of {"step", "results"}.
+        """
+        view = self.view()
+        index = view.index
+        if index is None or index.ntotal == 0 or not pairs:
+            return [[{"step": i, "results": []} for i in range(1, steps + 1)] for _ in pairs]
+
+        model = get_encoder(self.meta["model"], CACHE_FOLDER)
+
+        # 1) Encode every distinct endpoint once
+        texts = list(dict.fromkeys(t for pair in pairs for t in pair))
+        embs = l2norm(embed(model, texts).astype(np.float32))
+        pos = {t: i for i, t in enumerate(texts)}
+        v_a = embs[[pos[a] for a, _ in pairs]]
+        v_b = embs[[pos[b] for _, b in pairs]]
+
+        # 2) All interpolation points as one (P * steps, d) matrix -> one search
+        points = interpolation_points(v_a, v_b, steps, method)
+        P = len(pairs)
+        fetch = min(k * steps if dedup else k, index.ntotal)
+        with SEARCH_SECONDS.time(op="interpolate"):
+            sims, ids = index.search(points.reshape(P * steps, -1), fetch)
+        sims = sims.reshape(P, steps, fetch)
+        ids = ids.reshape(P, steps, fetch)
+
+        # 3) Pick results per step (skipping entries already used on this path)
+        picked = []
+        for p in range(P):
+            used = set()
+            path = []
+            for t in range(steps):
+                step = []
+                for idx, sim in zip(ids[p, t], sims[p, t]):
+                    idx = int(idx)
+                    if idx < 0 or (dedup and idx in used):
+                        continue
+                    step.append((idx, float(sim)))
+                    used.add(idx)
+                    if len(step) >= k:
+                        break
+                path.append(step)
+            picked.append(path)
+
+        # 4) Hydrate every referenced row in one pass
+        rows = view.get_rows({idx for path in picked for step in path for idx, _ in step})
         return [
-            {"id": entries[int(idx)]["id"], "text": entries[int(idx)]["text"], "score": float(sim)}
-            for idx, sim in zip(ids[0], sims[0])
+            [
+                {
+                    "step": t + 1,
+                    "results": [
+                        {"id": rows[idx]["id"], "text": rows[idx]["text"], "score": sim}
+                        for idx, sim in step
+                    ],
+                }
+                for t, step in enumerate(path)
+            ]
+            for path in picked
         ]
 
+    def eval_ann(
+        self,
+        k: int = 10,
+        n_queries: int = 200,
+        query_texts: Optional[List[str]] = None,
+        configs: Optional[List[Dict]] = None,
+        target_recall: float = 0.95,
+        write: bool = False,
+        progress=None,
+    ) -> Dict:
+        """
+        Recall@k vs latency of candidate ANN configs over this store's vectors.
+        Queries are `query_texts` (encoded with the store model) or a sample of
+        stored vectors. The report is saved as ann_eval.json; with `write`, the
+        fastest config meeting `target_recall` goes to meta.json["ann"].
+        Blocking; call off-thread from async code.
+        """
+        index = self.index
+        if index is None or index.ntotal == 0:
+            raise RuntimeError("No embeddings indexed yet")
+        n = int(index.ntotal)
+        xb = index.reconstruct_n(0, n)
+
+        if query_texts:
+            model = get_encoder(self.meta["model"], CACHE_FOLDER)
+            xq = l2norm(embed(model, query_texts).astype(np.float32))
+            source = "texts"
+        else:
+            rows = np.random.default_rng(0).choice(n, min(n_queries, n), replace=False)
+            xq = xb[np.sort(rows)]
+            source = "entries"
+
+        rows = ann.evaluate(xb, xq, k=k, configs=configs, progress=progress)
+        best = ann.best_config(rows, target_recall)
+        report = {
+            "k": k,
+            "vectors": n,
+            "queries": len(xq),
+            "query_source": source,
+            "target_recall": target_recall,
+            "best": best,
+            "results": rows,
+        }
+        with open(self.path / ANN_EVAL_FILE, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+        if write and best is not None:
+            # Re-read meta: an ingest may have updated it while we were evaluating
+            with self._writing():
+                self.meta = self.load_meta()
+                self.meta["ann"] = ann.recommendation(best, k, target_recall, n, len(xq))
+                self._bump_generation()
+                # Re-map with the new params; pinned views keep their index as it was
+                with self._lock:
+                    self._index, self._index_loaded = None, False
+                BUDGET.forget(self._key("index"))
+        return report
+
     def delete_all(self):
         import shutil
-        shutil.rmtree(self.path)
+        with self._writing():
+            shutil.rmtree(self.path)
+        _forget_store(self.path)
 
     # -----------------------------
     # k-NN Graph
     # -----------------------------
-    def _load_graph(self) -> Optional[faiss.Index]:
-        if self.graph_path.exists():
-            return faiss.read_index(str(self.graph_path))
-        return None
+    def _save_graph(self):
+        graph = self.graph
+        graph.save(self.path)
+        with self._lock:
+            self._graph_saved, self._graph_dirty = graph.snapshot(), False
+            self._graph_saved_at = time.monotonic()
+        self.meta["graph"] = graph.meta()
+        self._bump_generation()
+        self._track("graph", graph.nbytes)
+
+    def flush_graph(self) -> bool:
+        """
+        Save the graph if ingestion extended it in memory only (see `_commit_batch`):
+        publishes it to readers and advances meta's watermark. Blocking.
+        """
+        with self._writing():
+            if not self._graph_dirty or self._graph is None:
+                return False
+            self._save_graph()
+            return True
+
+    def _set_graph(self, graph: KNNGraph):
+        with self._writing():
+            with self._lock:
+                self._graph, self._graph_loaded = graph, True
+            self._save_graph()
+
+    @property
+    def graph_outdated(self) -> bool:
+        """
+        No graph yet, or rows / tombstoned edges it hasn't caught up on.
+        From meta and the index header only: loads nothing.
+        """
+        info = self.meta.get("graph")
+        return info is None or info["watermark"] < self.count or info.get("tombstoned_rows", 0) > 0
 
-    async def build_graph(self, k: int = 10, efConstruction: int = 200, M: int = 32, job: Job = None):
+    def sync_graph(self, repair_limit: Optional[int] = None, index: Optional[faiss.Index] = None, save: bool = True) -> Dict:
+        """
+        Bring the k-NN graph up to date with the index:
+          - insert rows past the watermark (neighbors + reverse edges)
+          - lazily repair up to `repair_limit` rows with tombstoned edges
+        Without `save`, changes stay in memory until `flush_graph`.
+        Blocking; call off-thread from async code.
+        """
+        with self._writing():
+            graph = self.graph
+            index = index if index is not None else self.index
+            if graph is None or index is None:
+                return {"added": 0, "repaired": 0}
+            added = graph.extend(index)
+            repaired = graph.repair(index, max_rows=repair_limit)
+            if added or repaired:
+                self._graph_dirty = True
+            if save and self._graph_dirty:
+                self._save_graph()
+        return {"added": added, "repaired": repaired}
+
+    async def build_graph(self, k: int = 10, efConstruction: int = 200, M: int = 32, job: Job = None) -> KNNGraph:
         """
         Build approximate k-NN graph from embeddings using HNSW.
+        Later ingests extend it incrementally (see `sync_graph`).
         """
-        if self.index is None or self.count == 0:
+        index = self.index
+        if index is None or index.ntotal == 0:
             raise RuntimeError("No embeddings indexed yet")
 
-        dim = self.index.d
-        n = self.count
+        dim = index.d
+        n = int(index.ntotal)
 
         # Initialize HNSW index
         print("Initialize HNSW index")
-        hnsw = faiss.IndexHNSWFlat(dim, M)
+        hnsw = faiss.IndexHNSWFlat(dim, M, faiss.METRIC_INNER_PRODUCT)
         hnsw.hnsw.efConstruction = efConstruction
+        hnsw.hnsw.efSearch = max(hnsw.hnsw.efSearch, 2 * k)
 
         # Export vectors from store's FAISS index
         print("Export vectors from FAISS index")
-        xb = np.empty((n, dim), dtype=np.float32)
-        self.index.reconstruct_n(0, n, xb)
+        xb = await asyncio.to_thread(index.reconstruct_n, 0, n)
 
         if job:
             job.total = n
@@ -318,64 +1185,261 @@ class Store:
             job.log(f"Building k-NN graph with N={n}, M={M}, efC={efConstruction}")
             await broadcast(job)
 
-        # Add vectors in chunks so we can track progress
+        # Add vectors in chunks so we can track progress (off the event loop)
         print("Adding vectors")
-        batch_size = 4
+        batch_size = 1024
         for i in range(0, n, batch_size):
             chunk = xb[i : i + batch_size]
-            hnsw.add(chunk)
+            await asyncio.to_thread(hnsw.add, chunk)
             if job:
                 job.processed = min(i + len(chunk), n)
                 job.progress = int(job.processed / job.total * 100)
                 job.log(f"Inserted {job.processed}/{n} vectors into graph")
                 await broadcast(job)
 
-        print("Write index")
-        faiss.write_index(hnsw, str(self.graph_path))
-        self.graph = hnsw
+        # Query k neighbors (+ self) for every node
+        print("Linking neighbors")
+        ids = np.empty((n, k), dtype=np.int64)
+        sims = np.empty((n, k), dtype=np.float32)
+        for i in range(0, n, 1024):
+            chunk = xb[i : i + 1024]
+            D, I = await asyncio.to_thread(hnsw.search, chunk, min(k + 1, n))
+            rows = np.arange(i, i + len(chunk), dtype=np.int64)
+            ids[i : i + len(chunk)], sims[i : i + len(chunk)] = top_k_neighbors(D, I, rows, k)
+
+        print("Write graph")
+        graph = KNNGraph(ids, sims)
+        await asyncio.to_thread(self._set_graph, graph)
 
         if job:
             job.progress = 100
             job.log("Graph build complete")
             job.status = "done"
             await broadcast(job)
-        """
-        Build a k-NN graph over all current embeddings and save it to disk.
-        Uses FAISS HNSW index.
-        """
-        if self.index is None or self.count == 0:
-            raise RuntimeError("No embeddings indexed yet, cannot build graph.")
-
-        # load embeddings again (we don’t store them in index)
-        entries = self._get_all()
-        texts = [e["text"] for e in entries]
-
-        model_id = self.meta["model"]
-        model = get_model(model_id)()
-        await asyncio.to_thread(model.load, CACHE_FOLDER)
-        embs = await asyncio.to_thread(model.embed, texts)
-        embs = l2norm(embs.astype(np.float32))
-
-        N, d = embs.shape
-        index = faiss.IndexHNSWFlat(d, 32)
-        index.hnsw.efConstruction = 200
-        index.add(embs)
 
-        D, I = index.search(embs, k + 1)  # include self
+        return graph
 
-        graph = {}
-        for i in range(N):
-            graph[i] = [(int(j), float(dist)) for dist, j in zip(D[i][1:], I[i][1:])]
+    # -----------------------------
+    # Near-duplicate clusters
+    # -----------------------------
+    def find_duplicates(
+        self,
+        threshold: float = 0.95,
+        k: int = 32,
+        block_size: int = 4096,
+        progress=None,
+    ) -> Dict:
+        """
+        Cluster near-duplicate entries (similarity >= threshold) over all stored
+        vectors and persist the per-row cluster ids (clusters.npy, stats in
+        meta.json["dedup"]). Reuses the k-NN graph's edges when it has >= k per row.
+        Rows added meanwhile are picked up by the next run.
+        Blocking; call off-thread from async code.
+        """
+        index = self.index
+        if index is None or index.ntotal == 0:
+            raise RuntimeError("No embeddings indexed yet")
+        clusters = find_duplicates(
+            index, threshold=threshold, k=k, block_size=block_size, graph=self.graph, progress=progress,
+        )
+        with self._writing():
+            if self.count < clusters.n:
+                raise RuntimeError("Entries were deleted while clustering; run it again")
+            self.meta["dedup"] = {"threshold": threshold, "k": k}
+            self._set_clusters(clusters)
+        return self.meta["dedup"]
 
-        with open(self.graph_path, "wb") as f:
-            pickle.dump(graph, f)
 
-        self._graph = graph
-        return graph
+    # -----------------------------
+    # Topics
+    # -----------------------------
+    def compute_topics(
+        self,
+        k: int = 50,
+        niter: int = 20,
+        sample: int = 2000,
+        representatives: int = 5,
+        progress=None,
+    ) -> Topics:
+        """
+        K-means topics + 2D layout over all stored vectors (see topics.compute_topics),
+        saved next to the index and tagged with the current store generation.
+        Blocking; call off-thread from async code.
+        """
+        index, generation = self.index, self.generation
+        if index is None or index.ntotal == 0:
+            raise RuntimeError("No embeddings indexed yet")
+        topics = compute_topics(
+            index, k=k, niter=niter, sample=sample, representatives=representatives,
+            generation=generation, progress=progress,
+        )
+        with self._writing():
+            if self.count < topics.n:
+                raise RuntimeError("Entries were deleted while computing topics; run it again")
+            self._set_topics(topics)
+        # Rows ingested meanwhile
+        return self.sync_topics()
+
+    def sync_topics(self) -> Optional[Topics]:
+        """Topics up to date with the store: rows added since are assigned to the existing centroids."""
+        topics = self.topics
+        if topics is None or topics.generation == self.generation:
+            return topics
+        with self._writing():
+            # Private copy: the loaded Topics may be pinned by readers
+            topics = Topics.load(self.path, self.meta.get("topics"))
+            if topics is not None and topics.generation != self.generation:
+                added = topics.extend(self.index, self.generation)
+                # Nothing new (e.g. only the graph changed): just record the generation
+                self._set_topics(topics, arrays=bool(added))
+                if added:
+                    print(f"[topics] {self.path.name}: assigned {added} new rows to {topics.k} topics")
+            return self.topics
+
+
+# -----------------------------
+# Open stores (one shared Store per directory)
+# -----------------------------
+_STORES: Dict[Path, Store] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def _open_store(path: Path, fresh: bool = False) -> Store:
+    key = path.resolve()
+    ino = path.stat().st_ino
+    with _STORES_LOCK:
+        s = _STORES.get(key)
+        if s is not None and s._ino == ino and not fresh:
+            return s
+        if s is not None:
+            s.release()
+        s = _STORES[key] = Store(path)
+        return s
+
+
+def _forget_store(path: Path):
+    with _STORES_LOCK:
+        s = _STORES.pop(path.resolve(), None)
+    if s is not None:
+        s.release()
+
+
+def resolve_stores(names: List[str]) -> List[str]:
+    """Store names from a list of names and/or glob patterns ("tweets-2024-*"), deduplicated, in order."""
+    available = sorted(list_stores())
+    out: List[str] = []
+    for name in names:
+        matches = fnmatch.filter(available, name) if any(ch in name for ch in "*?[") else [name]
+        if not matches:
+            raise FileNotFoundError(f"No store matches {name!r}")
+        out.extend(m for m in matches if m not in out)
+    return out
+
+
+def federated_search(
+    stores: List[Store],
+    queries: List[str],
+    k: int = 5,
+    mmr_lambda: Optional[float] = None,
+    mmr_pool: Optional[int] = None,
+    collapse_duplicates: bool = False,
+    aggregate: str = "max",
+) -> List[List[Dict]]:
+    """
+    One query batch over several stores sharing a model: encoded once, each store
+    searched in the shared thread pool (FAISS releases the GIL), then merged into
+    a global top-k per query. Hits carry the "store" they came from.
+    Diversity / collapsing / chunk aggregation apply per store, before the merge.
+    """
+    models = {s.meta["model"] for s in stores}
+    if len(models) > 1:
+        raise ValueError(f"Stores use different models: {sorted(models)}")
+    dims = {s.meta.get("dim") for s in stores if s.meta.get("dim")}
+    if len(dims) > 1:
+        raise ValueError(f"Stores have different dimensions: {sorted(dims)}")
+    if not stores or not queries:
+        return [[] for _ in queries]
+
+    q_emb = stores[0].encode_queries(queries)
+    per_store = list(_search_pool().map(
+        lambda s: s.search_vectors(q_emb, k, mmr_lambda, mmr_pool, collapse_duplicates, aggregate), stores
+    ))
+
+    merged = []
+    for q in range(len(queries)):
+        hits = [{**hit, "store": s.path.name} for s, results in zip(stores, per_store) for hit in results[q]]
+        hits.sort(key=lambda h: h["score"], reverse=True)
+        merged.append(hits[:k])
+    return merged
+
+
+_SEARCH_POOL: Optional[ThreadPoolExecutor] = None
+
+def _search_pool() -> ThreadPoolExecutor:
+    global _SEARCH_POOL
+    with _STORES_LOCK:
+        if _SEARCH_POOL is None:
+            _SEARCH_POOL = ThreadPoolExecutor(max_workers=FEDERATED_SEARCH_THREADS, thread_name_prefix="search")
+        return _SEARCH_POOL
 
 
 def get_store(name: str):
     store_path = STORES_DIR / name
     if not store_path.exists() or not store_path.is_dir():
         raise FileNotFoundError(f"Store not found: {name}")
-    return Store(store_path)
+    return _open_store(store_path)
+
+
+def open_stores() -> List[Store]:
+    with _STORES_LOCK:
+        return list(_STORES.values())
+
+
+# -----------------------------
+# Per-store gauges (computed at scrape time)
+# -----------------------------
+STORE_VECTORS = gauge("threadsearch_store_vectors", "Vectors in the store index", ["store"])
+STORE_INDEX_BYTES = gauge("threadsearch_store_index_bytes", "Size of index.faiss on disk", ["store"])
+STORE_GRAPH_BYTES = gauge("threadsearch_store_graph_bytes", "Size of the k-NN graph arrays on disk", ["store"])
+STORE_RAM_BYTES = gauge("threadsearch_store_ram_bytes", "Index + graph bytes resident for the store (memory-mapped excluded)", ["store"])
+
+_NTOTAL_CACHE: Dict[Path, Tuple[float, int, int]] = {}
+
+
+def _index_ntotal(path: Path) -> int:
+    """Vector count from index.faiss, cached on (mtime, size) so scrapes stay cheap."""
+    st = path.stat()
+    cached = _NTOTAL_CACHE.get(path)
+    if cached and cached[:2] == (st.st_mtime, st.st_size):
+        return cached[2]
+    # Every index type we write starts with: fourcc, d (int32), ntotal (int64)
+    with open(path, "rb") as f:
+        head = f.read(16)
+    if len(head) == 16 and head[:4].isalnum():
+        ntotal = struct.unpack("<q", head[8:16])[0]
+    else:
+        index, _ = _read_index(path, mmap=True)
+        ntotal = int(index.ntotal)
+    _NTOTAL_CACHE[path] = (st.st_mtime, st.st_size, ntotal)
+    return ntotal
+
+
+def _collect_store_metrics():
+    ram: Dict[str, int] = {}
+    for s in open_stores():
+        ram[s.path.name] = s.residency()["resident_bytes"]
+    for name in list_stores():
+        path = STORES_DIR / name
+        index_path = path / "index.faiss"
+        if index_path.exists():
+            STORE_INDEX_BYTES.set(index_path.stat().st_size, store=name)
+            STORE_VECTORS.set(_index_ntotal(index_path), store=name)
+        else:
+            STORE_INDEX_BYTES.set(0, store=name)
+            STORE_VECTORS.set(0, store=name)
+        graph_bytes = sum(p.stat().st_size for p in path.glob("graph_*.npy"))
+        STORE_GRAPH_BYTES.set(graph_bytes, store=name)
+        STORE_RAM_BYTES.set(ram.get(name, 0), store=name)
+
+
+REGISTRY.register_collector(_collect_store_metrics)
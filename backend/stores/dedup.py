@@ -0,0 +1,203 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+import faiss
+import numpy as np
+
+from metrics.core import SEARCH_SECONDS
+
+from .graph import _save_array
+
+if TYPE_CHECKING:
+    from .graph import KNNGraph
+
+CLUSTERS_FILE = "clusters.npy"
+
+
+# -----------------------------
+# Union-find over row ids (vectorized)
+# -----------------------------
+class UnionFind:
+    """
+    Disjoint sets over rows 0..n-1 as a single parent array.
+    Unions are applied a whole batch of pairs at a time; roots are always the
+    smallest row of their set, so a cluster id is its first (oldest) entry.
+    """
+
+    def __init__(self, n: int):
+        self.parent = np.arange(n, dtype=np.int64)
+
+    def find(self, x: np.ndarray) -> np.ndarray:
+        r = self.parent[x]
+        while True:
+            up = self.parent[r]
+            if np.array_equal(up, r):
+                return r
+            r = up
+
+    def union(self, a: np.ndarray, b: np.ndarray):
+        while len(a):
+            ra, rb = self.find(a), self.find(b)
+            split = ra != rb
+            if not split.any():
+                break
+            lo, hi = np.minimum(ra[split], rb[split]), np.maximum(ra[split], rb[split])
+            # Several pairs may hook the same root: keep the smallest target, retry the rest
+            np.minimum.at(self.parent, hi, lo)
+            a, b = lo, hi
+        self.compress()
+
+    def compress(self):
+        while True:
+            up = self.parent[self.parent]
+            if np.array_equal(up, self.parent):
+                return
+            self.parent = up
+
+
+def relabel_after_delete(labels: np.ndarray, rows: List[int]) -> np.ndarray:
+    """
+    Group labels (each row labelled with the smallest row of its group) after
+    deleting `rows`: later rows shift down and every group is relabelled with
+    its new smallest row.
+    """
+    keep = np.delete(np.asarray(labels), [r for r in rows if r < len(labels)])
+    if len(keep):
+        _, group = np.unique(keep, return_inverse=True)
+        first = np.full(group.max() + 1, len(keep), dtype=np.int64)
+        np.minimum.at(first, group, np.arange(len(keep), dtype=np.int64))
+        keep = first[group]
+    return keep
+
+
+# -----------------------------
+# Clusters
+# -----------------------------
+class DuplicateClusters:
+    """
+    Near-duplicate clusters of a store as one int64 array: labels[row] is the
+    cluster id of that row (the smallest row in the cluster; singletons are their
+    own cluster). Covers index rows [0, n); newer rows count as singletons.
+    """
+
+    def __init__(self, labels: np.ndarray):
+        self.labels = labels
+
+    @property
+    def n(self) -> int:
+        return int(self.labels.shape[0])
+
+    def label(self, rows: np.ndarray) -> np.ndarray:
+        rows = np.asarray(rows, dtype=np.int64)
+        out = rows.copy()
+        inside = (rows >= 0) & (rows < self.n)
+        out[inside] = self.labels[rows[inside]]
+        return out
+
+    def sizes(self) -> np.ndarray:
+        return np.bincount(self.labels, minlength=self.n) if self.n else np.zeros(0, dtype=np.int64)
+
+    def clusters(self, offset: int = 0, limit: int = 50, min_size: int = 2) -> Dict:
+        """Clusters with at least `min_size` members, largest first."""
+        sizes = self.sizes()
+        ids = np.flatnonzero(sizes >= min_size)
+        ids = ids[np.argsort(-sizes[ids], kind="stable")]
+        page = ids[offset:offset + limit]
+        return {
+            "clusters": [{"id": int(c), "size": int(sizes[c])} for c in page],
+            "total": int(len(ids)),
+            "next_offset": offset + len(page) if offset + len(page) < len(ids) else None,
+        }
+
+    def members(self, cluster_id: int) -> np.ndarray:
+        return np.flatnonzero(self.labels == cluster_id)
+
+    def remove_rows(self, rows: List[int]) -> "DuplicateClusters":
+        """Labels after deleting `rows` (later rows shift down; clusters keep their smallest row as id)."""
+        return DuplicateClusters(relabel_after_delete(self.labels, rows))
+
+    def meta(self) -> Dict:
+        sizes = self.sizes()
+        dup = sizes >= 2
+        return {
+            "watermark": self.n,
+            "clusters": int(dup.sum()),
+            "duplicate_rows": int(sizes[dup].sum() - dup.sum()),  # rows beyond each cluster's first
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+
+    # -----------------------------
+    # Persistence
+    # -----------------------------
+    @classmethod
+    def load(cls, path: Path) -> Optional["DuplicateClusters"]:
+        labels_path = path / CLUSTERS_FILE
+        if not labels_path.exists():
+            return None
+        return cls(np.load(labels_path, mmap_mode="r"))
+
+    def save(self, path: Path):
+        _save_array(path / CLUSTERS_FILE, np.ascontiguousarray(self.labels, dtype=np.int64))
+
+
+def collapse(ids: np.ndarray, sims: np.ndarray, labels: np.ndarray):
+    """
+    Keep only the best hit per cluster in each row of (Q, k) search results,
+    compacted to the left and padded with -1. Also returns, per kept hit, how
+    many hits of that row it stands for (itself included).
+    """
+    out_ids = np.full_like(ids, -1)
+    out_sims = np.full_like(sims, -np.inf)
+    counts = np.zeros(ids.shape, dtype=np.int64)
+    for q in range(len(ids)):
+        valid = np.flatnonzero(ids[q] >= 0)
+        _, first, n = np.unique(labels[q, valid], return_index=True, return_counts=True)
+        order = np.argsort(first)
+        keep = valid[first[order]]
+        out_ids[q, :len(keep)] = ids[q, keep]
+        out_sims[q, :len(keep)] = sims[q, keep]
+        counts[q, :len(keep)] = n[order]
+    return out_ids, out_sims, counts
+
+
+def find_duplicates(
+    index: faiss.Index,
+    threshold: float = 0.95,
+    k: int = 32,
+    block_size: int = 4096,
+    graph: Optional["KNNGraph"] = None,
+    progress: Optional[Callable[[int, int, int], None]] = None,
+) -> DuplicateClusters:
+    """
+    Cluster rows whose similarity is >= threshold (transitively).
+    Rows are streamed from the index in blocks; each block is one k-NN search
+    against the whole index, and its pairs above the threshold are unioned
+    right away, so memory stays at one block plus the (n,) parent array.
+    `k` caps the neighbors considered per row (a cluster only needs to stay connected).
+    Rows covered by a k-NN `graph` with at least k edges reuse its edges instead of searching.
+    progress(done_rows, total_rows, pairs_so_far) is called after each block.
+    Blocking; call off-thread from async code.
+    """
+    n = int(index.ntotal)
+    uf = UnionFind(n)
+    fetch = min(k + 1, n)  # +1: the row itself
+    covered = min(graph.n, n) if graph is not None and graph.k >= k else 0
+    pairs = 0
+    for lo in range(0, n, block_size):
+        hi = min(lo + block_size, n)
+        if hi <= covered:
+            I, D = graph.ids[lo:hi, :k], graph.sims[lo:hi, :k]
+        else:
+            xq = index.reconstruct_n(lo, hi - lo)
+            with SEARCH_SECONDS.time(op="dedup"):
+                D, I = index.search(xq, fetch)
+        rows = np.repeat(np.arange(lo, hi, dtype=np.int64), I.shape[1])
+        I, D = I.ravel(), D.ravel()
+        hit = (D >= threshold) & (I >= 0) & (I < n) & (I != rows)
+        pairs += int(hit.sum())
+        uf.union(rows[hit], I[hit])
+        if progress:
+            progress(hi, n, pairs)
+
+    return DuplicateClusters(uf.parent)
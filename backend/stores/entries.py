@@ -0,0 +1,200 @@
+"""
+Row access into entries.jsonl without parsing the whole file.
+
+entries.idx holds the byte offset of every row (raw little-endian uint64,
+append-only). Row i is the i-th non-blank line, i.e. index row i. The index
+is extended lazily on read by scanning only the bytes past the last indexed
+row, so appends from any writer are picked up without hooks; rewrites of
+entries.jsonl (delete) must call `EntryOffsets.invalidate`.
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+OFFSETS_FILE = "entries.idx"
+
+_LOCKS: Dict[Path, threading.Lock] = {}
+_LOCKS_GUARD = threading.Lock()
+
+
+def _lock(path: Path) -> threading.Lock:
+    with _LOCKS_GUARD:
+        return _LOCKS.setdefault(path.resolve(), threading.Lock())
+
+
+class EntryOffsets:
+    def __init__(self, entries_path: Path):
+        self.entries_path = entries_path
+        self.path = entries_path.with_name(OFFSETS_FILE)
+
+    @classmethod
+    def invalidate(cls, entries_path: Path):
+        entries_path.with_name(OFFSETS_FILE).unlink(missing_ok=True)
+
+    def _load(self) -> np.ndarray:
+        if not self.path.exists():
+            return np.empty(0, dtype="<u8")
+        size = self.path.stat().st_size
+        usable = size - size % 8  # drop a torn trailing record
+        if usable == 0:
+            return np.empty(0, dtype="<u8")
+        return np.memmap(self.path, dtype="<u8", mode="r", shape=(usable // 8,))
+
+    def _covered_end(self, f, offsets: np.ndarray) -> Optional[int]:
+        """Byte just past the last indexed row, or None if the index no longer matches the file."""
+        if len(offsets) == 0:
+            return 0
+        if int(offsets[-1]) >= os.fstat(f.fileno()).st_size:
+            return None
+        f.seek(int(offsets[-1]))
+        line = f.readline()
+        if not line.endswith(b"\n") or not line.strip():
+            return None
+        return int(offsets[-1]) + len(line)
+
+    def load(self) -> np.ndarray:
+        """Offsets of every complete row, extending the on-disk index first."""
+        if not self.entries_path.exists():
+            return np.empty(0, dtype="<u8")
+        with _lock(self.path):
+            offsets = self._load()
+            keep = len(offsets) * 8  # valid bytes of entries.idx
+            with open(self.entries_path, "rb") as f:
+                end = self._covered_end(f, offsets)
+                if end is None:
+                    # entries.jsonl was rewritten under us: rebuild
+                    keep, end = 0, 0
+                f.seek(end)
+                new = []
+                pos = end
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # row still being written
+                    if line.strip():
+                        new.append(pos)
+                    pos += len(line)
+
+            on_disk = self.path.stat().st_size if self.path.exists() else 0
+            data = np.asarray(new, dtype="<u8").tobytes()
+            if keep == 0 and on_disk:
+                # Rebuild: new file + rename, readers may still map the old one
+                tmp = self.path.with_suffix(".tmp")
+                tmp.write_bytes(data)
+                os.replace(tmp, self.path)
+                offsets = self._load()
+            elif new or on_disk != keep:
+                # Append (dropping a torn trailing record no reader has mapped)
+                with open(self.path, "r+b" if on_disk else "wb") as out:
+                    out.truncate(keep)
+                    out.seek(keep)
+                    out.write(data)
+                offsets = self._load()
+            return offsets
+
+
+def text_filter(q: Optional[str] = None, prefix: Optional[str] = None, ignore_case: bool = True) -> Optional[Callable[[bytes], Optional[Dict]]]:
+    """
+    Row predicate on raw lines: returns the parsed entry if it matches, else None.
+    For plain ASCII needles a raw-bytes check rejects most rows before JSON parsing
+    (entries are written with ensure_ascii, so non-ASCII text is escaped on disk).
+    """
+    if not q and not prefix:
+        return None
+    norm = (lambda s: s.lower()) if ignore_case else (lambda s: s)
+    needle = norm(q) if q else None
+    pre = norm(prefix) if prefix else None
+
+    quick = needle or pre
+    raw = None
+    if quick.isascii() and quick.isprintable() and not any(c in quick for c in '\\"'):
+        raw = quick.encode("ascii")
+
+    def match(line: bytes) -> Optional[Dict]:
+        if raw is not None and raw not in (line.lower() if ignore_case else line):
+            return None
+        entry = json.loads(line)
+        text = norm(entry.get("text", ""))
+        if pre is not None and not text.startswith(pre):
+            return None
+        if needle is not None and needle not in text:
+            return None
+        return entry
+
+    return match
+
+
+# Bytes per positional read
+READ_BLOCK = 1 << 16
+
+
+def _pread_line(fd: int, pos: int) -> bytes:
+    """The line starting at byte `pos` (positional reads: no shared file position)."""
+    buf = b""
+    while True:
+        chunk = os.pread(fd, READ_BLOCK, pos + len(buf))
+        if not chunk:
+            return buf
+        i = chunk.find(b"\n")
+        if i >= 0:
+            return buf + chunk[:i + 1]
+        buf += chunk
+
+
+def _iter_lines(fd: int, pos: int) -> Iterator[bytes]:
+    """Lines from byte `pos` to EOF, read block by block with pread."""
+    buf = b""
+    while True:
+        chunk = os.pread(fd, READ_BLOCK, pos)
+        if not chunk:
+            break
+        pos += len(chunk)
+        lines = (buf + chunk).split(b"\n")
+        buf = lines.pop()
+        for line in lines:
+            yield line + b"\n"
+    if buf:
+        yield buf
+
+
+@contextmanager
+def _fd(entries: Union[Path, BinaryIO]):
+    if isinstance(entries, Path):
+        with open(entries, "rb") as f:
+            yield f.fileno()
+    else:
+        yield entries.fileno()
+
+
+def scan(entries: Union[Path, BinaryIO], offsets: np.ndarray, start: int, match=None) -> Iterator[Tuple[int, Optional[Dict]]]:
+    """
+    (row, entry) for every row from `start` on; entry is None for rows rejected
+    by `match`. Reads lazily, constant memory. `entries` is a path or an open
+    binary file (e.g. pinned by a StoreView); open files are only read positionally.
+    """
+    n = len(offsets)
+    if start >= n:
+        return
+    with _fd(entries) as fd:
+        row = start
+        for line in _iter_lines(fd, int(offsets[start])):
+            if row >= n:
+                return
+            if not line.strip():
+                continue
+            yield row, (match(line) if match is not None else json.loads(line))
+            row += 1
+
+
+def read_rows(entries: Union[Path, BinaryIO], offsets: np.ndarray, rows) -> Dict[int, Dict]:
+    """Random access: read each wanted row at its offset (path or open binary file, see `scan`)."""
+    found: Dict[int, Dict] = {}
+    n = len(offsets)
+    with _fd(entries) as fd:
+        for row in sorted({int(r) for r in rows if 0 <= r < n}):
+            found[row] = json.loads(_pread_line(fd, int(offsets[row])))
+    return found
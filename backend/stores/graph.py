@@ -0,0 +1,261 @@
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Optional
+
+import faiss
+import numpy as np
+
+from metrics.core import SEARCH_SECONDS
+
+if TYPE_CHECKING:
+    import networkx as nx
+
+GRAPH_IDS_FILE = "graph_ids.npy"
+GRAPH_SIMS_FILE = "graph_sims.npy"
+
+# Edge slot pointing at nothing (deleted neighbor or not enough nodes yet)
+TOMBSTONE = -1
+
+
+def _save_array(path: Path, arr: np.ndarray):
+    # Write next to the target and rename so readers never see a half-written file
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, arr)
+    os.replace(tmp, path)
+
+
+def top_k_neighbors(D: np.ndarray, I: np.ndarray, rows: np.ndarray, k: int):
+    """
+    Turn raw FAISS search results (k+1 columns, self included) into
+    k neighbors per row, with self-matches and padding replaced by tombstones.
+    """
+    D = D.astype(np.float32, copy=True)
+    I = I.astype(np.int64, copy=True)
+    invalid = (I < 0) | (I == rows[:, None])
+    D[invalid] = -np.inf
+    I[invalid] = TOMBSTONE
+
+    order = np.argsort(-D, axis=1, kind="stable")[:, :k]
+    ids = np.take_along_axis(I, order, axis=1)
+    sims = np.take_along_axis(D, order, axis=1)
+
+    if ids.shape[1] < k:
+        pad = k - ids.shape[1]
+        ids = np.pad(ids, ((0, 0), (0, pad)), constant_values=TOMBSTONE)
+        sims = np.pad(sims, ((0, 0), (0, pad)), constant_values=-np.inf)
+    return ids, sims
+
+
+class KNNGraph:
+    """
+    Directed k-NN graph over index rows, stored as two (n, k) arrays:
+      - ids:  neighbor row ids (TOMBSTONE for empty slots)
+      - sims: inner-product similarity, sorted descending per row
+
+    Row i of the graph is row i of the store's FAISS index, so the graph
+    covers the index up to `n` (the freshness watermark).
+
+    The arrays have spare rows so that `extend` appends in place. Once handed out
+    by `snapshot`, they are copied before the next edit (copy on write).
+    """
+
+    def __init__(self, ids: np.ndarray, sims: np.ndarray):
+        self.ids = ids
+        self.sims = sims
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[: self._n]
+
+    @ids.setter
+    def ids(self, ids: np.ndarray):
+        self._ids, self._n, self.shared = ids, int(ids.shape[0]), False
+
+    @property
+    def sims(self) -> np.ndarray:
+        return self._sims[: self._n]
+
+    @sims.setter
+    def sims(self, sims: np.ndarray):
+        self._sims = sims
+
+    @property
+    def k(self) -> int:
+        return int(self._ids.shape[1])
+
+    @property
+    def n(self) -> int:
+        return self._n
+
+    @property
+    def nbytes(self) -> int:
+        return int(self._ids.nbytes + self._sims.nbytes)
+
+    def snapshot(self) -> "KNNGraph":
+        """Graph sharing the current arrays, for readers. Later edits to this one copy first."""
+        self.shared = True
+        return KNNGraph(self.ids, self.sims)
+
+    def _own(self, rows: int = 0):
+        """Private arrays with room for `rows` more rows (grown by half when full)."""
+        need, cap = self._n + rows, int(self._ids.shape[0])
+        if not self.shared and need <= cap:
+            return
+        if need > cap:
+            cap = max(need, cap + cap // 2, 1024)
+        ids = np.empty((cap, self.k), dtype=self._ids.dtype)
+        sims = np.empty((cap, self.k), dtype=self._sims.dtype)
+        ids[: self._n], sims[: self._n] = self.ids, self.sims
+        self._ids, self._sims, self.shared = ids, sims, False
+
+    # -----------------------------
+    # Persistence
+    # -----------------------------
+    @classmethod
+    def load(cls, path: Path) -> Optional["KNNGraph"]:
+        ids_path, sims_path = path / GRAPH_IDS_FILE, path / GRAPH_SIMS_FILE
+        if not ids_path.exists() or not sims_path.exists():
+            return None
+        return cls(np.load(ids_path), np.load(sims_path))
+
+    def save(self, path: Path):
+        _save_array(path / GRAPH_IDS_FILE, self.ids)
+        _save_array(path / GRAPH_SIMS_FILE, self.sims)
+
+    @staticmethod
+    def remove_files(path: Path):
+        for name in (GRAPH_IDS_FILE, GRAPH_SIMS_FILE):
+            (path / name).unlink(missing_ok=True)
+
+    def meta(self) -> Dict:
+        return {
+            "k": self.k,
+            "watermark": self.n,
+            "tombstoned_rows": len(self.tombstoned_rows()),
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+
+    # -----------------------------
+    # Incremental maintenance
+    # -----------------------------
+    def extend(self, index: faiss.Index, batch_size: int = 1024) -> int:
+        """
+        Insert index rows [n, index.ntotal) into the graph:
+          - find k neighbors of each new row against the whole index
+          - patch reverse edges on the neighbors when the new row beats their worst edge
+        Returns the number of inserted rows.
+        """
+        start, end = self.n, int(index.ntotal)
+        if start >= end:
+            return 0
+
+        self._own(end - start)
+        for lo in range(start, end, batch_size):
+            hi = min(lo + batch_size, end)
+            xq = index.reconstruct_n(lo, hi - lo)
+            with SEARCH_SECONDS.time(op="graph_extend"):
+                D, I = index.search(xq, min(self.k + 1, int(index.ntotal)))
+            rows = np.arange(lo, hi, dtype=np.int64)
+            ids, sims = top_k_neighbors(D, I, rows, self.k)
+
+            self._ids[lo:hi], self._sims[lo:hi] = ids, sims
+            self._n = hi
+
+            # Reverse edges: new row i is a candidate neighbor of each j it points to
+            touched = set()
+            src = np.repeat(rows, self.k)
+            for i, j, s in zip(src, ids.ravel(), sims.ravel()):
+                if j == TOMBSTONE or j >= self.n:
+                    continue
+                if self._offer(int(j), int(i), float(s)):
+                    touched.add(int(j))
+            self._sort_rows(touched)
+
+        return end - start
+
+    def _offer(self, row: int, cand: int, sim: float) -> bool:
+        row_ids = self.ids[row]
+        if cand == row or (row_ids == cand).any():
+            return False
+        worst = int(np.argmin(self.sims[row]))
+        if sim <= self.sims[row, worst]:
+            return False
+        self.ids[row, worst] = cand
+        self.sims[row, worst] = sim
+        return True
+
+    def _sort_rows(self, rows):
+        if not rows:
+            return
+        rows = np.fromiter(rows, dtype=np.int64)
+        order = np.argsort(-self.sims[rows], axis=1, kind="stable")
+        self.ids[rows] = np.take_along_axis(self.ids[rows], order, axis=1)
+        self.sims[rows] = np.take_along_axis(self.sims[rows], order, axis=1)
+
+    def remove(self, row: int):
+        """
+        Drop a deleted index row. Rows after it shift down by one (like the index),
+        and edges that pointed at it become tombstones, repaired lazily by `repair`.
+        """
+        keep = np.ones(self.n, dtype=bool)
+        keep[row] = False
+        ids, sims = self.ids[keep], self.sims[keep]
+
+        dead = ids == row
+        ids[dead] = TOMBSTONE
+        sims[dead] = -np.inf
+        ids[ids > row] -= 1
+
+        self.ids, self.sims = ids, sims
+
+    def tombstoned_rows(self) -> np.ndarray:
+        """Rows holding fewer valid edges than the graph size allows."""
+        if self.n == 0:
+            return np.empty(0, dtype=np.int64)
+        valid = (self.ids != TOMBSTONE).sum(axis=1)
+        return np.flatnonzero(valid < min(self.k, self.n - 1))
+
+    def repair(self, index: faiss.Index, max_rows: Optional[int] = None, batch_size: int = 1024) -> int:
+        """
+        Re-query neighbors for rows with tombstoned edges.
+        Only valid when the graph is in sync with the index (n == index.ntotal).
+        Returns the number of repaired rows.
+        """
+        if self.n != int(index.ntotal):
+            return 0
+        rows = self.tombstoned_rows()
+        if max_rows is not None:
+            rows = rows[:max_rows]
+        if len(rows) == 0:
+            return 0
+
+        self._own()
+        for lo in range(0, len(rows), batch_size):
+            chunk = rows[lo : lo + batch_size]
+            xq = np.vstack([index.reconstruct(int(r)) for r in chunk])
+            with SEARCH_SECONDS.time(op="graph_repair"):
+                D, I = index.search(xq, min(self.k + 1, self.n))
+            ids, sims = top_k_neighbors(D, I, chunk, self.k)
+            self.ids[chunk] = ids
+            self.sims[chunk] = sims
+        return len(rows)
+
+    # -----------------------------
+    # Traversal
+    # -----------------------------
+    def to_networkx(self) -> "nx.Graph":
+        import networkx as nx  # only needed for traversal; keeps startup light
+
+        G = nx.Graph()
+        G.add_nodes_from(range(self.n))
+        src = np.repeat(np.arange(self.n), self.k)
+        dst = self.ids.ravel()
+        sim = self.sims.ravel()
+        valid = dst != TOMBSTONE
+        G.add_weighted_edges_from(
+            (int(i), int(j), max(0.0, 1.0 - float(s)))
+            for i, j, s in zip(src[valid], dst[valid], sim[valid])
+        )
+        return G
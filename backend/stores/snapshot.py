@@ -0,0 +1,432 @@
+"""
+Single-file store snapshots for replication.
+
+Layout (all integers little-endian):
+
+    MAGIC (8 bytes)
+    block, block, ...            each block starts on a 64-byte boundary
+    directory (JSON)             meta, count, dim, and per block: offset, length, sha256
+    footer (24 bytes)            directory offset (u64), directory length (u64), END_MAGIC
+
+Blocks:
+    vectors                      float32 (count, dim), row i = index row i
+    entries.id.offsets / .data   columnar strings: uint64 offsets (count + 1) + utf-8 bytes
+    entries.text.offsets / .data
+    entries.extra.offsets / .data  (only if entries carry fields besides id/text; JSON per row)
+    index                        raw index.faiss (optional; the vectors rebuild a flat index)
+    graph.ids / graph.sims       raw .npy files (optional)
+    parents                      chunk -> document labels, raw .npy (chunked stores)
+    clusters                     near-duplicate labels, raw .npy (optional)
+    topics.assign / .arrays      topic assignments (.npy) and centroids/layout (.npz) (optional)
+
+The directory sits at the end so export can stream blocks (and their
+checksums) in one pass; import memory-maps the file and reads the footer.
+"""
+import hashlib
+import itertools
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, Optional, Union
+
+import faiss
+import numpy as np
+
+from .chunking import PARENTS_FILE, ChunkParents
+from .dedup import CLUSTERS_FILE
+from .graph import GRAPH_IDS_FILE, GRAPH_SIMS_FILE
+from .topics import TOPICS_ARRAYS_FILE, TOPICS_ASSIGN_FILE
+
+MAGIC = b"TSSNAP\x00\x01"
+END_MAGIC = b"TSSNAPND"
+FOOTER = struct.Struct("<QQ8s")
+VERSION = 1
+ALIGN = 64
+CHUNK_BYTES = 8 << 20
+SNAPSHOT_SUFFIX = ".tss"
+
+Progress = Optional[Callable[[int, int, str], None]]
+
+# Per-row side arrays copied as-is: block -> file in the store directory
+ARRAY_BLOCKS = {
+    "parents": PARENTS_FILE,
+    "clusters": CLUSTERS_FILE,
+    "topics.assign": TOPICS_ASSIGN_FILE,
+    "topics.arrays": TOPICS_ARRAYS_FILE,
+}
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+# -----------------------------
+# Export
+# -----------------------------
+class _Writer:
+    def __init__(self, f: BinaryIO):
+        self.f = f
+        self.pos = 0
+        self.blocks: Dict[str, Dict] = {}
+
+    def write_raw(self, data: bytes):
+        self.f.write(data)
+        self.pos += len(data)
+
+    def _align(self):
+        pad = -self.pos % ALIGN
+        if pad:
+            self.write_raw(b"\0" * pad)
+
+    def block(self, name: str, chunks: Iterator[bytes], **info):
+        self._align()
+        start = self.pos
+        digest = hashlib.sha256()
+        for chunk in chunks:
+            digest.update(chunk)
+            self.write_raw(chunk)
+        self.blocks[name] = {"offset": start, "length": self.pos - start, "sha256": digest.hexdigest(), **info}
+
+
+def _file_chunks(src: Union[Path, BinaryIO]) -> Iterator[bytes]:
+    """A file in CHUNK_BYTES pieces; open files (pinned by a store view) are read positionally."""
+    if isinstance(src, Path):
+        with open(src, "rb") as f:
+            yield from _file_chunks(f)
+        return
+    pos = 0
+    while True:
+        chunk = os.pread(src.fileno(), CHUNK_BYTES, pos)
+        if not chunk:
+            return
+        pos += len(chunk)
+        yield chunk
+
+
+def _spool_entries(entries: Iterable[Dict], count: int, tmp: Path, progress: Progress) -> Dict[str, np.ndarray]:
+    """
+    One pass over the entries: column data goes to spool files, offsets stay in RAM.
+    Only the first `count` rows are taken (rows past the index are not committed yet).
+    """
+    offsets = {c: np.zeros(count + 1, dtype=np.uint64) for c in ("id", "text", "extra")}
+    spools = {c: open(tmp / f"{c}.data", "wb") for c in offsets}
+    sizes = dict.fromkeys(offsets, 0)
+    has_extra = False
+    row = 0
+    try:
+        for entry in entries:
+            if row >= count:
+                break
+            extra = {k: v for k, v in entry.items() if k not in ("id", "text")}
+            values = {
+                "id": str(entry["id"]).encode("utf-8"),
+                "text": entry["text"].encode("utf-8"),
+                "extra": json.dumps(extra).encode("utf-8") if extra else b"",
+            }
+            has_extra = has_extra or bool(extra)
+            for c, v in values.items():
+                spools[c].write(v)
+                sizes[c] += len(v)
+                offsets[c][row + 1] = sizes[c]
+            row += 1
+            if progress and row % 100_000 == 0:
+                progress(row, count, "entries")
+    finally:
+        for s in spools.values():
+            s.close()
+    if row != count:
+        raise SnapshotError(f"entries.jsonl has {row} rows, index has {count}")
+    if not has_extra:
+        del offsets["extra"]
+    return offsets
+
+
+def export_snapshot(store, out_path: Path, include_index: Optional[bool] = None, include_graph: bool = True, progress: Progress = None) -> Dict:
+    """
+    Stream `store` into a snapshot at `out_path` (written to a temp name, then renamed).
+    include_index=None includes index.faiss only when it is not a plain flat index
+    (a flat index is rebuilt from the vectors block on import).
+    Returns the snapshot directory.
+    """
+    # One pinned generation: ingestion can go on while we stream it out
+    view = store.view()
+    index = view.index
+    count = view.n
+    dim = int(index.d) if index is not None else int(store.meta.get("dim") or 0)
+    if include_index is None:
+        include_index = index is not None and not isinstance(index, faiss.IndexFlat)
+    graph = view.graph if include_graph else None
+
+    tmp_dir = Path(tempfile.mkdtemp(prefix="snapshot-", dir=out_path.parent))
+    partial = out_path.with_name(out_path.name + ".partial")
+    try:
+        offsets = _spool_entries((e for _, e in view.scan()), count, tmp_dir, progress) if count else {}
+
+        with open(partial, "wb") as f:
+            w = _Writer(f)
+            w.write_raw(MAGIC)
+
+            def vector_chunks():
+                rows = max(1, CHUNK_BYTES // max(dim * 4, 1))
+                for lo in range(0, count, rows):
+                    n = min(rows, count - lo)
+                    yield np.ascontiguousarray(index.reconstruct_n(lo, n), dtype="<f4").tobytes()
+                    if progress:
+                        progress(lo + n, count, "vectors")
+
+            w.block("vectors", vector_chunks(), dtype="float32", shape=[count, dim])
+            for column, offs in offsets.items():
+                w.block(f"entries.{column}.offsets", iter([offs.astype("<u8").tobytes()]), dtype="uint64", shape=[count + 1])
+                w.block(f"entries.{column}.data", _file_chunks(tmp_dir / f"{column}.data"))
+            if include_index and index is not None:
+                w.block("index", _file_chunks(view.index_file))
+            if graph is not None:
+                graph.save(tmp_dir)
+                w.block("graph.ids", _file_chunks(tmp_dir / GRAPH_IDS_FILE), shape=[graph.n, graph.k])
+                w.block("graph.sims", _file_chunks(tmp_dir / GRAPH_SIMS_FILE), shape=[graph.n, graph.k])
+            # Chunk parents, duplicate clusters and topics of the pinned generation
+            for side in (view.parents, view.clusters, view.topics):
+                if side is not None:
+                    side.save(tmp_dir)
+            for block, filename in ARRAY_BLOCKS.items():
+                if (tmp_dir / filename).exists():
+                    w.block(block, _file_chunks(tmp_dir / filename))
+
+            meta = {k: v for k, v in store.meta.items() if not (k == "graph" and graph is None)}
+            if graph is not None:
+                # The view's graph (meta may already describe a later save)
+                meta["graph"] = {**meta.get("graph", {}), "k": graph.k, "watermark": graph.n,
+                                 "tombstoned_rows": len(graph.tombstoned_rows())}
+            if view.clusters is None:
+                meta.pop("dedup", None)
+            else:
+                meta["dedup"] = {**meta.get("dedup", {}), **view.clusters.meta()}
+            if view.topics is None:
+                meta.pop("topics", None)
+            else:
+                meta["topics"] = {**view.topics.info, "k": view.topics.k, "watermark": view.topics.n}
+            directory = {
+                "version": VERSION,
+                "meta": meta,
+                "count": count,
+                "dim": dim,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "blocks": w.blocks,
+            }
+            raw = json.dumps(directory).encode("utf-8")
+            dir_offset = w.pos
+            w.write_raw(raw)
+            w.write_raw(FOOTER.pack(dir_offset, len(raw), END_MAGIC))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(partial, out_path)
+        return directory
+    finally:
+        partial.unlink(missing_ok=True)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+# -----------------------------
+# Import
+# -----------------------------
+class Snapshot:
+    """A memory-mapped snapshot file."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._f = open(path, "rb")
+        size = os.fstat(self._f.fileno()).st_size
+        if size < len(MAGIC) + FOOTER.size:
+            self.close()
+            raise SnapshotError("File too small to be a snapshot")
+        self.mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.directory = self._read_directory(size)
+        except Exception:
+            self.close()
+            raise
+
+    def _read_directory(self, size: int) -> Dict:
+        if self.mm[: len(MAGIC)] != MAGIC:
+            raise SnapshotError("Not a snapshot (bad magic)")
+        dir_offset, dir_len, end = FOOTER.unpack(self.mm[size - FOOTER.size :])
+        if end != END_MAGIC or dir_offset + dir_len > size - FOOTER.size:
+            raise SnapshotError("Truncated snapshot (bad footer)")
+        directory = json.loads(bytes(self.mm[dir_offset : dir_offset + dir_len]))
+        if directory.get("version") != VERSION:
+            raise SnapshotError(f"Unsupported snapshot version {directory.get('version')}")
+        for name, b in directory["blocks"].items():
+            if b["offset"] < len(MAGIC) or b["offset"] + b["length"] > dir_offset:
+                raise SnapshotError(f"Block {name} out of bounds")
+        return directory
+
+    def close(self):
+        if getattr(self, "mm", None) is not None:
+            try:
+                self.mm.close()
+            except BufferError:
+                # Arrays/views still reference the mapping; it is unmapped once they are dropped
+                pass
+            self.mm = None
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def count(self) -> int:
+        return int(self.directory["count"])
+
+    @property
+    def dim(self) -> int:
+        return int(self.directory["dim"])
+
+    def has(self, name: str) -> bool:
+        return name in self.directory["blocks"]
+
+    def view(self, name: str) -> memoryview:
+        b = self.directory["blocks"][name]
+        return memoryview(self.mm)[b["offset"] : b["offset"] + b["length"]]
+
+    def array(self, name: str, dtype: str) -> np.ndarray:
+        return np.frombuffer(self.view(name), dtype=dtype)
+
+    def vectors(self) -> np.ndarray:
+        return self.array("vectors", "<f4").reshape(self.count, self.dim)
+
+    def column(self, name: str) -> Iterator[bytes]:
+        offsets = self.array(f"entries.{name}.offsets", "<u8")
+        data = self.view(f"entries.{name}.data")
+        for i in range(self.count):
+            yield bytes(data[offsets[i] : offsets[i + 1]])
+
+    def validate(self, progress: Progress = None):
+        """Checksums of every block + shape consistency."""
+        blocks = self.directory["blocks"]
+        total = sum(b["length"] for b in blocks.values())
+        done = 0
+        for name, b in blocks.items():
+            digest = hashlib.sha256()
+            view = self.view(name)
+            for lo in range(0, len(view), CHUNK_BYTES):
+                digest.update(view[lo : lo + CHUNK_BYTES])
+                if progress:
+                    progress(done + min(lo + CHUNK_BYTES, len(view)), total, "checksums")
+            done += len(view)
+            if digest.hexdigest() != b["sha256"]:
+                raise SnapshotError(f"Checksum mismatch in block {name}")
+
+        n, d = self.count, self.dim
+        if blocks["vectors"]["length"] != n * d * 4:
+            raise SnapshotError("vectors block size does not match count x dim")
+        for column in ("id", "text", "extra"):
+            if not self.has(f"entries.{column}.offsets"):
+                if column != "extra" and n:
+                    raise SnapshotError(f"Missing entries column {column}")
+                continue
+            offsets = self.array(f"entries.{column}.offsets", "<u8")
+            if len(offsets) != n + 1 or offsets[-1] != blocks[f"entries.{column}.data"]["length"] or np.any(np.diff(offsets.astype(np.int64)) < 0):
+                raise SnapshotError(f"Bad offsets for entries column {column}")
+        if self.has("graph.ids") and self.directory["blocks"]["graph.ids"]["shape"][0] > n:
+            raise SnapshotError("Graph covers more rows than the snapshot")
+
+
+def import_snapshot(path: Path, root: Path, name: str, overwrite: bool = False, progress: Progress = None) -> Dict:
+    """
+    Validate the snapshot at `path` and materialize it as store `name` under `root`.
+    Nothing is re-encoded: vectors/index/graph blocks are copied as-is.
+    The store is built in a temp dir and renamed into place.
+    """
+    target = root / name
+    if target.exists() and not overwrite:
+        raise SnapshotError(f"Store already exists: {name}")
+
+    with Snapshot(path) as snap:
+        snap.validate(progress)
+        n, d = snap.count, snap.dim
+
+        work = Path(tempfile.mkdtemp(prefix=f".{name}.importing-", dir=root))
+        try:
+            meta = dict(snap.directory["meta"], name=name)
+            # Chunk numbers, to rebuild parent labels for snapshots that lack them
+            chunks = np.zeros(n, dtype=np.int64) if meta.get("chunking") and not snap.has("parents") else None
+
+            # entries.jsonl
+            extra = snap.column("extra") if snap.has("entries.extra.offsets") else itertools.repeat(b"")
+            with open(work / "entries.jsonl", "w", encoding="utf-8") as f:
+                for i, (eid, text, ex) in enumerate(zip(snap.column("id"), snap.column("text"), extra)):
+                    entry = {"id": eid.decode("utf-8"), "text": text.decode("utf-8")}
+                    if ex:
+                        entry.update(json.loads(ex))
+                        if chunks is not None:
+                            chunks[i] = entry.get("chunk", 0)
+                    f.write(json.dumps(entry) + "\n")
+                    if progress and (i + 1) % 100_000 == 0:
+                        progress(i + 1, n, "entries")
+
+            # index.faiss: copied if present, else a flat index over the vectors block
+            if snap.has("index"):
+                with open(work / "index.faiss", "wb") as f:
+                    view = snap.view("index")
+                    for lo in range(0, len(view), CHUNK_BYTES):
+                        f.write(view[lo : lo + CHUNK_BYTES])
+            elif n:
+                index = faiss.IndexFlatIP(d)
+                vectors = snap.vectors()
+                rows = max(1, CHUNK_BYTES // (d * 4))
+                for lo in range(0, n, rows):
+                    index.add(np.ascontiguousarray(vectors[lo : lo + rows]))
+                    if progress:
+                        progress(min(lo + rows, n), n, "vectors")
+                faiss.write_index(index, str(work / "index.faiss"))
+
+            index_n = faiss.read_index(str(work / "index.faiss"), faiss.IO_FLAG_MMAP).ntotal if n else 0
+            if index_n != n:
+                raise SnapshotError(f"Index has {index_n} vectors, snapshot has {n} entries")
+
+            # graph
+            for block, filename in (("graph.ids", GRAPH_IDS_FILE), ("graph.sims", GRAPH_SIMS_FILE)):
+                if snap.has(block):
+                    (work / filename).write_bytes(snap.view(block))
+
+            # side arrays (parents / clusters / topics)
+            for block, filename in ARRAY_BLOCKS.items():
+                if snap.has(block):
+                    (work / filename).write_bytes(snap.view(block))
+            if chunks is not None:
+                ChunkParents(np.zeros(0, dtype=np.int64)).extend(0, [{"chunk": int(c)} for c in chunks]).save(work)
+            # Parents cover every row; clusters / topics may stop short (later rows are singletons / unassigned)
+            for filename in (PARENTS_FILE, CLUSTERS_FILE, TOPICS_ASSIGN_FILE):
+                if (work / filename).exists():
+                    rows = len(np.load(work / filename, mmap_mode="r"))
+                    if rows > n or (filename == PARENTS_FILE and rows != n):
+                        raise SnapshotError(f"{filename} covers {rows} rows, snapshot has {n}")
+
+            if not snap.has("graph.ids"):
+                meta.pop("graph", None)
+            if not snap.has("clusters"):
+                meta.pop("dedup", None)
+            if not (snap.has("topics.assign") and snap.has("topics.arrays")):
+                meta.pop("topics", None)
+            with open(work / "meta.json", "w", encoding="utf-8") as f:
+                json.dump(meta, f, indent=2)
+
+            if target.exists():
+                old = target.with_name(f".{name}.replaced")
+                shutil.rmtree(old, ignore_errors=True)
+                os.replace(target, old)
+                os.replace(work, target)
+                shutil.rmtree(old, ignore_errors=True)
+            else:
+                os.replace(work, target)
+            return {"name": name, "count": n, "dim": d, "blocks": sorted(snap.directory["blocks"])}
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
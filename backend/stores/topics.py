@@ -0,0 +1,288 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import faiss
+import numpy as np
+
+from metrics.core import SEARCH_SECONDS
+
+from .graph import _save_array
+
+TOPICS_ASSIGN_FILE = "topics_assign.npy"
+TOPICS_ARRAYS_FILE = "topics.npz"
+
+# Rows per block when assigning stored vectors to centroids
+ASSIGN_BLOCK = 65536
+
+
+def _nearest(centroids: np.ndarray, x: np.ndarray):
+    """(labels, sims) of the closest centroid for each row of x."""
+    cindex = faiss.IndexFlatIP(centroids.shape[1])
+    cindex.add(centroids)
+    with SEARCH_SECONDS.time(op="topics"):
+        D, I = cindex.search(np.ascontiguousarray(x, dtype=np.float32), 1)
+    return I[:, 0].astype(np.int32), D[:, 0]
+
+
+def _merge_reps(rep_rows: np.ndarray, rep_sims: np.ndarray, rows: np.ndarray, labels: np.ndarray, sims: np.ndarray):
+    """Keep the `reps` rows closest to their centroid per topic, given a new batch of assigned rows."""
+    k, reps = rep_rows.shape
+    have = rep_rows >= 0
+    all_rows = np.concatenate([rep_rows[have], rows])
+    all_labels = np.concatenate([np.nonzero(have)[0], labels])
+    all_sims = np.concatenate([rep_sims[have], sims])
+
+    order = np.lexsort((-all_sims, all_labels))
+    labels_sorted = all_labels[order]
+    rank = np.arange(len(order)) - np.searchsorted(labels_sorted, labels_sorted)
+    keep = order[rank < reps]
+
+    rep_rows.fill(-1)
+    rep_sims.fill(-np.inf)
+    slot = rank[rank < reps]
+    rep_rows[all_labels[keep], slot] = all_rows[keep]
+    rep_sims[all_labels[keep], slot] = all_sims[keep]
+
+
+def _shift_rows(rows: np.ndarray, deleted: np.ndarray) -> np.ndarray:
+    """Row ids after deleting `deleted` (sorted); deleted rows become -1."""
+    out = rows - np.searchsorted(deleted, rows)
+    out[np.isin(rows, deleted) | (rows < 0)] = -1
+    return out
+
+
+class Topics:
+    """
+    K-means topics over a store's vectors, plus a cached 2D layout:
+      - centroids (k, d) and one topic per index row (assign, int32)
+      - representatives: the rows closest to each centroid
+      - layout: PCA plane of the centroids; centroids and a row sample projected on it
+    Covers index rows [0, n); `extend` assigns newer rows to the existing centroids.
+    `generation` is the store generation the cached summary was computed at.
+    """
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        assign: np.ndarray,
+        rep_rows: np.ndarray,
+        rep_sims: np.ndarray,
+        mean: np.ndarray,
+        basis: np.ndarray,
+        sample_rows: np.ndarray,
+        sample_xy: np.ndarray,
+        info: Dict,
+    ):
+        self.centroids = centroids
+        self.assign = assign
+        self.rep_rows = rep_rows
+        self.rep_sims = rep_sims
+        self.mean = mean
+        self.basis = basis
+        self.sample_rows = sample_rows
+        self.sample_xy = sample_xy
+        self.info = info
+
+    @property
+    def k(self) -> int:
+        return int(self.centroids.shape[0])
+
+    @property
+    def n(self) -> int:
+        return int(self.assign.shape[0])
+
+    @property
+    def generation(self) -> int:
+        return int(self.info.get("generation", -1))
+
+    def project(self, x: np.ndarray) -> np.ndarray:
+        return ((x - self.mean) @ self.basis).astype(np.float32)
+
+    def sizes(self) -> np.ndarray:
+        return np.bincount(self.assign, minlength=self.k)
+
+    def members(self, topic: int) -> np.ndarray:
+        return np.flatnonzero(self.assign == topic)
+
+    def summary(self) -> Dict:
+        """Small per-topic payload: size, centroid position, representative rows."""
+        sizes = self.sizes()
+        xy = self.project(self.centroids)
+        return {
+            **self.info,
+            "k": self.k,
+            "watermark": self.n,
+            "topics": [
+                {
+                    "id": t,
+                    "size": int(sizes[t]),
+                    "x": round(float(xy[t, 0]), 4),
+                    "y": round(float(xy[t, 1]), 4),
+                    "representatives": [int(r) for r in self.rep_rows[t] if r >= 0],
+                }
+                for t in range(self.k)
+            ],
+        }
+
+    def layout(self) -> Dict:
+        """Sampled points on the centroid plane, as flat arrays."""
+        topics = self.assign[self.sample_rows] if len(self.sample_rows) else np.zeros(0, dtype=np.int32)
+        return {
+            "generation": self.generation,
+            "rows": self.sample_rows.tolist(),
+            "x": np.round(self.sample_xy[:, 0], 4).tolist(),
+            "y": np.round(self.sample_xy[:, 1], 4).tolist(),
+            "topic": topics.tolist(),
+        }
+
+    # -----------------------------
+    # Incremental maintenance
+    # -----------------------------
+    def extend(self, index: faiss.Index, generation: int, seed: int = 0) -> int:
+        """
+        Assign index rows [n, index.ntotal) to the existing centroids, update
+        representatives and add a proportional share of them to the layout sample.
+        Returns the number of rows assigned.
+        """
+        start, end = self.n, int(index.ntotal)
+        self.info["generation"] = generation
+        if start >= end:
+            return 0
+
+        rng = np.random.default_rng(seed + end)
+        target = int(self.info.get("sample", len(self.sample_rows)))
+        labels = []
+        for lo in range(start, end, ASSIGN_BLOCK):
+            hi = min(lo + ASSIGN_BLOCK, end)
+            x = index.reconstruct_n(lo, hi - lo)
+            lab, sims = _nearest(self.centroids, x)
+            _merge_reps(self.rep_rows, self.rep_sims, np.arange(lo, hi, dtype=np.int64), lab, sims)
+            labels.append(lab)
+
+            take = rng.binomial(hi - lo, min(1.0, target / end))
+            if take:
+                picked = np.sort(rng.choice(hi - lo, take, replace=False))
+                self.sample_rows = np.concatenate([self.sample_rows, lo + picked])
+                self.sample_xy = np.concatenate([self.sample_xy, self.project(x[picked])])
+
+        self.assign = np.concatenate([np.asarray(self.assign), *labels])
+        self.info["updated_at"] = datetime.now(timezone.utc).isoformat()
+        return end - start
+
+    def remove_rows(self, rows: List[int]):
+        """Drop deleted rows (later rows shift down); centroids are kept."""
+        deleted = np.unique(np.asarray([r for r in rows if r < self.n], dtype=np.int64))
+        if not len(deleted):
+            return
+        self.assign = np.delete(np.asarray(self.assign), deleted)
+
+        reps = _shift_rows(self.rep_rows, deleted)
+        self.rep_sims[reps < 0] = -np.inf
+        # Refill slots left by deleted representatives: compact each topic's list
+        order = np.argsort(-self.rep_sims, axis=1, kind="stable")
+        self.rep_rows = np.take_along_axis(reps, order, axis=1)
+        self.rep_sims = np.take_along_axis(self.rep_sims, order, axis=1)
+
+        sample = _shift_rows(self.sample_rows, deleted)
+        self.sample_rows, self.sample_xy = sample[sample >= 0], self.sample_xy[sample >= 0]
+
+    # -----------------------------
+    # Persistence
+    # -----------------------------
+    @classmethod
+    def load(cls, path: Path, info: Optional[Dict]) -> Optional["Topics"]:
+        assign_path, arrays_path = path / TOPICS_ASSIGN_FILE, path / TOPICS_ARRAYS_FILE
+        if info is None or not assign_path.exists() or not arrays_path.exists():
+            return None
+        with np.load(arrays_path) as a:
+            return cls(
+                a["centroids"], np.load(assign_path, mmap_mode="r"), a["rep_rows"], a["rep_sims"],
+                a["mean"], a["basis"], a["sample_rows"], a["sample_xy"], dict(info),
+            )
+
+    def save(self, path: Path):
+        _save_array(path / TOPICS_ASSIGN_FILE, np.ascontiguousarray(self.assign, dtype=np.int32))
+        tmp = path / (TOPICS_ARRAYS_FILE + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(
+                f, centroids=self.centroids, rep_rows=self.rep_rows, rep_sims=self.rep_sims,
+                mean=self.mean, basis=self.basis, sample_rows=self.sample_rows, sample_xy=self.sample_xy,
+            )
+        tmp.replace(path / TOPICS_ARRAYS_FILE)
+
+    @staticmethod
+    def remove_files(path: Path):
+        for name in (TOPICS_ASSIGN_FILE, TOPICS_ARRAYS_FILE):
+            (path / name).unlink(missing_ok=True)
+
+
+def compute_topics(
+    index: faiss.Index,
+    k: int = 50,
+    niter: int = 20,
+    sample: int = 2000,
+    representatives: int = 5,
+    max_points_per_centroid: int = 256,
+    generation: int = 0,
+    seed: int = 0,
+    progress: Optional[Callable[[str, int, int], None]] = None,
+) -> Topics:
+    """
+    Spherical k-means over the stored vectors (trained on a sample of at most
+    k * max_points_per_centroid rows), then every row is assigned to its nearest
+    centroid block by block, so memory stays bounded for large stores.
+    progress(phase, done, total) is called after training and after each block.
+    Blocking; call off-thread from async code.
+    """
+    n, d = int(index.ntotal), int(index.d)
+    k = max(1, min(k, n))
+    rng = np.random.default_rng(seed)
+
+    # 1) Train on a sample
+    train_rows = np.sort(rng.choice(n, min(n, k * max_points_per_centroid), replace=False))
+    xt = index.reconstruct_batch(train_rows)
+    km = faiss.Kmeans(d, k, niter=niter, spherical=True, seed=seed, max_points_per_centroid=max_points_per_centroid)
+    km.train(xt)
+    centroids = np.ascontiguousarray(km.centroids, dtype=np.float32)
+    del xt
+    if progress:
+        progress("train", 0, n)
+
+    # 2) 2D plane of the centroids (PCA)
+    mean = centroids.mean(axis=0)
+    _, _, vt = np.linalg.svd(centroids - mean, full_matrices=False)
+    basis = np.zeros((d, 2), dtype=np.float32)
+    basis[:, : min(2, len(vt))] = vt[:2].T
+
+    topics = Topics(
+        centroids,
+        np.zeros(0, dtype=np.int32),
+        np.full((k, representatives), -1, dtype=np.int64),
+        np.full((k, representatives), -np.inf, dtype=np.float32),
+        mean.astype(np.float32),
+        basis,
+        np.zeros(0, dtype=np.int64),
+        np.zeros((0, 2), dtype=np.float32),
+        {"niter": niter, "sample": sample, "seed": seed},
+    )
+
+    # 3) Assign everything (same path as incremental updates)
+    labels = []
+    for lo in range(0, n, ASSIGN_BLOCK):
+        hi = min(lo + ASSIGN_BLOCK, n)
+        x = index.reconstruct_n(lo, hi - lo)
+        lab, sims = _nearest(centroids, x)
+        _merge_reps(topics.rep_rows, topics.rep_sims, np.arange(lo, hi, dtype=np.int64), lab, sims)
+        labels.append(lab)
+        if progress:
+            progress("assign", hi, n)
+    topics.assign = np.concatenate(labels)
+
+    # 4) Layout sample
+    rows = np.sort(rng.choice(n, min(n, sample), replace=False))
+    topics.sample_rows = rows
+    topics.sample_xy = topics.project(index.reconstruct_batch(rows)) if len(rows) else topics.sample_xy
+
+    topics.info.update(generation=generation, updated_at=datetime.now(timezone.utc).isoformat())
+    return topics
@@ -0,0 +1,119 @@
+import io
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+# IndexFlat file layout: header, then ntotal * d float32 rows (see faiss/impl/index_write.cpp)
+FLAT_HEADER = struct.Struct("<4siqqq?iQ")
+FLAT_FOURCCS = (b"IxFI", b"IxF2")  # inner product, L2
+
+# Bytes per streamed chunk
+CHUNK_BYTES = 4 << 20
+
+DTYPES = {"float32": "<f4", "float16": "<f2"}
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def flat_vectors(index_file: Union[Path, BinaryIO]) -> Optional[np.ndarray]:
+    """
+    (ntotal, d) read-only float32 view over the rows of a flat index file
+    (a path or an open binary file), or None for other index types. The
+    mapping pins the file: later writes (new file + rename) don't affect it.
+    """
+    if isinstance(index_file, Path):
+        try:
+            f = open(index_file, "rb")
+        except FileNotFoundError:
+            return None
+        with f:
+            return flat_vectors(f)
+    fd = index_file.fileno()
+    head = os.pread(fd, FLAT_HEADER.size, 0)
+    if len(head) < FLAT_HEADER.size or head[:4] not in FLAT_FOURCCS:
+        return None
+    _, d, ntotal, _, _, _, _, nflat = FLAT_HEADER.unpack(head)
+    if nflat != ntotal * d:
+        return None
+    if ntotal == 0:
+        return np.zeros((0, d), dtype=np.float32)
+    mm = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+    return np.frombuffer(mm, dtype="<f4", count=ntotal * d, offset=FLAT_HEADER.size).reshape(ntotal, d)
+
+
+class VectorSource:
+    """Stored vectors by row, from a flat-index memmap (zero copy) or any index via `reconstruct`."""
+
+    def __init__(self, src):
+        self.mm = src if isinstance(src, np.ndarray) else None
+        self.index = None if self.mm is not None else src
+        if self.mm is not None:
+            self.n, self.d = self.mm.shape
+        else:
+            self.n = int(src.ntotal) if src is not None else 0
+            self.d = int(src.d) if src is not None else 0
+
+    def range(self, lo: int, hi: int) -> np.ndarray:
+        if self.mm is not None:
+            return self.mm[lo:hi]
+        return self.index.reconstruct_n(lo, hi - lo)
+
+    def take(self, rows: np.ndarray) -> np.ndarray:
+        if self.mm is not None:
+            return self.mm[rows]
+        return self.index.reconstruct_batch(rows.astype(np.int64))
+
+
+def vector_chunks(source: VectorSource, rows: Optional[np.ndarray], start: int, stop: int, dtype: str) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """(row ids, vectors) blocks of about CHUNK_BYTES, for rows[...] or the range [start, stop)."""
+    step = max(1, CHUNK_BYTES // max(source.d * np.dtype(DTYPES[dtype]).itemsize, 1))
+    if rows is None:
+        for lo in range(start, stop, step):
+            hi = min(lo + step, stop)
+            yield np.arange(lo, hi, dtype=np.int64), source.range(lo, hi)
+    else:
+        for lo in range(0, len(rows), step):
+            chunk = rows[lo:lo + step]
+            yield chunk, source.take(chunk)
+
+
+def raw_stream(chunks: Iterator[Tuple[np.ndarray, np.ndarray]], dtype: str) -> Iterator[memoryview]:
+    """Row-major little-endian buffer; float32 memmap slices go out without a copy."""
+    for _, vecs in chunks:
+        out = vecs if vecs.dtype == np.dtype(DTYPES[dtype]) else vecs.astype(DTYPES[dtype])
+        yield memoryview(np.ascontiguousarray(out)).cast("B")
+
+
+def arrow_stream(chunks: Iterator[Tuple[np.ndarray, np.ndarray]], dim: int, dtype: str) -> Iterator[bytes]:
+    """Arrow IPC stream: one record batch per chunk, columns row (int64) and vector (fixed_size_list)."""
+    import pyarrow as pa
+
+    value_type = pa.float32() if dtype == "float32" else pa.float16()
+    schema = pa.schema([("row", pa.int64()), ("vector", pa.list_(value_type, dim))])
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, schema)
+
+    def flush() -> bytes:
+        out = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return out
+
+    for rows, vecs in chunks:
+        flat = np.ascontiguousarray(vecs, dtype=DTYPES[dtype]).reshape(-1)
+        vector = pa.FixedSizeListArray.from_arrays(pa.array(flat, type=value_type), dim)
+        writer.write_batch(pa.record_batch([pa.array(rows), vector], schema=schema))
+        yield flush()
+    writer.close()
+    yield flush()
+
+
+def arrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
@@ -0,0 +1,102 @@
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+from metrics.core import HYDRATE_SECONDS
+
+from .chunking import ChunkParents
+from .dedup import DuplicateClusters
+from .entries import read_rows, scan, text_filter
+from .graph import KNNGraph
+from .topics import Topics
+from .vectors import VectorSource, flat_vectors
+
+
+class StoreView:
+    """
+    One consistent generation of a store, pinned for the length of a read:
+    the index, entries rows [0, index.ntotal), k-NN graph, clusters, topics and
+    chunk parents exactly as they were published together.
+
+    Store files are only ever replaced by rename (or appended past the rows a
+    view covers), so the open handles and mappings held here keep serving this
+    generation while writers build and publish the next one. Views are cheap to
+    share and never mutated; handles close when the last reader lets go.
+    """
+
+    def __init__(
+        self,
+        generation: int,
+        index: Optional[faiss.Index],
+        index_file: Optional[BinaryIO],
+        entries_file: Optional[BinaryIO],
+        offsets: np.ndarray,
+        graph: Optional[KNNGraph],
+        clusters: Optional[DuplicateClusters],
+        topics: Optional[Topics],
+        parents: Optional[ChunkParents],
+    ):
+        self.generation = generation
+        self.index = index
+        self.n = int(index.ntotal) if index is not None else 0
+        self.index_file = index_file
+        self.entries_file = entries_file
+        self.offsets = offsets[: self.n]
+        # Own the arrays as they are now; the store's graph object is rebound (or copied) by writers
+        self.graph = KNNGraph(graph.ids, graph.sims) if graph is not None else None
+        self.clusters = clusters
+        self.topics = topics
+        self.parents = parents
+
+    # -----------------------------
+    # Entries
+    # -----------------------------
+    def get_rows(self, rows) -> Dict[int, Dict]:
+        """Parse only the requested rows; rows past this generation are absent."""
+        wanted = [int(r) for r in rows if 0 <= r < self.n]
+        if not wanted or self.entries_file is None:
+            return {}
+        with HYDRATE_SECONDS.time(op="get_rows"):
+            return read_rows(self.entries_file, self.offsets, wanted)
+
+    def rows_for_ids(self, ids: Sequence[str]) -> Tuple[np.ndarray, List[str]]:
+        """
+        Rows of the given entry ids, in the given order, with one pass over this
+        generation's entries (stops once all are found). Returns (rows, missing ids).
+        """
+        wanted: Dict[str, Optional[int]] = dict.fromkeys(ids)
+        left = len(wanted)
+        for row, entry in self.scan():
+            if left and entry["id"] in wanted and wanted[entry["id"]] is None:
+                wanted[entry["id"]] = row
+                left -= 1
+            if not left:
+                break
+        rows = [wanted[i] for i in ids]
+        missing = [i for i, r in zip(ids, rows) if r is None]
+        return np.array([r for r in rows if r is not None], dtype=np.int64), missing
+
+    def scan(self, cursor: int = 0, q: Optional[str] = None, prefix: Optional[str] = None, ignore_case: bool = True) -> Iterator[Tuple[int, Optional[Dict]]]:
+        if self.entries_file is None:
+            return iter(())
+        return scan(self.entries_file, self.offsets, cursor, text_filter(q, prefix, ignore_case))
+
+    # -----------------------------
+    # Vectors
+    # -----------------------------
+    def vectors(self) -> VectorSource:
+        """
+        Vectors by row. Flat indexes are read straight from a memmap of the
+        pinned index file; others go through the index view.
+        """
+        mm = flat_vectors(self.index_file) if self.index_file is not None else None
+        return VectorSource(mm if mm is not None else self.index)
+
+
+def open_pinned(path: Path) -> Optional[BinaryIO]:
+    try:
+        return open(path, "rb")
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,125 @@
+import asyncio
+import importlib
+import time
+from typing import Dict, List, Optional
+
+from config import CACHE_FOLDER, PROCESS_STARTED, WARMUP_MODELS, WARMUP_STORES
+from metrics.core import gauge
+
+STARTUP_SECONDS = gauge("threadsearch_startup_seconds", "Seconds from process start to a startup milestone", ["phase"])
+
+
+def _names(raw: str) -> List[str]:
+    return [n.strip() for n in raw.split(",") if n.strip()]
+
+
+class Readiness:
+    """Startup milestones + warm-up progress, reported by /health."""
+
+    def __init__(self):
+        self.app_ready_at: Optional[float] = None
+        self.warm_at: Optional[float] = None
+        self.first_request_at: Optional[float] = None
+        self.warmup_enabled = bool(WARMUP_STORES.strip() or WARMUP_MODELS.strip())
+        self.stores: Dict[str, str] = {}
+        self.models: Dict[str, str] = {}
+
+    def _mark(self, phase: str) -> float:
+        now = time.time()
+        STARTUP_SECONDS.set(now - PROCESS_STARTED, phase=phase)
+        return now
+
+    def app_ready(self):
+        self.app_ready_at = self._mark("app_ready")
+        if not self.warmup_enabled:
+            self.warm_at = self.app_ready_at
+
+    def warm(self):
+        self.warm_at = self._mark("warm")
+
+    def request_served(self):
+        if self.first_request_at is None:
+            self.first_request_at = self._mark("first_request")
+
+    @property
+    def ready(self) -> bool:
+        return self.app_ready_at is not None and self.warm_at is not None
+
+    def dict(self) -> Dict:
+        def since_start(t):
+            return round(t - PROCESS_STARTED, 3) if t is not None else None
+
+        return {
+            "status": "ok" if self.ready else "starting" if self.app_ready_at is None else "warming",
+            "ready": self.ready,
+            "uptime_seconds": round(time.time() - PROCESS_STARTED, 3),
+            "startup": {
+                "app_ready_seconds": since_start(self.app_ready_at),
+                "warm_seconds": since_start(self.warm_at),
+                "first_request_seconds": since_start(self.first_request_at),
+            },
+            "warmup": {"enabled": self.warmup_enabled, "stores": self.stores, "models": self.models},
+        }
+
+
+READINESS = Readiness()
+
+
+async def warm_up():
+    """
+    Preload hot stores and models in the background:
+      - encoders of the warmed stores (+ WARMUP_MODELS) are loaded into the shared cache
+      - each store is opened and runs one throwaway search, pulling its index,
+        graph and entries files through the page cache
+    """
+    from stores.core import get_store, list_stores
+    from models.registry import get_encoder
+
+    try:
+        names = list_stores() if WARMUP_STORES.strip() == "*" else _names(WARMUP_STORES)
+    except OSError as e:
+        print(f"[warmup] Could not list stores: {e}")
+        names = []
+    models = _names(WARMUP_MODELS)
+    for name in names:
+        READINESS.stores[name] = "pending"
+    for model_id in models:
+        READINESS.models[model_id] = "pending"
+
+    t0 = time.perf_counter()
+    stores = {}
+    for name in names:
+        try:
+            stores[name] = await asyncio.to_thread(get_store, name)
+            model_id = stores[name].meta["model"]
+            if model_id not in READINESS.models:
+                models.append(model_id)
+                READINESS.models[model_id] = "pending"
+        except Exception as e:
+            READINESS.stores[name] = f"failed: {e}"
+
+    for model_id in models:
+        t = time.perf_counter()
+        READINESS.models[model_id] = "loading"
+        try:
+            await asyncio.to_thread(get_encoder, model_id, CACHE_FOLDER)
+            READINESS.models[model_id] = f"loaded in {time.perf_counter() - t:.2f}s"
+        except Exception as e:
+            READINESS.models[model_id] = f"failed: {e}"
+
+    # Deferred imports used by hot endpoints
+    try:
+        await asyncio.to_thread(importlib.import_module, "networkx")
+    except ImportError as e:
+        print(f"[warmup] {e}")
+
+    for name, s in stores.items():
+        t = time.perf_counter()
+        try:
+            await asyncio.to_thread(s.search, "warm-up", 1)
+            READINESS.stores[name] = f"warm in {time.perf_counter() - t:.2f}s ({s.count} vectors)"
+        except Exception as e:
+            READINESS.stores[name] = f"failed: {e}"
+
+    READINESS.warm()
+    print(f"[warmup] {len(stores)} store(s), {len(models)} model(s) warm in {time.perf_counter() - t0:.2f}s")
@@ -1,76 +1,345 @@
 """
-Precompute embeddings for all tweets and save FAISS index + corpus
-Input: TSV file (one tweet per line)
+Bulk-build a store offline, directly in the backend's Store format
+Input: text/TSV file (one tweet per line), streamed - never loaded into memory
+
+The store is built in <stores_dir>/.<store>.building (checkpointed, so an
+interrupted build resumes where it stopped) and renamed to <stores_dir>/<store>
+when complete: meta.json, entries.jsonl (+ entries.idx row offsets) and a flat
+index.faiss. The default --stores_dir is the backend's own store directory; a
+store built elsewhere can be copied into STORES_DIR as is.
+
+Encoding runs in a pool of worker processes, each with its own copy of the
+model (any id from backend/models/registry.py).
 
 Usage:
-    python embed_tweets.py --input tweets.tsv --output_dir data --batch_size 64
+    python embed_tweets.py --input tweets.tsv --store tweets --batch_size 64
+    python embed_tweets.py --input tweets.tsv --store tweets --column 1 --workers 4
+    # interrupted? run the same command again to resume
 """
 import argparse
+import json
+import multiprocessing as mp
+import os
+import shutil
+import struct
+import sys
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
 import faiss
 import numpy as np
-from pathlib import Path
-from sentence_transformers import SentenceTransformer
 import tqdm
 
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from models.registry import MODELS, get_model  # noqa: E402
+from stores.entries import OFFSETS_FILE  # noqa: E402
+
+# Where the backend looks when started from backend/ (see config.py)
+DEFAULT_STORES_DIR = BACKEND_DIR / ".cache" / "stores"
+DEFAULT_CACHE_DIR = BACKEND_DIR / ".cache" / "huggingface"
+DEFAULT_MODEL = "nomic-ai/nomic-embed-text-v1.5"
+
+CHECKPOINT_FILE = "build.json"
+INDEX_PARTIAL = "index.faiss.partial"
+
+# An IndexFlatIP file is a fixed header followed by the raw float32 rows, so we
+# append rows to it on disk (and truncate it on resume) instead of holding the
+# index in RAM: fourcc, d, ntotal, two unused fields, is_trained, metric, then
+# the row data length in floats.
+FLAT_HEADER = struct.Struct("<4siqqq?iQ")
+
+
+def flat_header(dim: int, ntotal: int) -> bytes:
+    return FLAT_HEADER.pack(b"IxFI", dim, ntotal, 1 << 20, 1 << 20, True, faiss.METRIC_INNER_PRODUCT, ntotal * dim)
+
+
+# -----------------------------
+# Encoder pool
+# -----------------------------
+_MODEL = None
+
+
+def _init_worker(model_id: str, cache_dir: str, threads: int):
+    global _MODEL
+    try:
+        import torch
+
+        torch.set_num_threads(threads)  # don't let every worker grab every core
+    except ImportError:
+        pass
+    _MODEL = get_model(model_id)()
+    _MODEL.load(cache_dir)
+
+
+def _encode(texts: List[str]) -> np.ndarray:
+    embs = np.asarray(_MODEL.embed(texts), dtype=np.float32)
+    embs /= np.maximum(np.linalg.norm(embs, axis=1, keepdims=True), 1e-12)
+    return embs
+
+
+# -----------------------------
+# Input
+# -----------------------------
+def read_batches(path: Path, offset: int, batch_size: int, column: Optional[int]) -> Iterator[Tuple[List[str], int]]:
+    """(texts, byte offset just past the batch) from `offset` on. Blank texts are skipped."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        batch: List[str] = []
+        for raw in f:
+            offset += len(raw)
+            text = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+            if column is not None:
+                fields = text.split("\t")
+                text = fields[column] if column < len(fields) else ""
+            text = text.strip()
+            if text:
+                batch.append(text)
+            if len(batch) >= batch_size:
+                yield batch, offset
+                batch = []
+        if batch:
+            yield batch, offset
+
+
+# -----------------------------
+# Build directory + checkpoints
+# -----------------------------
+def open_build(build_dir: Path, args, input_path: Path) -> Dict:
+    """Start a build, or resume one: files are cut back to what the checkpoint covers."""
+    ckpt_path = build_dir / CHECKPOINT_FILE
+    if ckpt_path.exists() and not args.restart:
+        ckpt = json.loads(ckpt_path.read_text())
+        same = (ckpt["input"], ckpt["model"], ckpt["column"]) == (str(input_path), args.model, args.column)
+        if not same:
+            raise SystemExit(
+                f"❌ {build_dir} holds another build ({ckpt['input']}, {ckpt['model']}); "
+                "use --restart to discard it"
+            )
+        if input_path.stat().st_size < ckpt["offset"]:
+            raise SystemExit(f"❌ {input_path} is smaller than when the build started; use --restart")
+        dim = ckpt["dim"]
+        sizes = {
+            "entries.jsonl": ckpt["entries_bytes"],
+            OFFSETS_FILE: ckpt["rows"] * 8,
+            INDEX_PARTIAL: FLAT_HEADER.size + ckpt["rows"] * dim * 4 if dim else 0,
+        }
+        for name, size in sizes.items():
+            with open(build_dir / name, "ab") as f:
+                f.truncate(size)
+        print(f"[build] Resuming after {ckpt['rows']:,} rows (byte {ckpt['offset']:,})")
+        return ckpt
+
+    # No checkpoint (or --restart): anything in there is from a build that never committed
+    shutil.rmtree(build_dir, ignore_errors=True)
+    build_dir.mkdir(parents=True)
+    return {
+        "input": str(input_path),
+        "model": args.model,
+        "column": args.column,
+        "offset": 0,
+        "rows": 0,
+        "entries_bytes": 0,
+        "dim": None,
+        "seconds": 0.0,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def commit(build_dir: Path, files, ckpt: Dict):
+    """Make everything written so far durable, then record it in build.json."""
+    for f in files:
+        f.flush()
+        os.fsync(f.fileno())
+    tmp = build_dir / (CHECKPOINT_FILE + ".tmp")
+    tmp.write_text(json.dumps(ckpt, indent=2))
+    os.replace(tmp, build_dir / CHECKPOINT_FILE)
+
+
+def finalize(build_dir: Path, store_dir: Path, ckpt: Dict, overwrite: bool) -> Dict:
+    dim, rows = ckpt["dim"], ckpt["rows"]
+    if not rows:
+        raise SystemExit("❌ No texts found in input")
+
+    index_path = build_dir / "index.faiss"
+    with open(build_dir / INDEX_PARTIAL, "r+b") as f:
+        f.write(flat_header(dim, rows))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(build_dir / INDEX_PARTIAL, index_path)
+
+    # Sanity check: FAISS reads it back (mapped, so this is cheap at any size)
+    if hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        index = faiss.read_index(str(index_path), faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+        if index.ntotal != rows or index.d != dim:
+            raise SystemExit(f"❌ index.faiss reads back as {index.ntotal}x{index.d}, expected {rows}x{dim}")
+        del index
+
+    build = {
+        "input": ckpt["input"],
+        "rows": rows,
+        "seconds": round(ckpt["seconds"], 1),
+        "rows_per_s": round(rows / max(ckpt["seconds"], 1e-9), 1),
+        "built_at": datetime.now(timezone.utc).isoformat(),
+    }
+    meta = {"name": store_dir.name, "model": ckpt["model"], "dim": dim, "bulk_build": build}
+    with open(build_dir / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    (build_dir / CHECKPOINT_FILE).unlink()
+
+    if store_dir.exists():
+        if not overwrite:
+            raise SystemExit(f"❌ Store already exists: {store_dir} (built store left in {build_dir}; use --overwrite)")
+        old = store_dir.with_name(f".{store_dir.name}.replaced")
+        shutil.rmtree(old, ignore_errors=True)
+        os.replace(store_dir, old)
+        os.replace(build_dir, store_dir)
+        shutil.rmtree(old, ignore_errors=True)
+    else:
+        os.replace(build_dir, store_dir)
+    return build
+
 
 def main():
-    parser = argparse.ArgumentParser(description="Embed tweets and save FAISS index")
+    parser = argparse.ArgumentParser(description="Bulk-build a store (Store format) from a text/TSV file")
     parser.add_argument(
         "--input", type=str, default="tweets.tsv",
         help="Path to TSV file with one tweet per line"
     )
+    parser.add_argument("--store", type=str, required=True, help="Name of the store to build")
+    parser.add_argument(
+        "--stores_dir", type=str, default=str(DEFAULT_STORES_DIR),
+        help="Directory holding the stores (the backend's STORES_DIR)"
+    )
     parser.add_argument(
-        "--output_dir", type=str, default="data",
-        help="Directory where index and tweets will be saved"
+        "--model", type=str, default=DEFAULT_MODEL, choices=sorted(MODELS),
+        help="Embedding model (from backend/models/registry.py)"
+    )
+    parser.add_argument("--cache_dir", type=str, default=str(DEFAULT_CACHE_DIR), help="Model weights cache")
+    parser.add_argument(
+        "--column", type=int, default=None,
+        help="TSV column holding the text (0-based); default: the whole line"
     )
     parser.add_argument(
         "--batch_size", type=int, default=64,
         help="Batch size for embedding computation"
     )
+    parser.add_argument(
+        "--workers", type=int, default=max(1, (os.cpu_count() or 2) // 4),
+        help="Encoder processes (0 = encode in this process)"
+    )
+    parser.add_argument(
+        "--threads_per_worker", type=int, default=None,
+        help="Torch threads per worker (default: cores / workers)"
+    )
+    parser.add_argument(
+        "--checkpoint_every", type=int, default=100_000,
+        help="Rows between checkpoints (also at least once a minute)"
+    )
+    parser.add_argument("--restart", action="store_true", help="Discard an unfinished build of this store")
+    parser.add_argument("--overwrite", action="store_true", help="Replace the store if it already exists")
     args = parser.parse_args()
 
-    input_path = Path(args.input)
-    output_dir = Path(args.output_dir)
-    output_dir.mkdir(exist_ok=True)
-
-    index_file = output_dir / "tweets.index"
-    tweets_out = output_dir / "tweets.txt"
-
+    input_path = Path(args.input).resolve()
     if not input_path.exists():
         raise FileNotFoundError(f"❌ Tweets file not found: {input_path}")
+    stores_dir = Path(args.stores_dir)
+    stores_dir.mkdir(parents=True, exist_ok=True)
+    store_dir = stores_dir / args.store
+    # Dot-dirs are ignored by the backend's store listing until renamed into place
+    build_dir = stores_dir / f".{args.store}.building"
+    if store_dir.exists() and not args.overwrite:
+        raise SystemExit(f"❌ Store already exists: {store_dir} (use --overwrite)")
+
+    ckpt = open_build(build_dir, args, input_path)
+
+    # Weights are fetched once here, not by every worker
+    get_model(args.model).download(cache_dir=args.cache_dir)
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // max(args.workers, 1))
+    pool = None
+    if args.workers > 0:
+        ctx = mp.get_context("spawn")  # fresh interpreters: no forked torch / FAISS state
+        pool = ctx.Pool(args.workers, initializer=_init_worker, initargs=(args.model, args.cache_dir, threads))
+    else:
+        _init_worker(args.model, args.cache_dir, threads)
+
+    size = input_path.stat().st_size
+    entries_f = open(build_dir / "entries.jsonl", "ab")
+    offsets_f = open(build_dir / OFFSETS_FILE, "ab")
+    index_f = open(build_dir / INDEX_PARTIAL, "ab")
+    files = (entries_f, offsets_f, index_f)
+
+    rows0, t0 = ckpt["rows"], time.monotonic()
+    last_commit, last_commit_rows = t0, ckpt["rows"]
+    bar = tqdm.tqdm(total=size, initial=ckpt["offset"], unit="B", unit_scale=True, desc=args.store)
+    try:
+        # Keep a bounded number of batches in flight: results come back in input order
+        batches = read_batches(input_path, ckpt["offset"], args.batch_size, args.column)
+        pending = deque()
+        max_pending = max(2, 2 * args.workers)
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < max_pending:
+                nxt = next(batches, None)
+                if nxt is None:
+                    exhausted = True
+                    break
+                texts, end = nxt
+                job = pool.apply_async(_encode, (texts,)) if pool else None
+                pending.append((texts, end, job))
+            if not pending:
+                break
 
-    # Load tweets lazily
-    with open(input_path, "r", encoding="utf-8") as f:
-        tweets = [line.strip() for line in f if line.strip()]
-    print(f"Loaded {len(tweets)} tweets from {input_path}")
-
-    # Save tweets immediately (so we don’t hold them in RAM twice)
-    with open(tweets_out, "w", encoding="utf-8") as f:
-        for t in tweets:
-            f.write(t + "\n")
-
-    # Load embedding model
-    model_name = "all-MiniLM-L6-v2"
-    embedder = SentenceTransformer(model_name)
-
-    # Initialize FAISS index once we know embedding dimension
-    print("Warmup to get embedding dimension...")
-    test_emb = embedder.encode([tweets[0]], normalize_embeddings=True, convert_to_numpy=True)
-    dim = test_emb.shape[1]
-    index = faiss.IndexFlatIP(dim)
-
-    # Compute + add to FAISS incrementally
-    print("Computing embeddings & building FAISS index...")
-    for i in tqdm.tqdm(range(0, len(tweets), args.batch_size), unit="batch"):
-        batch = tweets[i:i + args.batch_size]
-        embs = embedder.encode(batch, normalize_embeddings=True, convert_to_numpy=True)
-        index.add(embs)  # directly add to index
-        # Free memory for this batch
-        del embs
-
-    # Save FAISS index
-    faiss.write_index(index, str(index_file))
-    print(f"✅ Saved {len(tweets)} tweets and FAISS index to {output_dir}")
+            texts, end, job = pending.popleft()
+            embs = job.get() if job else _encode(texts)
+
+            if ckpt["dim"] is None:
+                ckpt["dim"] = int(embs.shape[1])
+                index_f.write(flat_header(ckpt["dim"], 0))  # rewritten by finalize
+            elif embs.shape[1] != ckpt["dim"]:
+                raise ValueError(f"Embedding dim {embs.shape[1]} != {ckpt['dim']}")
+
+            lines = [(json.dumps({"id": str(uuid.uuid4()), "text": t}) + "\n").encode("utf-8") for t in texts]
+            starts = ckpt["entries_bytes"] + np.cumsum([0] + [len(line) for line in lines[:-1]])
+            entries_f.write(b"".join(lines))
+            offsets_f.write(starts.astype("<u8").tobytes())
+            index_f.write(np.ascontiguousarray(embs, dtype="<f4").tobytes())
+            ckpt["entries_bytes"] += sum(len(line) for line in lines)
+            ckpt["rows"] += len(texts)
+            ckpt["offset"] = end
+
+            now = time.monotonic()
+            rate = (ckpt["rows"] - rows0) / max(now - t0, 1e-9)
+            bar.update(end - bar.n)
+            bar.set_postfix(rows=f"{ckpt['rows']:,}", rows_per_s=f"{rate:,.0f}")
+            if ckpt["rows"] - last_commit_rows >= args.checkpoint_every or now - last_commit >= 60:
+                ckpt["seconds"] += now - last_commit
+                commit(build_dir, files, ckpt)
+                last_commit, last_commit_rows = now, ckpt["rows"]
+
+        ckpt["seconds"] += time.monotonic() - last_commit
+        commit(build_dir, files, ckpt)
+    except KeyboardInterrupt:
+        print(f"\n[build] Interrupted; rerun the same command to resume from row {last_commit_rows:,}")
+        raise SystemExit(130)
+    finally:
+        bar.close()
+        for f in files:
+            f.close()
+        if pool is not None:
+            pool.terminate()
+
+    build = finalize(build_dir, store_dir, ckpt, args.overwrite)
+    mib = (store_dir / "index.faiss").stat().st_size / 2**20
+    print(
+        f"✅ Built store {args.store}: {build['rows']:,} rows, dim {ckpt['dim']}, "
+        f"{build['seconds']:.1f}s ({build['rows_per_s']:,.0f} rows/s), index {mib:,.1f} MiB -> {store_dir}"
+    )
 
 
 if __name__ == "__main__":
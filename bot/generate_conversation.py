@@ -1,68 +1,171 @@
 """
-Generate a conversation using precomputed tweet embeddings.
+Generate conversations from a tweet store.
+
+Each turn an LLM drafts the next utterance; the closest unused tweet in the store
+is used instead. Tweets come straight from a backend store (built by the server
+or by embed_tweets.py), encoded with the store's own model.
 
 Usage:
     python generate_conversation.py \
-        --input_dir data \
+        --store tweets \
         --out_dir conversations \
         --prefix convo \
         --length 10 \
         --mode polarized \
         --seed "The government is lying to us"
+
+    # batch mode: one conversation per line of the seed file, run concurrently
+    python generate_conversation.py --store tweets --seed_file seeds.txt --concurrency 16
+
+    # offline (no OpenAI calls)
+    python generate_conversation.py --store tweets --seed "..." --llm stub
 """
 
 import argparse
-import faiss
-from pathlib import Path
-from openai import OpenAI
-from dotenv import load_dotenv
-from datetime import datetime
+import importlib
 import json
 import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Set, Tuple
 
-# Load API keys from .env
-load_dotenv()
-client = OpenAI()
-
-
-def load_tweets_and_index(input_dir: Path):
-    tweets_file = input_dir / "tweets.txt"
-    index_file = input_dir / "tweets.index"
-
-    if not tweets_file.exists() or not index_file.exists():
-        raise FileNotFoundError("❌ tweets.txt or tweets.index not found in input_dir")
-
-    with open(tweets_file, "r", encoding="utf-8") as f:
-        tweets = [line.strip() for line in f if line.strip()]
-
-    index = faiss.read_index(str(index_file))
-    return tweets, index
-
-
-def embed_query(text: str, model="all-MiniLM-L6-v2"):
-    from sentence_transformers import SentenceTransformer
-    embedder = SentenceTransformer(model)
-    vec = embedder.encode([text], normalize_embeddings=True, convert_to_numpy=True)
-    return vec
-
-
-def retrieve_candidates(query, tweets, index, used, top_k=20):
-    q_emb = embed_query(query)
-    sims, ids = index.search(q_emb, top_k)
-    sims, ids = sims[0], ids[0]
-    results = []
-    for idx, score in zip(ids, sims):
-        if idx < 0:
-            continue
-        if int(idx) in used:
-            continue
-        results.append((tweets[int(idx)], float(score), int(idx)))
-        if len(results) >= 5:  # only return top 5 unseen
-            break
-    return results
-
-
-def generate_turn(history: list[str], mode: str, next_speaker: str) -> str:
+import faiss
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from models.registry import get_model  # noqa: E402
+from stores import ann  # noqa: E402
+from stores.entries import EntryOffsets, read_rows  # noqa: E402
+
+# Where the backend looks when started from backend/ (see config.py)
+DEFAULT_STORES_DIR = BACKEND_DIR / ".cache" / "stores"
+DEFAULT_CACHE_DIR = BACKEND_DIR / ".cache" / "huggingface"
+
+# (system, user) -> raw completion text
+LLM = Callable[[str, str], str]
+
+
+# -----------------------------
+# Retrieval
+# -----------------------------
+class Retriever:
+    """
+    A backend store opened read-only: memory-mapped index, row offsets into
+    entries.jsonl and the store's encoder, loaded once and reused for every query.
+    """
+
+    def __init__(self, store_dir: Path, cache_dir: Path):
+        meta_path = store_dir / "meta.json"
+        index_path = store_dir / "index.faiss"
+        if not meta_path.exists() or not index_path.exists():
+            raise FileNotFoundError(f"❌ {store_dir} is not a store with an index (meta.json / index.faiss)")
+        self.meta = json.loads(meta_path.read_text())
+
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+        try:
+            self.index = faiss.read_index(str(index_path), flags)
+        except RuntimeError:
+            self.index = faiss.read_index(str(index_path))
+        if self.meta.get("ann"):
+            ann.set_search_params(self.index, self.meta["ann"]["config"])
+
+        self.entries_path = store_dir / "entries.jsonl"
+        self.offsets = EntryOffsets(self.entries_path).load()
+
+        model_cls = get_model(self.meta["model"])
+        self.model = model_cls()
+        try:
+            self.model.load(str(cache_dir))
+        except Exception:
+            model_cls.download(cache_dir=str(cache_dir))
+            self.model.load(str(cache_dir))
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        embs = np.asarray(self.model.embed(texts), dtype=np.float32)
+        return embs / np.maximum(np.linalg.norm(embs, axis=1, keepdims=True), 1e-12)
+
+    def search(self, queries: List[str], exclude: Set[int], k: int = 5) -> List[List[Tuple[str, float, int]]]:
+        """
+        Top-k (tweet, score, row) per query in one encode + one FAISS call.
+        Rows in `exclude` are filtered inside the search (IDSelector), so no over-fetching.
+        """
+        if not queries:
+            return []
+        k = min(k, int(self.index.ntotal) - len(exclude))
+        if k <= 0:
+            return [[] for _ in queries]
+        xq = self.encode(queries)
+        if exclude:
+            sel = faiss.IDSelectorNot(faiss.IDSelectorBatch(np.fromiter(exclude, dtype=np.int64)))
+            sims, ids = self.index.search(xq, k, params=ann.selector_params(self.index, sel))
+        else:
+            sims, ids = self.index.search(xq, k)
+
+        rows = read_rows(self.entries_path, self.offsets, {int(i) for i in ids.ravel() if i >= 0})
+        return [
+            [(rows[int(i)]["text"], float(s), int(i)) for i, s in zip(id_row, sim_row) if int(i) in rows]
+            for id_row, sim_row in zip(ids, sims)
+        ]
+
+
+def retrieve_candidates(retriever: Retriever, query: str, used: Set[int], top_k: int = 5):
+    return retriever.search([query], used, k=top_k)[0]
+
+
+# -----------------------------
+# LLM backends
+# -----------------------------
+class OpenAIChat:
+    def __init__(self, model: str = "gpt-4o"):
+        from dotenv import load_dotenv
+        from openai import OpenAI
+
+        # Load API keys from .env
+        load_dotenv()
+        self.client = OpenAI()
+        self.model = model
+
+    def __call__(self, system: str, user: str) -> str:
+        resp = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": user},
+            ],
+            temperature=0.5,
+            max_tokens=64,
+            stop=["\n\n", "Speaker A:", "Speaker B:"],
+        )
+        return resp.choices[0].message.content.strip()
+
+
+class StubChat:
+    """Offline stand-in for the OpenAI client: answers with the last context line, reworded."""
+
+    def __call__(self, system: str, user: str) -> str:
+        context = user.split("\n\n", 1)[0].splitlines()[1:]
+        last = re.sub(r"^Speaker\s*[AB]\s*:\s*", "", context[-1] if context else "").strip()
+        words = last.split()
+        return json.dumps({"utterance": " ".join(words[len(words) // 3:] + words[: len(words) // 3]) or "Why?"})
+
+
+def load_llm(spec: str) -> LLM:
+    """"openai", "openai:<model>", "stub", or "module:attr" naming a callable / factory for one."""
+    name, _, arg = spec.partition(":")
+    if name == "openai":
+        return OpenAIChat(arg or "gpt-4o")
+    if name == "stub":
+        return StubChat()
+    obj = getattr(importlib.import_module(name), arg)
+    return obj() if isinstance(obj, type) else obj
+
+
+def generate_turn(llm: LLM, history: List[str], mode: str, next_speaker: str) -> str:
     recent = history[-8:]
 
     style_line = (
@@ -88,17 +191,7 @@ def generate_turn(history: list[str], mode: str, next_speaker: str) -> str:
         'Return ONLY a minified JSON object of the form: {"utterance":"..."}'
     )
 
-    resp = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": user},
-        ],
-        temperature=0.5,
-        max_tokens=64,
-        stop=["\n\n", "Speaker A:", "Speaker B:"],
-    )
-    content = resp.choices[0].message.content.strip()
+    content = llm(system, user)
 
     try:
         data = json.loads(content)
@@ -113,52 +206,122 @@ def generate_turn(history: list[str], mode: str, next_speaker: str) -> str:
     return text
 
 
+# -----------------------------
+# Conversations
+# -----------------------------
+def generate_conversations(
+    seeds: List[str],
+    retriever: Retriever,
+    llm: LLM,
+    mode: str,
+    length: int,
+    concurrency: int = 8,
+    top_k: int = 5,
+    verbose: bool = False,
+) -> List[List[str]]:
+    """
+    Run all conversations turn by turn: the LLM drafts every in-flight conversation's
+    next utterance concurrently, then one batched search picks the tweets.
+    A tweet is used at most once across the whole batch.
+    """
+    conversations = [[f"Speaker A: {seed}"] for seed in seeds]
+    active = list(range(len(seeds)))
+    used: Set[int] = set()
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        for i in range(length - 1):
+            if not active:
+                break
+            next_speaker = "Speaker B" if i % 2 == 0 else "Speaker A"
+
+            t0 = time.perf_counter()
+            drafts = list(pool.map(lambda c: generate_turn(llm, conversations[c], mode, next_speaker), active))
+            t1 = time.perf_counter()
+            hits = retriever.search(drafts, used, k=top_k)
+            t2 = time.perf_counter()
+
+            still_active = []
+            for c, draft, candidates in zip(active, drafts, hits):
+                # Conversations earlier in this turn may have taken our best hits
+                candidates = [hit for hit in candidates if hit[2] not in used]
+                if not candidates:
+                    candidates = retrieve_candidates(retriever, draft, used, top_k=1)
+                if not candidates:
+                    if verbose:
+                        print("⚠️ No unseen tweets left, stopping early.")
+                    continue
+
+                best_tweet, best_score, best_id = candidates[0]
+                used.add(best_id)
+                conversations[c].append(f"{next_speaker}: {best_tweet}")
+                still_active.append(c)
+                if verbose:
+                    print(f"🤖 Candidate for {next_speaker}: {draft}")
+                    print(f"✅ Chosen for {next_speaker}: ({best_score:.4f}) {best_tweet}\n")
+
+            if not verbose:
+                print(
+                    f"[batch] turn {i + 1}/{length - 1}: {len(active)} conversations, "
+                    f"llm {t1 - t0:.2f}s, retrieval {t2 - t1:.3f}s"
+                )
+            active = still_active
+
+    return conversations
+
+
 def main():
     parser = argparse.ArgumentParser(description="Generate debate/echo conversation from tweet corpus")
-    parser.add_argument("--input_dir", type=str, default="data", help="Directory with tweets.txt and tweets.index")
+    parser.add_argument("--store", type=str, required=True, help="Store to draw tweets from")
+    parser.add_argument(
+        "--stores_dir", type=str, default=str(DEFAULT_STORES_DIR),
+        help="Directory holding the stores (the backend's STORES_DIR)"
+    )
+    parser.add_argument("--cache_dir", type=str, default=str(DEFAULT_CACHE_DIR), help="Model weights cache")
     parser.add_argument("--out_dir", type=str, default="conversations", help="Folder to save generated conversations")
     parser.add_argument("--prefix", type=str, default="convo", help="Filename prefix")
     parser.add_argument("--length", type=int, default=10, help="Number of turns in conversation")
     parser.add_argument("--mode", type=str, choices=["polarized", "echo"], default="polarized", help="Conversation mode")
-    parser.add_argument("--seed", type=str, required=True, help="Seed statement for the conversation")
+    seed = parser.add_mutually_exclusive_group(required=True)
+    seed.add_argument("--seed", type=str, help="Seed statement for the conversation")
+    seed.add_argument("--seed_file", type=str, help="Batch mode: one seed statement per line")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent LLM calls in batch mode")
+    parser.add_argument(
+        "--llm", type=str, default="openai",
+        help='LLM backend: "openai", "openai:<model>", "stub" (offline) or "module:callable"'
+    )
     args = parser.parse_args()
 
-    input_dir = Path(args.input_dir)
     out_dir = Path(args.out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    # Generate unique filename with timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    out_file = out_dir / f"{args.prefix}_{args.mode}_{timestamp}.txt"
-
-    tweets, index = load_tweets_and_index(input_dir)
-
-    conversation = []
-    used_ids = set()
-    seed = args.seed.strip()
-    conversation.append(f"Speaker A: {seed}")
-    print(f"👤 Speaker A (seed): {seed}\n")
+    if args.seed_file:
+        with open(args.seed_file, "r", encoding="utf-8") as f:
+            seeds = [line.strip() for line in f if line.strip()]
+    else:
+        seeds = [args.seed.strip()]
+        print(f"👤 Speaker A (seed): {seeds[0]}\n")
 
-    for i in range(args.length - 1):
-        next_speaker = "Speaker B" if i % 2 == 0 else "Speaker A"
-        candidate = generate_turn(conversation, args.mode, next_speaker)
-        print(f"🤖 Candidate for {next_speaker}: {candidate}")
+    retriever = Retriever(Path(args.stores_dir) / args.store, Path(args.cache_dir))
+    llm = load_llm(args.llm)
 
-        candidates = retrieve_candidates(candidate, tweets, index, used_ids, top_k=50)
-        if not candidates:
-            print("⚠️ No unseen tweets left, stopping early.")
-            break
-
-        best_tweet, best_score, best_id = candidates[0]
-        used_ids.add(best_id)
-        line = f"{next_speaker}: {best_tweet}"
-        conversation.append(line)
-        print(f"✅ Chosen for {next_speaker}: ({best_score:.4f}) {best_tweet}\n")
-
-    with open(out_file, "w", encoding="utf-8") as f:
-        f.write("\n".join(conversation))
+    t0 = time.perf_counter()
+    conversations = generate_conversations(
+        seeds, retriever, llm, args.mode, args.length,
+        concurrency=args.concurrency, verbose=not args.seed_file,
+    )
 
-    print(f"\n✅ Conversation saved to {out_file}")
+    # Generate unique filenames with timestamp
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    for n, conversation in enumerate(conversations):
+        suffix = f"_{n:04d}" if args.seed_file else ""
+        out_file = out_dir / f"{args.prefix}_{args.mode}_{timestamp}{suffix}.txt"
+        with open(out_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(conversation))
+
+    if args.seed_file:
+        print(f"\n✅ {len(conversations)} conversations saved to {out_dir} in {time.perf_counter() - t0:.1f}s")
+    else:
+        print(f"\n✅ Conversation saved to {out_file}")
 
 
 if __name__ == "__main__":
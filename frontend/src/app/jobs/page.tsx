@@ -17,6 +17,7 @@ type Job = {
   status: "pending" | "processing" | "done" | "failed";
   progress: number;
   logs: JobLog[];      // ✅ now structured logs
+  log_count?: number;  // total lines ever logged (logs holds the recent tail)
   error: string | null;
   created_at: string;
   updated_at: string;
@@ -50,6 +51,23 @@ export default function JobTracker() {
       const data = JSON.parse(event.data);
       if (data.type === "job_update") {
         setJobs((prev) => ({ ...prev, [data.job.id]: data.job }));
+      } else if (data.type === "job_delta") {
+        setJobs((prev) => {
+          const job = prev[data.id];
+          if (!job) return prev;
+          // only append log lines we have not seen yet
+          const known = job.log_count ?? job.logs.length;
+          const fresh = data.logs.slice(Math.max(0, known - data.log_offset));
+          return {
+            ...prev,
+            [data.id]: {
+              ...job,
+              ...data.changes,
+              logs: [...job.logs, ...fresh],
+              log_count: data.log_count,
+            },
+          };
+        });
       }
     };
     ws.onclose = () => console.warn("Job WebSocket closed");
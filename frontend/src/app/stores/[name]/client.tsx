@@ -18,6 +18,9 @@ import { api } from "@/lib/api";
 import { Label } from "@/components/ui/label";
 
 type Entry = { id: string; text: string };
+type EntriesPage = { entries: Entry[]; next_cursor: number | null; total: number };
+
+const PAGE_SIZE = 100;
 type Job = {
   id: string;
   filename: string;
@@ -28,13 +31,24 @@ type Job = {
   error: string | null;
 };
 
-export default function StoreClient({ store, initialEntries }: { store: string; initialEntries: Entry[] }) {
+export default function StoreClient({
+  store,
+  initialEntries,
+  initialCursor,
+}: {
+  store: string;
+  initialEntries: Entry[];
+  initialCursor: number | null;
+}) {
   const [query, setQuery] = useState("");
   const [k, setK] = useState(5);
   const [results, setResults] = useState<any[]>([]);
   const [loadingSearch, setLoadingSearch] = useState(false); // 🔑 new state
   const [newText, setNewText] = useState("");
   const [entries, setEntries] = useState<Entry[]>(initialEntries);
+  const [cursor, setCursor] = useState<number | null>(initialCursor);
+  const [filter, setFilter] = useState("");
+  const [loadingEntries, setLoadingEntries] = useState(false);
 
   const [loadingAdd, setLoadingAdd] = useState(false);
   const [deletingId, setDeletingId] = useState<string | null>(null);
@@ -60,8 +74,10 @@ export default function StoreClient({ store, initialEntries }: { store: string;
         if (job.store === store) {
           setJobs((prev) => ({ ...prev, [job.id]: job }));
           if (job.status === "done") {
-            api<{ entries: Entry[] }>(`/stores/${store}/entries`).then((res) => {
+            fetchPage(0, "").then((res) => {
+              setFilter("");
               setEntries(res.entries);
+              setCursor(res.next_cursor);
             });
           }
         }
@@ -70,6 +86,25 @@ export default function StoreClient({ store, initialEntries }: { store: string;
     return () => ws.close();
   }, [store]);
 
+  // Entries are paged by row cursor; a filter is applied server side
+  const fetchPage = (from: number, q: string) => {
+    const params = new URLSearchParams({ cursor: String(from), limit: String(PAGE_SIZE) });
+    if (q.trim()) params.set("q", q.trim());
+    return api<EntriesPage>(`/stores/${store}/entries?${params}`);
+  };
+
+  const loadEntries = async (reset: boolean) => {
+    if (!reset && cursor === null) return;
+    setLoadingEntries(true);
+    try {
+      const res = await fetchPage(reset ? 0 : cursor!, filter);
+      setEntries(reset ? res.entries : [...entries, ...res.entries]);
+      setCursor(res.next_cursor);
+    } finally {
+      setLoadingEntries(false);
+    }
+  };
+
   const runSearch = async () => {
     if (!query.trim()) return;
     setLoadingSearch(true);
@@ -186,7 +221,18 @@ export default function StoreClient({ store, initialEntries }: { store: string;
       {/* Entries */}
       <Card>
         <CardHeader><CardTitle>Entries</CardTitle></CardHeader>
-        <CardContent>
+        <CardContent className="space-y-3">
+          <div className="flex gap-2">
+            <Input
+              value={filter}
+              onChange={(e) => setFilter(e.target.value)}
+              onKeyDown={(e) => e.key === "Enter" && loadEntries(true)}
+              placeholder="Filter entries containing…"
+            />
+            <Button variant="outline" onClick={() => loadEntries(true)} disabled={loadingEntries}>
+              Filter
+            </Button>
+          </div>
           <div className="max-h-64 overflow-y-auto border rounded p-2 space-y-2 text-sm">
             {entries.length === 0 && <p className="text-muted-foreground">No entries yet</p>}
             {entries.map((e) => (
@@ -205,6 +251,11 @@ export default function StoreClient({ store, initialEntries }: { store: string;
                 </Button>
               </div>
             ))}
+            {cursor !== null && (
+              <Button variant="outline" size="sm" className="w-full" onClick={() => loadEntries(false)} disabled={loadingEntries}>
+                {loadingEntries ? "Loading…" : "Load more"}
+              </Button>
+            )}
           </div>
         </CardContent>
       </Card>
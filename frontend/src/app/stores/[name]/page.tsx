@@ -10,9 +10,9 @@ async function fetchInfo(name: string) {
 }
 
 async function fetchEntries(name: string) {
-  const res = await fetch(`${API_BASE}/stores/${name}/entries`, { cache: "no-store" });
-  if (!res.ok) return { entries: [] };
-  return res.json() as Promise<{ entries: { id: string; text: string }[] }>;
+  const res = await fetch(`${API_BASE}/stores/${name}/entries?limit=100`, { cache: "no-store" });
+  if (!res.ok) return { entries: [], next_cursor: null };
+  return res.json() as Promise<{ entries: { id: string; text: string }[]; next_cursor: number | null }>;
 }
 
 export default async function StoreDetailPage({ params }: { params: { name: string } }) {
@@ -29,7 +29,7 @@ export default async function StoreDetailPage({ params }: { params: { name: stri
       </div>
 
       <Suspense fallback={null}>
-        <StoreClient store={name} initialEntries={entries.entries} />
+        <StoreClient store={name} initialEntries={entries.entries} initialCursor={entries.next_cursor} />
       </Suspense>
     </div>
   );